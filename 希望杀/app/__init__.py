@@ -1,13 +1,41 @@
-from flask import Flask
-from flask_socketio import SocketIO
-from flask_cors import CORS
+import multiprocessing
 import os
 
-# 创建SocketIO实例
-socketio = SocketIO()
+# Web层（Flask、Flask-SocketIO）只在创建应用或使用socketio时导入，
+# 批量模拟和AI对手进程只导入app.game_logic，不需要安装Web依赖
+_socketio = None
 
-def create_app():
-    """创建并配置Flask应用"""
+def _get_socketio():
+    """创建SocketIO实例（事件处理自动计时，见app/metrics.py），整个进程共用一个"""
+    global _socketio
+    if _socketio is None:
+        from app.metrics import MetricsSocketIO
+        _socketio = MetricsSocketIO()
+    return _socketio
+
+def __getattr__(name):
+    # from app import socketio 在第一次使用时创建实例
+    if name == 'socketio':
+        return _get_socketio()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_app(start_services=None):
+    """
+    创建并配置Flask应用
+    
+    Args:
+        start_services: 是否启动后台服务（快照写入、房间回收、AI对手进程池、行动期限、快速匹配）；
+                        默认只在不是由multiprocessing启动的进程中启动（AI对手进程池、批量模拟的子进程
+                        不处理请求，不能各自再启动一套写同一个快照数据库的服务）；
+                        run.py按进程角色明确指定，调试模式重载器的父进程不处理请求，不启动
+    """
+    if start_services is None:
+        start_services = multiprocessing.parent_process() is None
+    
+    from flask import Flask
+    from flask_cors import CORS
+    
+    socketio = _get_socketio()
     app = Flask(__name__, 
                 template_folder='../templates',
                 static_folder='static')
@@ -20,12 +48,96 @@ def create_app():
     # 启用CORS跨域支持
     CORS(app)
     
-    # 初始化SocketIO
-    socketio.init_app(app, cors_allowed_origins="*")
+    # 房间存储后端和多进程路由（run.py --workers 通过环境变量传给每个进程）
+    app.config['ROOM_STORE_URL'] = os.environ.get('ROOM_STORE_URL', 'memory://')
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    app.config['WORKER_INDEX'] = int(os.environ.get('WORKER_INDEX', 0))
+    app.config['WORKER_URLS'] = [url for url in os.environ.get('WORKER_URLS', '').split(',') if url]
+    
+    # 初始化SocketIO（多进程时通过消息队列把广播转发给连接在其他进程上的客户端）
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+    
+    # 房间快照写入SQLALCHEMY_DATABASE_URI指向的数据库（后台线程批量写入）
+    app.config['SNAPSHOT_ENABLED'] = os.environ.get('SNAPSHOT_ENABLED', '1') != '0'
+    app.config['SNAPSHOT_INTERVAL'] = float(os.environ.get('SNAPSHOT_INTERVAL', 0.5))
+    
+    # 游戏日志超出内存容量的部分追加写入每个房间的日志文件
+    app.config['GAME_LOG_DIR'] = os.environ.get('GAME_LOG_DIR', os.path.join(app.instance_path, 'game_logs'))
+    
+    from app.game_logic.game_log import set_spill_dir
+    set_spill_dir(app.config['GAME_LOG_DIR'])
+    
+    from app.game_logic.game_manager import GameManager
+    from app.game_logic.persistence import SnapshotWriter, snapshot_path_from_uri
+    from app.game_logic.room_store import StoreWriter, create_store
+    persistence = None
+    snapshot_path = snapshot_path_from_uri(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path)
+    if start_services and app.config['SNAPSHOT_ENABLED'] and snapshot_path:
+        persistence = SnapshotWriter(snapshot_path, app.config['SNAPSHOT_INTERVAL'])
+    
+    # 共享存储（SQLite/Redis）也由后台线程按房间合并、批量写入（秒），房间的邮箱中不做序列化和I/O
+    app.config['STORE_INTERVAL'] = float(os.environ.get('STORE_INTERVAL', 0.1))
+    store = create_store(app.config['ROOM_STORE_URL'])
+    store_writer = None
+    if start_services and store.shared:
+        store_writer = StoreWriter(store, app.config['STORE_INTERVAL'])
+    GameManager().configure(store, app.config['WORKER_INDEX'], app.config['WORKER_URLS'],
+                            persistence, store_writer)
     
     # 注册蓝图
     from app.routes import main, game
     app.register_blueprint(main.bp)
     app.register_blueprint(game.bp)
     
+    # 房间回收：已结束的对局、空房间和断线玩家超过保留时间（秒）后移除，房间数超过上限时按LRU删除
+    app.config['SWEEP_INTERVAL'] = float(os.environ.get('SWEEP_INTERVAL', 30))
+    app.config['FINISHED_ROOM_TTL'] = float(os.environ.get('FINISHED_ROOM_TTL', 300))
+    app.config['EMPTY_ROOM_TTL'] = float(os.environ.get('EMPTY_ROOM_TTL', 600))
+    app.config['DISCONNECTED_PLAYER_TTL'] = float(os.environ.get('DISCONNECTED_PLAYER_TTL', 60))
+    app.config['MAX_ROOMS'] = int(os.environ.get('MAX_ROOMS', 10000))
+    
+    from app.game_logic.sweeper import RoomSweeper
+    game_manager = GameManager()
+    if start_services and app.config['SWEEP_INTERVAL'] > 0 and game_manager.sweeper is None:
+        game_manager.sweeper = RoomSweeper(game_manager, app.config['SWEEP_INTERVAL'],
+                                           app.config['FINISHED_ROOM_TTL'], app.config['EMPTY_ROOM_TTL'],
+                                           app.config['DISCONNECTED_PLAYER_TTL'], app.config['MAX_ROOMS'],
+                                           on_evict=game.notify_evicted, on_swept=game.notify_swept)
+        game_manager.sweeper.start()
+    
+    # AI对手：搜索进程数量（0表示不启用）和每一步的时间预算（秒）
+    app.config['BOT_WORKERS'] = int(os.environ.get('BOT_WORKERS', 1))
+    app.config['BOT_MOVE_BUDGET'] = float(os.environ.get('BOT_MOVE_BUDGET', 0.5))
+    
+    from app.game_logic.bot import BotPool
+    if start_services and app.config['BOT_WORKERS'] > 0 and game_manager.bots is None:
+        game_manager.bots = BotPool(app.config['BOT_WORKERS'], app.config['BOT_MOVE_BUDGET'])
+    
+    # 行动期限（秒，0表示不启用）：闪避窗口、回合时限、需要行动的玩家断线后的宽限；所有房间共用一个时间轮
+    app.config['DODGE_TIMEOUT'] = float(os.environ.get('DODGE_TIMEOUT', 15))
+    app.config['TURN_TIMEOUT'] = float(os.environ.get('TURN_TIMEOUT', 60))
+    app.config['DISCONNECT_GRACE'] = float(os.environ.get('DISCONNECT_GRACE', 10))
+    app.config['TIMER_TICK'] = float(os.environ.get('TIMER_TICK', 0.1))
+    
+    from app.game_logic.deadlines import RoomDeadlines
+    from app.game_logic.timer_wheel import TimerWheel
+    timeouts = (app.config['DODGE_TIMEOUT'], app.config['TURN_TIMEOUT'], app.config['DISCONNECT_GRACE'])
+    if start_services and any(timeout > 0 for timeout in timeouts) and game_manager.deadlines is None:
+        wheel = TimerWheel(app.config['TIMER_TICK'])
+        game_manager.deadlines = RoomDeadlines(game_manager, wheel, *timeouts, on_expired=game.notify_deadline)
+        wheel.start()
+    
+    # 快速匹配（MATCH_INTERVAL为0表示不启用）：初始允许分差、每秒放宽的分差、允许分差的上限、重新检查的间隔（秒）
+    app.config['MATCH_BAND'] = float(os.environ.get('MATCH_BAND', 100))
+    app.config['MATCH_WIDEN_RATE'] = float(os.environ.get('MATCH_WIDEN_RATE', 25))
+    app.config['MATCH_MAX_BAND'] = float(os.environ.get('MATCH_MAX_BAND', 1000))
+    app.config['MATCH_INTERVAL'] = float(os.environ.get('MATCH_INTERVAL', 1))
+    
+    from app.game_logic.matchmaking import MatchQueue
+    if start_services and app.config['MATCH_INTERVAL'] > 0 and game_manager.matchmaker is None:
+        game_manager.matchmaker = MatchQueue(game_manager, app.config['MATCH_BAND'], app.config['MATCH_WIDEN_RATE'],
+                                             app.config['MATCH_MAX_BAND'], app.config['MATCH_INTERVAL'],
+                                             on_matched=game.notify_matched)
+        game_manager.matchmaker.start()
+    
     return app
@@ -0,0 +1,179 @@
+"""
+二进制消息格式（MessagePack）
+
+默认所有事件以JSON发送。客户端连接后可以发送set_encoding协商MessagePack模式，
+服务器返回紧凑格式的键表和卡牌目录，之后发给这个客户端的事件改为MessagePack二进制帧：
+常见的长键替换为键表中的编号，卡牌只发送[卡牌ID, 种类编号]，名称和描述由客户端按目录还原。
+
+向房间广播时同一条消息只编码一次，发给房间内所有二进制客户端，其余客户端仍然收到JSON。
+没有指定房间的全局广播总是JSON，二进制客户端同样能够处理。
+需要安装msgpack，没有安装时协商结果总是JSON。
+"""
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖，缺失时只支持JSON
+    msgpack = None
+
+from app.game_logic.catalog import CARD_CATALOG, CATALOG_BY_NAME
+
+ENCODING_JSON = 'json'
+ENCODING_MSGPACK = 'msgpack'
+
+# 紧凑格式中替换为编号的键，编号即下标（客户端从协商结果中取得，只能在末尾追加）
+COMPACT_KEYS = (
+    'room_id', 'version', 'base_version', 'players', 'removed_players', 'hands', 'fields', 'log', 'log_reset',
+    'patch', 'patches', 'hand', 'game_state', 'private', 'player_id', 'player_name', 'hand_cards', 'hand_count',
+    'homework_used_this_turn', 'turn_card_usage', 'current_turn', 'game_phase', 'deck_count', 'discard_count',
+    'waiting_for_dodge', 'attack_target', 'pending_attack', 'game_log', 'max_san', 'equipment', 'status', 'name',
+    'san', 'id', 'cards', 'added', 'removed', 'attacker', 'target', 'card', 'message', 'type', 'seq', 'effect',
+    'card_index', 'target_id', 'next_player', 'winner_id', 'winner_name', 'session_token', 'reason',
+    'actions', 'options', 'card_id', 'playable', 'targets', 'end_turn', 'resolve', 'turn_number', 'stacks',
+    'expires', 'source', 'charge'
+)
+KEY_IDS: Dict[str, int] = {key: index for index, key in enumerate(COMPACT_KEYS)}
+
+# 值为卡牌列表的键（卡牌以[卡牌ID, 种类编号]发送）
+CARD_LIST_KEYS = frozenset(('cards', 'added', 'hand_cards'))
+
+
+def _compact_card(card: Dict[str, Any]):
+    template = CATALOG_BY_NAME.get(card.get('name'))
+    if template is None:
+        return compact(card)
+    return [card['card_id'], template.kind]
+
+
+def compact(value: Any) -> Any:
+    """把JSON结构转换为紧凑格式：已知的键换成编号，卡牌换成[卡牌ID, 种类编号]"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in CARD_LIST_KEYS and isinstance(item, list):
+                item = [_compact_card(card) if isinstance(card, dict) else card for card in item]
+            elif key == 'card' and isinstance(item, dict):
+                item = _compact_card(item)
+            else:
+                item = compact(item)
+            result[KEY_IDS.get(key, key)] = item
+        return result
+    if isinstance(value, (list, tuple)):
+        return [compact(item) for item in value]
+    return value
+
+
+class PayloadCodec:
+    """按连接协商的消息格式，以及每个Socket.IO房间中的二进制客户端"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._binary: Set[str] = set()  # 使用MessagePack的连接
+        self._members: Dict[str, Set[str]] = {}  # Socket.IO房间 -> 房间中使用MessagePack的连接
+        self._rooms_of: Dict[str, Set[str]] = {}  # 使用MessagePack的连接 -> 加入的房间
+
+        # 统计信息
+        self.frames = 0  # 编码的二进制帧数
+        self.frame_bytes = 0
+        self.sent = 0  # 发出的二进制帧数（一帧可以发给多个连接）
+
+    @property
+    def available(self) -> bool:
+        return msgpack is not None
+
+    def negotiate(self, sid: str, encoding: Optional[str]) -> str:
+        """
+        设置连接的消息格式
+
+        Returns:
+            实际使用的格式（不支持时为JSON）
+        """
+        if encoding == ENCODING_MSGPACK and self.available:
+            with self._lock:
+                self._binary.add(sid)
+                self._rooms_of.setdefault(sid, set())
+            return ENCODING_MSGPACK
+        self.forget(sid)
+        return ENCODING_JSON
+
+    def is_binary(self, sid: str) -> bool:
+        return sid in self._binary
+
+    def join(self, room: str, sid: str):
+        """连接加入Socket.IO房间（JSON连接不需要记录）"""
+        if sid not in self._binary:
+            return
+        with self._lock:
+            self._members.setdefault(room, set()).add(sid)
+            self._rooms_of[sid].add(room)
+
+    def leave(self, room: str, sid: str):
+        """连接离开Socket.IO房间"""
+        if sid not in self._binary:
+            return
+        with self._lock:
+            self._discard_member(room, sid)
+            self._rooms_of[sid].discard(room)
+
+    def forget(self, sid: str):
+        """连接断开"""
+        if sid not in self._binary:
+            return
+        with self._lock:
+            self._binary.discard(sid)
+            for room in self._rooms_of.pop(sid, ()):
+                self._discard_member(room, sid)
+
+    def _discard_member(self, room: str, sid: str):
+        members = self._members.get(room)
+        if members is not None:
+            members.discard(sid)
+            if not members:
+                del self._members[room]
+
+    def recipients(self, target: Optional[str]) -> List[str]:
+        """发给target（连接ID或房间名）的消息中应该收到二进制帧的连接"""
+        if target is None or not self._binary:
+            return []
+        members = self._members.get(target)
+        recipients = list(members) if members else []
+        if target in self._binary and target not in recipients:
+            recipients.append(target)
+        return recipients
+
+    def encode(self, payload: Any) -> bytes:
+        """把消息编码为紧凑格式的MessagePack二进制帧"""
+        frame = msgpack.packb(compact(payload), use_bin_type=True)
+        self.frames += 1
+        self.frame_bytes += len(frame)
+        return frame
+
+    @staticmethod
+    def schema() -> Dict[str, Any]:
+        """客户端还原紧凑格式需要的键表和卡牌目录"""
+        return {
+            'keys': list(COMPACT_KEYS),
+            'cards': [
+                {
+                    'name': template.name,
+                    'card_type': template.card_type.value,
+                    'description': template.description,
+                    'cost': template.cost
+                }
+                for template in CARD_CATALOG
+            ]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'available': self.available,
+            'binary_clients': len(self._binary),
+            'frames': self.frames,
+            'frame_bytes': self.frame_bytes,
+            'sent': self.sent
+        }
+
+
+# 全局消息格式表
+codec = PayloadCodec()
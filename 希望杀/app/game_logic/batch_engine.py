@@ -0,0 +1,381 @@
+"""
+批量对局引擎（数组结构）
+
+用NumPy数组同时表示N局两人对局：san值、按卡牌种类计数的手牌矩阵、牌堆顺序、
+回合指针和回合内的一套卷子使用次数。每一步对所有未结束的对局同时执行一个动作，
+规则与GameState.use_card / resolve_attack保持一致，用于机器人训练和大规模平衡性测试。
+
+与GameState的差异：
+- 手牌只记录每种卡牌的数量，挠痒随机弃掉目标的一张手牌（GameState弃掉第一张）
+- 被攻击者在出牌后立即回应，与simulation模块的对局流程相同
+
+与GameState相同，挠痒弃掉的目标手牌和线性代数结算时弃掉的一套卷子不进入弃牌堆。
+
+需要安装numpy。
+
+用法：
+    python -m app.game_logic.batch_engine --games 100000 --seed 1
+"""
+import argparse
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover - 依赖缺失时给出明确提示
+    raise ImportError('批量对局引擎需要numpy，请先执行 pip install numpy') from e
+
+from .catalog import (CARD_CATALOG, DECK_TEMPLATES, EFFECT_ATTACK, EFFECT_DODGE, EFFECT_HEAL,
+                      EFFECT_LINEAR_ALGEBRA, EFFECT_SCRATCH, EFFECT_SETTLEMENT, EFFECT_TAISHAN,
+                      get_template)
+from .card import CardType
+
+# 初始san值、初始手牌数和每回合摸牌数，与GameState一致
+INITIAL_SAN = 4
+INITIAL_HAND = 4
+TURN_DRAW = 2
+
+# 单局最多回合数
+MAX_TURNS = 200
+
+NUM_KINDS = len(CARD_CATALOG)
+DECK_SIZE = len(DECK_TEMPLATES)
+KIND_JUANZI = get_template('一套卷子').kind
+KIND_DODGE = get_template('驳回').kind
+
+# 按种类编号索引的效果掩码
+_EFFECTS = np.array([template.effect for template in CARD_CATALOG])
+IS_ATTACK = _EFFECTS == EFFECT_ATTACK
+IS_LINEAR_ALGEBRA = _EFFECTS == EFFECT_LINEAR_ALGEBRA
+IS_SETTLEMENT = _EFFECTS == EFFECT_SETTLEMENT
+IS_TAISHAN = _EFFECTS == EFFECT_TAISHAN
+IS_HEAL = _EFFECTS == EFFECT_HEAL
+IS_SCRATCH = _EFFECTS == EFFECT_SCRATCH
+# 需要等待闪避的卡牌
+NEEDS_DODGE = IS_ATTACK | IS_LINEAR_ALGEBRA | IS_SETTLEMENT | IS_TAISHAN
+# 主动出牌时可以使用的卡牌（驳回只能用来回应）
+PLAYABLE = _EFFECTS != EFFECT_DODGE
+HEAL_AMOUNT = np.array([template.heal for template in CARD_CATALOG], dtype=np.int16)
+DAMAGE = np.array([template.damage for template in CARD_CATALOG], dtype=np.int16)
+
+# 贪心策略的卡牌评分：作业牌3，其他攻击/干扰牌2，回复牌视san值而定
+GREEDY_SCORES = np.array([
+    3 if template.card_type == CardType.HOMEWORK else (0 if template.effect == EFFECT_HEAL else 2)
+    for template in CARD_CATALOG
+], dtype=np.float64)
+
+POLICY_RANDOM = 0
+POLICY_GREEDY = 1
+POLICY_CODES = {'random': POLICY_RANDOM, 'greedy': POLICY_GREEDY}
+
+
+class BatchEngine:
+    """N局对局的数组结构引擎"""
+
+    def __init__(self, n_games: int, seed: Optional[int] = None, rng: Optional['np.random.Generator'] = None,
+                 policies: Tuple[str, str] = ('greedy', 'random'), max_turns: int = MAX_TURNS):
+        """
+        初始化并开始N局对局（发初始手牌，先手玩家摸两张牌）
+
+        Args:
+            n_games: 同时进行的对局数量
+            seed: 随机种子
+            rng: 直接指定随机数生成器（优先于seed）
+            policies: 两个座位的策略名称（random / greedy）
+            max_turns: 单局回合上限
+        """
+        self.n = n_games
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        self.policies = np.array([POLICY_CODES[name] for name in policies], dtype=np.int8)
+        self.max_turns = max_turns
+
+        n = n_games
+        self.san = np.full((n, 2), INITIAL_SAN, dtype=np.int16)
+        self.max_san = np.full((n, 2), INITIAL_SAN, dtype=np.int16)
+        self.hands = np.zeros((n, 2, NUM_KINDS), dtype=np.int16)  # [对局, 座位, 卡牌种类] 张数
+        self.discard = np.zeros((n, NUM_KINDS), dtype=np.int16)  # 弃牌堆各种类张数
+        self.deck = np.empty((n, DECK_SIZE), dtype=np.int8)  # 牌堆中卡牌种类，末尾为牌顶
+        self.deck_size = np.full(n, DECK_SIZE, dtype=np.int16)
+        self.turn = np.zeros(n, dtype=np.int8)  # 当前回合的座位
+        self.juanzi_used = np.zeros((n, 2), dtype=np.int16)  # 本回合使用一套卷子的次数
+        self.turns = np.zeros(n, dtype=np.int32)
+        self.done = np.zeros(n, dtype=bool)
+        self.winner = np.full(n, -1, dtype=np.int8)
+        self.plays = np.zeros((n, 2, NUM_KINDS), dtype=np.int32)  # 每局每个座位的出牌统计
+        self.all_games = np.arange(n)
+
+        # 洗牌：对每局的随机键排序
+        base_deck = np.array([template.kind for template in DECK_TEMPLATES], dtype=np.int8)
+        order = np.argsort(self.rng.random((n, DECK_SIZE)), axis=1)
+        self.deck[:] = base_deck[order]
+
+        # 发初始手牌，先手玩家额外摸两张
+        seat0 = np.zeros(n, dtype=np.int8)
+        seat1 = np.ones(n, dtype=np.int8)
+        self._draw(self.all_games, seat0, INITIAL_HAND)
+        self._draw(self.all_games, seat1, INITIAL_HAND)
+        self._draw(self.all_games, seat0, TURN_DRAW)
+
+    # ==================== 牌堆 ====================
+
+    def _reshuffle(self, games: 'np.ndarray'):
+        """把弃牌堆洗成新的牌堆"""
+        counts = self.discard[games]
+        totals = counts.sum(axis=1)
+        # 第j个位置的卡牌种类 = 累计张数超过j的第一个种类
+        bounds = np.cumsum(counts, axis=1)
+        slots = np.arange(DECK_SIZE)
+        kinds = (bounds[:, None, :] <= slots[None, :, None]).sum(axis=2)
+        valid = slots[None, :] < totals[:, None]
+        keys = np.where(valid, self.rng.random(valid.shape), 2.0)
+        order = np.argsort(keys, axis=1)
+        self.deck[games] = np.take_along_axis(np.minimum(kinds, NUM_KINDS - 1), order, axis=1)
+        self.deck_size[games] = totals
+        self.discard[games] = 0
+
+    def _draw(self, games: 'np.ndarray', seats: 'np.ndarray', times: int = 1):
+        """指定对局的指定座位摸牌，牌堆空时先洗弃牌堆"""
+        for _ in range(times):
+            empty = self.deck_size[games] == 0
+            if empty.any():
+                self._reshuffle(games[empty])
+            has_card = self.deck_size[games] > 0
+            drawing = games[has_card]
+            top = self.deck_size[drawing] - 1
+            kinds = self.deck[drawing, top]
+            self.hands[drawing, seats[has_card], kinds] += 1
+            self.deck_size[drawing] = top
+
+    # ==================== 策略 ====================
+
+    def _choose_play(self, games, seats):
+        """
+        当前玩家选择出哪种牌
+
+        Returns:
+            卡牌种类编号，-1表示结束回合
+        """
+        hand = self.hands[games, seats].astype(np.float64)
+        playable = hand * PLAYABLE
+        playable[self.juanzi_used[games, seats] >= 1, KIND_JUANZI] = 0
+
+        # 随机策略：在所有可出的手牌和“结束回合”中均匀选择
+        weights = np.concatenate([np.ones((len(games), 1)), playable], axis=1)
+        cumulative = np.cumsum(weights, axis=1)
+        r = self.rng.random(len(games)) * cumulative[:, -1]
+        random_choice = (cumulative <= r[:, None]).sum(axis=1) - 1
+
+        # 贪心策略：选择评分最高的牌，没有正分的牌就结束回合
+        scores = np.broadcast_to(GREEDY_SCORES, playable.shape).copy()
+        hurt = self.san[games, seats] < self.max_san[games, seats]
+        scores[:, IS_HEAL] = np.where(hurt, 1.0, -1.0)[:, None]
+        scores[playable <= 0] = -np.inf
+        best = scores.argmax(axis=1)
+        greedy_choice = np.where(scores[np.arange(len(games)), best] > 0, best, -1)
+
+        return np.where(self.policies[seats] == POLICY_GREEDY, greedy_choice, random_choice)
+
+    def _choose_response(self, defenders, available):
+        """被攻击者是否回应（闪避/抵消）：贪心策略总是回应，随机策略一半概率"""
+        greedy = self.policies[defenders] == POLICY_GREEDY
+        coin = self.rng.random(len(defenders)) < 0.5
+        return available & (greedy | coin)
+
+    # ==================== 规则 ====================
+
+    def _discard_from_hand(self, games, seats, kinds):
+        """从手牌移除一张牌并放入弃牌堆"""
+        self.hands[games, seats, kinds] -= 1
+        self.discard[games, kinds] += 1
+
+    def _remove_from_hand(self, games, seats, kinds):
+        """从手牌移除一张牌（不进入弃牌堆）"""
+        self.hands[games, seats, kinds] -= 1
+
+    def _end_turn(self, games):
+        """结束回合：清除使用记录，轮到下一位并摸两张牌"""
+        seats = self.turn[games]
+        self.juanzi_used[games, seats] = 0
+        self.turns[games] += 1
+        next_seats = (1 - seats).astype(np.int8)
+        self.turn[games] = next_seats
+        self._draw(games, next_seats, TURN_DRAW)
+
+        timeout = games[self.turns[games] >= self.max_turns]
+        self.done[timeout] = True
+
+    def _resolve(self, games, attackers, defenders, kinds):
+        """结算没有被闪避的攻击"""
+        damage = np.zeros(len(games), dtype=np.int16)
+
+        # 普通作业攻击
+        damage += np.where(IS_ATTACK[kinds], DAMAGE[kinds], 0)
+
+        # 线性代数：有一套卷子就弃掉一张，否则受到伤害
+        linear = IS_LINEAR_ALGEBRA[kinds]
+        has_juanzi = self.hands[games, defenders, KIND_JUANZI] > 0
+        discard_juanzi = linear & has_juanzi
+        if discard_juanzi.any():
+            self._remove_from_hand(games[discard_juanzi], defenders[discard_juanzi], KIND_JUANZI)
+        damage += np.where(linear & ~has_juanzi, DAMAGE[kinds], 0)
+
+        # 清算时刻：伤害等于攻击者本回合使用一套卷子的次数
+        damage += np.where(IS_SETTLEMENT[kinds], self.juanzi_used[games, attackers], 0)
+
+        # 泰山压顶：伤害等于攻击者san值的一半，至少1点
+        damage += np.where(IS_TAISHAN[kinds], np.maximum(1, self.san[games, attackers] // 2), 0)
+
+        self.san[games, defenders] = np.maximum(0, self.san[games, defenders] - damage)
+
+        # 检查游戏是否结束
+        dead = self.san[games, defenders] <= 0
+        finished = games[dead]
+        self.done[finished] = True
+        self.winner[finished] = attackers[dead]
+
+    def step(self) -> int:
+        """
+        所有未结束的对局各执行一个动作
+
+        Returns:
+            本步之前仍在进行的对局数量
+        """
+        games = self.all_games[~self.done]
+        if not len(games):
+            return 0
+
+        seats = self.turn[games]
+        choice = self._choose_play(games, seats)
+
+        # 结束回合
+        ending = choice < 0
+        if ending.any():
+            self._end_turn(games[ending])
+
+        playing = ~ending
+        games, seats, kinds = games[playing], seats[playing], choice[playing]
+        if not len(games):
+            return len(ending)
+
+        self._discard_from_hand(games, seats, kinds)
+        self.plays[games, seats, kinds] += 1
+        self.juanzi_used[games, seats] += (kinds == KIND_JUANZI)
+        opponents = (1 - seats).astype(np.int8)
+
+        # 体术回复
+        heal = IS_HEAL[kinds]
+        if heal.any():
+            g, s = games[heal], seats[heal]
+            self.san[g, s] = np.minimum(self.max_san[g, s], self.san[g, s] + HEAL_AMOUNT[kinds[heal]])
+
+        # 挠痒：按张数随机弃掉目标的一张手牌
+        scratch = IS_SCRATCH[kinds]
+        if scratch.any():
+            g, s = games[scratch], opponents[scratch]
+            target_hand = self.hands[g, s].astype(np.float64)
+            cumulative = np.cumsum(target_hand, axis=1)
+            r = self.rng.random(len(g)) * cumulative[:, -1]
+            picked = np.minimum((cumulative <= r[:, None]).sum(axis=1), NUM_KINDS - 1)
+            nonempty = cumulative[:, -1] > 0
+            if nonempty.any():
+                self._remove_from_hand(g[nonempty], s[nonempty], picked[nonempty])
+
+        # 需要等待闪避的攻击：线性代数只能用一套卷子抵消，其他攻击用驳回闪避
+        attack = NEEDS_DODGE[kinds]
+        if attack.any():
+            g, attackers, defenders, attack_kinds = games[attack], seats[attack], opponents[attack], kinds[attack]
+            linear = IS_LINEAR_ALGEBRA[attack_kinds]
+            response_kinds = np.where(linear, KIND_JUANZI, KIND_DODGE)
+            available = self.hands[g, defenders, response_kinds] > 0
+            available &= ~linear | (self.juanzi_used[g, defenders] < 1)
+            respond = self._choose_response(defenders, available)
+
+            if respond.any():
+                rg, rd, rk = g[respond], defenders[respond], response_kinds[respond]
+                self._discard_from_hand(rg, rd, rk)
+                self.plays[rg, rd, rk] += 1
+                self.juanzi_used[rg, rd] += (rk == KIND_JUANZI)
+
+            hit = ~respond
+            if hit.any():
+                self._resolve(g[hit], attackers[hit], defenders[hit], attack_kinds[hit])
+
+        return len(ending)
+
+    def run(self) -> 'BatchEngine':
+        """一直执行到所有对局结束"""
+        while self.step():
+            pass
+        return self
+
+    def summary(self) -> Dict:
+        """汇总结果（格式与simulation.SimulationStats.to_dict一致）"""
+        wins = [int((self.winner == seat).sum()) for seat in (0, 1)]
+        card_plays = self.plays.sum(axis=(0, 1))
+        has_winner = self.winner >= 0
+        winner_plays = self.plays[has_winner, self.winner[has_winner]].sum(axis=0)
+        return {
+            'games': self.n,
+            'wins': wins,
+            'draws': self.n - sum(wins),
+            'average_turns': float(self.turns.mean()) if self.n else 0,
+            'card_plays': {template.name: int(card_plays[template.kind]) for template in CARD_CATALOG},
+            'winner_card_plays': {template.name: int(winner_plays[template.kind]) for template in CARD_CATALOG},
+        }
+
+
+def run_games(games: int, seed: Optional[int] = None, policies: Tuple[str, str] = ('greedy', 'random'),
+              max_turns: int = MAX_TURNS, batch_size: int = 100000) -> Dict:
+    """
+    分批运行大量对局并汇总结果
+
+    Args:
+        games: 总对局数量
+        seed: 随机种子
+        policies: 两个座位的策略名称
+        max_turns: 单局回合上限
+        batch_size: 每批同时进行的对局数量（控制内存占用）
+    """
+    rng = np.random.default_rng(seed)
+    total = None
+    remaining = games
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        result = BatchEngine(size, rng=rng, policies=policies, max_turns=max_turns).run().summary()
+        if total is None:
+            total = result
+        else:
+            turns = total['average_turns'] * total['games'] + result['average_turns'] * result['games']
+            total['games'] += result['games']
+            total['average_turns'] = turns / total['games']
+            total['wins'] = [a + b for a, b in zip(total['wins'], result['wins'])]
+            total['draws'] += result['draws']
+            for key in ('card_plays', 'winner_card_plays'):
+                for name, count in result[key].items():
+                    total[key][name] += count
+        remaining -= size
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='希望杀批量对局引擎')
+    parser.add_argument('--games', type=int, default=100000, help='对局数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--policies', nargs=2, default=['greedy', 'random'],
+                        choices=sorted(POLICY_CODES), help='两个座位的策略')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help='单局回合上限')
+    parser.add_argument('--batch-size', type=int, default=100000, help='每批同时进行的对局数量')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = run_games(args.games, args.seed, tuple(args.policies), args.max_turns, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"对局数: {result['games']}，用时: {elapsed:.2f}秒，{result['games'] / elapsed:.0f} 局/秒")
+    print(f"胜场: {result['wins']}，平局: {result['draws']}，平均回合数: {result['average_turns']:.1f}")
+    for name, count in sorted(result['card_plays'].items(), key=lambda item: -item[1]):
+        print(f"  {name}: 使用 {count} 次，获胜方使用 {result['winner_card_plays'].get(name, 0)} 次")
+
+
+if __name__ == '__main__':
+    main()
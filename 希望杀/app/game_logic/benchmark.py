@@ -0,0 +1,458 @@
+"""
+GameState热点路径的微基准测试
+
+每个基准由固定种子构建的夹具（开局后的对局，手牌按需要指定）和被测操作组成，
+覆盖牌堆初始化、发牌、抽牌、use_card的每个分支、resolve_attack的每种攻击牌、
+end_turn、check_game_over、to_dict，1/100/10000个房间时的GameManager.get_all_games，
+1/10000个房间各有一个期限时时间轮推进一个刻度的开销，匹配队列中有1/10000名玩家时一名玩家入队查找对手的开销，
+以及批量模拟完整进行一局（simulation.play_game，贪心对随机）的开销。
+
+每轮先构建夹具（不计时），再连续执行一批操作并计时，取多轮每次操作耗时的中位数。
+结果写入JSON，两个版本的结果可以直接比较，变慢超过阈值时以退出码1返回。
+
+用法：
+    python -m app.game_logic.benchmark --json before.json
+    python -m app.game_logic.benchmark --json after.json --compare before.json --threshold 0.1
+    python -m app.game_logic.benchmark --compare before.json after.json
+    python -m app.game_logic.benchmark --filter use_card --logged
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .card import DeckCard
+from .catalog import get_template
+from .game_manager import GameManager
+from .game_state import GameState
+from .hand import Hand
+from .matchmaking import MatchQueue
+from .rng import derive_seed, stream
+from .simulation import PLAYER_IDS, POLICIES, SimulationStats, play_game
+from .timer_wheel import TimerWheel
+
+# 结果文件格式版本
+RESULT_FORMAT = 1
+
+# 每轮计时至少持续的时间（纳秒），操作太快时加大每轮的批量
+MIN_ROUND_NS = 20_000_000
+
+# 每轮最多执行的操作数（需要逐个构建夹具，不能无限增大）
+MAX_BATCH = 4096
+
+# 默认轮数
+DEFAULT_ROUNDS = 7
+
+# 默认的回归阈值：比基准慢10%以上视为回归
+DEFAULT_THRESHOLD = 0.10
+
+# 指定手牌使用的卡牌ID起点，避开牌堆中的ID
+FIXTURE_CARD_ID = 1000
+
+P0, P1 = PLAYER_IDS
+
+
+class Benchmark:
+    """一个基准：构建夹具并执行被测操作"""
+
+    def __init__(self, name: str, setup: Callable[[int, bool], Any], run: Callable[[Any], Any],
+                 mutates: bool = True):
+        """
+        Args:
+            name: 基准名称
+            setup: (种子, 是否无界面) -> 夹具
+            run: 对夹具执行一次被测操作
+            mutates: 操作是否修改夹具；不修改时一轮中的所有操作共用一个夹具
+        """
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.mutates = mutates
+
+
+# ==================== 夹具 ====================
+
+def new_game(seed: int, headless: bool, start: bool = True,
+             hands: Optional[Dict[str, Sequence[str]]] = None) -> GameState:
+    """
+    用固定种子构建两名玩家的对局
+
+    Args:
+        seed: 洗牌使用的随机种子
+        headless: 是否无界面模式（不记录游戏日志）
+        start: 是否开局
+        hands: 替换指定玩家的手牌：{玩家ID: [卡牌名称, ...]}
+    """
+    game = GameState('benchmark', headless=headless, seed=seed)
+    for player_id in PLAYER_IDS:
+        game.add_player(player_id, player_id)
+    if start:
+        game.start_game()
+    card_id = FIXTURE_CARD_ID
+    for player_id, names in (hands or {}).items():
+        cards = []
+        for name in names:
+            cards.append(DeckCard(card_id, get_template(name)))
+            card_id += 1
+        game.players[player_id]['hand_cards'] = Hand(cards)
+    return game
+
+
+def attacked_game(seed: int, headless: bool, attack: str, defense: Sequence[str] = ('运动',),
+                  homework_used: int = 0) -> GameState:
+    """P0对P1打出攻击牌、等待P1闪避的对局"""
+    game = new_game(seed, headless, hands={P0: [attack, '运动'], P1: list(defense)})
+    for _ in range(homework_used):
+        game.record_card_usage(P0, '一套卷子')
+    game.use_card(P0, 0, P1)
+    return game
+
+
+def lobby_games(count: int, seed: int, headless: bool) -> Dict[str, GameState]:
+    """count个已开局的房间"""
+    games = {}
+    for index in range(count):
+        game = new_game(seed + index, headless)
+        game.room_id = f'bench{index}'
+        games[game.room_id] = game
+    return games
+
+
+def _get_all_games(games: Dict[str, GameState]):
+    """临时替换GameManager中的房间执行get_all_games"""
+    game_manager = GameManager()
+    saved, game_manager.games = game_manager.games, games
+    try:
+        return game_manager.get_all_games()
+    finally:
+        game_manager.games = saved
+
+
+def idle_wheel(count: int, seed: int, headless: bool):
+    """count个房间各有一个约一小时后到期的定时器（基准期间不会到期），时钟手动推进"""
+    clock = [0.0]
+    wheel = TimerWheel(clock=lambda: clock[0])
+    for index in range(count):
+        wheel.schedule(3600 + (seed + index) % 600, _noop)
+    return wheel, clock
+
+
+def _noop():
+    pass
+
+
+def _advance_tick(fixture):
+    """时间轮推进一个刻度"""
+    wheel, clock = fixture
+    clock[0] += wheel.tick
+    wheel.advance()
+
+
+def waiting_queue(count: int, seed: int, headless: bool) -> MatchQueue:
+    """count名分数互不相同、允许分差为0的玩家在排队（新玩家不会配对，不创建房间）"""
+    queue = MatchQueue(GameManager(), band=0, widen_rate=0, max_band=0, clock=lambda: 0.0)
+    for index in range(count):
+        queue.enqueue(f'queued-{index}', 'queued', (seed + index) % count * 0.25)
+    return queue
+
+
+def _probe_queue(queue: MatchQueue):
+    """一名玩家入队（查找相邻的对手）再离开，队列恢复原状"""
+    queue.enqueue('probe', 'probe', len(queue) * 0.125 + 0.1)
+    queue.cancel('probe')
+
+
+def simulated_game(seed: int, headless: bool):
+    """一局批量模拟的策略、随机流和洗牌种子（模拟总是无界面的，headless不影响结果）"""
+    policies = [POLICIES['greedy'](), POLICIES['random']()]
+    return policies, stream(seed, 'policy', 0), derive_seed(seed, 'deck', 0)
+
+
+def _play_game(fixture):
+    """完整地进行一局模拟"""
+    policies, rng, deck_seed = fixture
+    return play_game(policies, rng, SimulationStats(), seed=deck_seed)
+
+
+def _use_card_benchmark(branch: str, hands: Dict[str, Sequence[str]], target: Optional[str],
+                        player_id: str = P0, usage: int = 0) -> Benchmark:
+    """在自己回合打出手牌第一张的基准"""
+    def setup(seed, headless):
+        game = new_game(seed, headless, hands=hands)
+        for _ in range(usage):
+            game.record_card_usage(player_id, game.players[player_id]['hand_cards'][0].name)
+        return game
+    return Benchmark(f'use_card.{branch}', setup, lambda game: game.use_card(player_id, 0, target))
+
+
+def _response_benchmark(branch: str, attack: str, response: str) -> Benchmark:
+    """被攻击者用手牌第一张回应的基准"""
+    return Benchmark(f'use_card.{branch}',
+                     lambda seed, headless: attacked_game(seed, headless, attack, (response, '运动')),
+                     lambda game: game.use_card(P1, 0, None))
+
+
+def _resolve_benchmark(kind: str, attack: str, defense: Sequence[str] = ('运动',),
+                       homework_used: int = 0) -> Benchmark:
+    return Benchmark(f'resolve_attack.{kind}',
+                     lambda seed, headless: attacked_game(seed, headless, attack, defense, homework_used),
+                     lambda game: game.resolve_attack())
+
+
+def _finished_game(seed, headless):
+    game = new_game(seed, headless)
+    game.players[P1]['san'] = 0
+    return game
+
+
+def _deck_ready_game(seed, headless):
+    game = new_game(seed, headless, start=False)
+    game.initialize_deck()
+    return game
+
+
+def _reshuffle_game(seed, headless):
+    game = new_game(seed, headless)
+    game.discard_pile, game.deck = game.deck, []
+    return game
+
+
+def build_benchmarks() -> List[Benchmark]:
+    """所有基准，按固定顺序排列"""
+    benchmarks = [
+        Benchmark('initialize_deck', lambda seed, headless: new_game(seed, headless, start=False),
+                  lambda game: game.initialize_deck()),
+        Benchmark('deal_initial_cards', _deck_ready_game, lambda game: game.deal_initial_cards()),
+        Benchmark('draw_card', new_game, lambda game: game.draw_card(P0)),
+        Benchmark('draw_card.reshuffle', _reshuffle_game, lambda game: game.draw_card(P0)),
+
+        _use_card_benchmark('attack', {P0: ['一套卷子']}, P1),
+        _use_card_benchmark('linear_algebra', {P0: ['线性代数']}, P1),
+        _use_card_benchmark('settlement', {P0: ['清算时刻']}, P1),
+        _use_card_benchmark('taishan', {P0: ['泰山压顶']}, P1),
+        _use_card_benchmark('heal', {P0: ['运动']}, P0),
+        _use_card_benchmark('scratch', {P0: ['挠痒'], P1: ['运动', '驳回']}, P1),
+        _response_benchmark('dodge', '一套卷子', '驳回'),
+        _response_benchmark('counter', '线性代数', '一套卷子'),
+        _use_card_benchmark('rejected.dodge_out_of_turn', {P0: ['驳回']}, None),
+        _use_card_benchmark('rejected.homework_limit', {P0: ['一套卷子']}, P1, usage=1),
+        _use_card_benchmark('rejected.not_your_turn', {P1: ['一套卷子']}, P0, player_id=P1),
+
+        _resolve_benchmark('attack', '一套卷子'),
+        _resolve_benchmark('linear_algebra.damage', '线性代数'),
+        _resolve_benchmark('linear_algebra.discard', '线性代数', ('运动', '一套卷子')),
+        _resolve_benchmark('settlement', '清算时刻', homework_used=2),
+        _resolve_benchmark('taishan', '泰山压顶'),
+
+        Benchmark('end_turn', new_game, lambda game: game.end_turn(P0)),
+        Benchmark('check_game_over.playing', new_game, lambda game: game.check_game_over(), mutates=False),
+        Benchmark('check_game_over.finished', _finished_game, lambda game: game.check_game_over()),
+        Benchmark('to_dict', new_game, lambda game: game.to_dict(), mutates=False),
+        Benchmark('simulation.play_game', simulated_game, _play_game),
+    ]
+    for count in (1, 100, 10000):
+        benchmarks.append(Benchmark(f'get_all_games.{count}',
+                                    lambda seed, headless, count=count: lobby_games(count, seed, headless),
+                                    _get_all_games, mutates=False))
+    for count in (1, 10000):
+        benchmarks.append(Benchmark(f'timer_wheel.tick.{count}',
+                                    lambda seed, headless, count=count: idle_wheel(count, seed, headless),
+                                    _advance_tick, mutates=False))
+    for count in (1, 10000):
+        benchmarks.append(Benchmark(f'matchmaking.enqueue.{count}',
+                                    lambda seed, headless, count=count: waiting_queue(count, seed, headless),
+                                    _probe_queue, mutates=False))
+    return benchmarks
+
+
+# ==================== 计时 ====================
+
+def _time_round(benchmark: Benchmark, batch: int, seed: int, headless: bool,
+                shared: Any = None) -> float:
+    """构建一批夹具后计时，返回每次操作的纳秒数"""
+    if benchmark.mutates:
+        fixtures = [benchmark.setup(seed, headless) for _ in range(batch)]
+    else:
+        fixtures = [shared] * batch
+    run = benchmark.run
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter_ns()
+        for fixture in fixtures:
+            run(fixture)
+        elapsed = time.perf_counter_ns() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return elapsed / batch
+
+
+def run_benchmark(benchmark: Benchmark, rounds: int = DEFAULT_ROUNDS, seed: int = 0,
+                  headless: bool = True) -> Dict[str, Any]:
+    """
+    执行一个基准
+
+    Returns:
+        {'ns_per_op': 中位数, 'min_ns', 'max_ns', 'stdev_ns', 'batch', 'rounds'}
+    """
+    shared = None if benchmark.mutates else benchmark.setup(seed, headless)
+
+    # 校准每轮的批量，使一轮的计时足够长
+    batch = 1
+    while batch < MAX_BATCH:
+        if _time_round(benchmark, batch, seed, headless, shared) * batch >= MIN_ROUND_NS:
+            break
+        batch *= 2
+
+    samples = [_time_round(benchmark, batch, seed, headless, shared) for _ in range(rounds)]
+    return {
+        'ns_per_op': statistics.median(samples),
+        'min_ns': min(samples),
+        'max_ns': max(samples),
+        'stdev_ns': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'batch': batch,
+        'rounds': rounds,
+    }
+
+
+def run_all(names: Optional[Sequence[str]] = None, rounds: int = DEFAULT_ROUNDS, seed: int = 0,
+            headless: bool = True, label: str = '', progress: bool = True) -> Dict[str, Any]:
+    """
+    执行所有（或名称以指定前缀开头的）基准
+
+    Args:
+        names: 名称前缀过滤，None表示全部
+        rounds: 每个基准的轮数
+        seed: 夹具的随机种子
+        headless: False时开启游戏日志和调试输出（输出被丢弃），测量服务器中的实际路径
+        label: 写入结果的标签（例如提交号）
+    """
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for benchmark in build_benchmarks():
+            if names and not any(benchmark.name.startswith(name) for name in names):
+                continue
+            with contextlib.redirect_stdout(devnull if not headless else sys.stdout):
+                result = run_benchmark(benchmark, rounds, seed, headless)
+            results[benchmark.name] = result
+            if progress:
+                print(f"{benchmark.name:<40}{_format_ns(result['ns_per_op']):>12}"
+                      f"  ±{_format_ns(result['stdev_ns'])}  (批量 {result['batch']})")
+
+    return {
+        'format': RESULT_FORMAT,
+        'label': label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'rounds': rounds,
+        'headless': headless,
+        'results': results,
+    }
+
+
+# ==================== 比较 ====================
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    比较两次结果
+
+    Returns:
+        每个共同基准的 {'name', 'baseline_ns', 'current_ns', 'change', 'regression'}，
+        change为相对变化（0.1表示慢了10%）
+    """
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        change = result['ns_per_op'] / base['ns_per_op'] - 1 if base['ns_per_op'] else 0.0
+        rows.append({
+            'name': name,
+            'baseline_ns': base['ns_per_op'],
+            'current_ns': result['ns_per_op'],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]], baseline: Dict[str, Any], current: Dict[str, Any],
+                     threshold: float):
+    print(f"基准: {baseline.get('label') or baseline.get('created')}  当前: {current.get('label') or current.get('created')}"
+          f"  阈值: {threshold:+.0%}")
+    if baseline.get('headless') != current.get('headless') or baseline.get('python') != current.get('python'):
+        print('注意: 两次结果的运行模式或Python版本不同，比较结果仅供参考')
+    for row in rows:
+        mark = '  回归' if row['regression'] else ('  改进' if row['change'] < -threshold else '')
+        print(f"{row['name']:<40}{_format_ns(row['baseline_ns']):>12}{_format_ns(row['current_ns']):>12}"
+              f"{row['change']:>+9.1%}{mark}")
+    regressions = [row['name'] for row in rows if row['regression']]
+    if regressions:
+        print(f"{len(regressions)} 个基准变慢超过阈值: {', '.join(regressions)}")
+    else:
+        print('没有超过阈值的回归')
+
+
+def _format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f'{ns / 1e6:.2f}ms'
+    if ns >= 1e3:
+        return f'{ns / 1e3:.2f}µs'
+    return f'{ns:.0f}ns'
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        result = json.load(f)
+    if result.get('format') != RESULT_FORMAT:
+        raise ValueError(f'{path} 不是当前格式的基准结果')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GameState热点路径的微基准测试')
+    parser.add_argument('--json', dest='json_path', default=None, help='把结果写入JSON文件')
+    parser.add_argument('--compare', nargs='+', metavar='RESULT',
+                        help='与基准结果比较；给出两个文件时直接比较两次结果，不重新运行')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回归阈值（相对变化）')
+    parser.add_argument('--filter', nargs='+', default=None, help='只运行名称以这些前缀开头的基准')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='每个基准的轮数')
+    parser.add_argument('--seed', type=int, default=0, help='夹具的随机种子')
+    parser.add_argument('--logged', action='store_true', help='开启游戏日志和调试输出（服务器中的实际路径）')
+    parser.add_argument('--label', default='', help='写入结果的标签（例如提交号）')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare 最多接受两个结果文件')
+
+    if args.compare and len(args.compare) == 2:
+        baseline, current = _load(args.compare[0]), _load(args.compare[1])
+    else:
+        baseline = _load(args.compare[0]) if args.compare else None
+        current = run_all(args.filter, args.rounds, args.seed, not args.logged, args.label)
+        if args.json_path:
+            with open(args.json_path, 'w', encoding='utf-8') as f:
+                json.dump(current, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入 {args.json_path}")
+
+    if baseline is not None:
+        rows = compare(baseline, current, args.threshold)
+        print_comparison(rows, baseline, current, args.threshold)
+        if any(row['regression'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+AI对手
+
+机器人占用房间的一个座位，轮到它行动（自己的回合或需要回应攻击）时在进程池中搜索下一步：
+对每个合法动作反复做"复制状态 -> 随机化看不到的手牌和牌堆 -> 执行动作 -> 用贪心策略模拟若干回合"，
+按UCB1分配模拟次数，时间用完后选择模拟次数最多的动作。
+
+搜索在独立进程中执行，不占用Socket.IO的处理线程；每一步都有固定的时间预算，
+截止时间在提交时确定，排队等待的时间也计入预算，机器人的响应延迟不超过预算。
+"""
+import math
+import multiprocessing
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .game_state import ACTION_END, Action, GameState
+from .rng import SEED_BITS
+from .simulation import GreedyPolicy
+
+# 机器人的玩家ID前缀（玩家ID是Socket.IO连接ID，不会以它开头）
+BOT_ID_PREFIX = 'bot-'
+
+# 机器人的默认名称
+BOT_NAME = 'AI对手'
+
+# 每一步的默认时间预算（秒）
+DEFAULT_MOVE_BUDGET = 0.5
+
+# 默认的搜索进程数量
+DEFAULT_BOT_WORKERS = 1
+
+# 每次模拟最多进行的回合数，到达上限时按双方san值估计胜率
+ROLLOUT_TURNS = 12
+
+# UCB1的探索系数
+EXPLORATION = 1.4
+
+
+def is_bot(player_id: Optional[str]) -> bool:
+    """玩家是否是机器人"""
+    return bool(player_id) and player_id.startswith(BOT_ID_PREFIX)
+
+
+def evaluate(game: GameState, player_id: str) -> float:
+    """从player_id的角度估计局面的胜率（0到1）"""
+    player = game.players[player_id]
+    opponents = [p for pid, p in game.players.items() if pid != player_id]
+    if game.game_phase == 'finished':
+        if player['san'] <= 0:
+            return 0.0
+        return 1.0 if all(p['san'] <= 0 for p in opponents) else 0.5
+    if not opponents:
+        return 1.0
+    margin = player['san'] - max(p['san'] for p in opponents)
+    return min(1.0, max(0.0, 0.5 + margin / (2 * player['max_san'])))
+
+
+def rollout(game: GameState, player_id: str, rng: random.Random, policy: GreedyPolicy,
+            max_turns: int = ROLLOUT_TURNS) -> float:
+    """双方按策略继续进行最多max_turns个回合，返回player_id的估计胜率"""
+    turns = 0
+    steps = 0
+    max_steps = max_turns * 64  # 防止规则和合法动作不一致时死循环
+    while game.game_phase == 'playing' and turns < max_turns and steps < max_steps:
+        actor = game.to_act()
+        actions = game.legal_actions(actor)
+        if not actions:
+            break
+        action = policy.choose(game, actor, actions, rng)
+        if action[0] == ACTION_END:
+            turns += 1
+        game.apply_action(actor, action)
+        steps += 1
+    return evaluate(game, player_id)
+
+
+def search(game: GameState, player_id: str, deadline: float, rng: random.Random,
+           max_turns: int = ROLLOUT_TURNS) -> Optional[Action]:
+    """
+    在截止时间前搜索player_id的下一步
+
+    Args:
+        game: 当前游戏状态（不会被修改）
+        player_id: 行动的玩家ID
+        deadline: 截止时间（time.time()）
+        rng: 随机数生成器
+        max_turns: 每次模拟的回合上限
+
+    Returns:
+        选择的动作，没有合法动作时返回None
+    """
+    actions = game.legal_actions(player_id)
+    if len(actions) <= 1:
+        return actions[0] if actions else None
+
+    policy = GreedyPolicy()
+    visits = [0] * len(actions)
+    rewards = [0.0] * len(actions)
+    total = 0
+    # 每个动作至少模拟一次，之后按UCB1选择，直到截止时间
+    while total < len(actions) or time.time() < deadline:
+        if total < len(actions):
+            index = total
+        else:
+            log_total = math.log(total)
+            index = max(range(len(actions)),
+                        key=lambda i: rewards[i] / visits[i] + EXPLORATION * math.sqrt(log_total / visits[i]))
+
+        sim = game.clone(rng.getrandbits(SEED_BITS))
+        sim.determinize(player_id, rng)
+        sim.apply_action(player_id, actions[index])
+        rewards[index] += rollout(sim, player_id, rng, policy, max_turns)
+        visits[index] += 1
+        total += 1
+
+    return actions[max(range(len(actions)), key=lambda i: (visits[i], rewards[i]))]
+
+
+def choose_move(snapshot: Dict[str, Any], player_id: str, deadline: float,
+                seed: Optional[int] = None) -> Optional[Action]:
+    """进程池入口：从快照恢复游戏状态后搜索"""
+    game = GameState.from_snapshot(snapshot).clone()
+    return search(game, player_id, deadline, random.Random(seed))
+
+
+class BotPool:
+    """在进程池中为机器人搜索下一步"""
+
+    def __init__(self, workers: int = DEFAULT_BOT_WORKERS, budget: float = DEFAULT_MOVE_BUDGET):
+        """
+        Args:
+            workers: 搜索进程数量
+            budget: 每一步的时间预算（秒），从提交时开始计算
+        """
+        self.workers = workers
+        self.budget = budget
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}  # 机器人玩家ID -> 正在搜索的状态版本
+
+        # 统计信息
+        self.moves = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """第一次使用时创建进程池（spawn方式，不复制服务器进程的线程和锁）"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def request(self, room_id: str, player_id: str, game: GameState,
+                on_move: Callable[[str, str, int, Optional[Action]], None]) -> bool:
+        """
+        为机器人搜索下一步（在房间的邮箱中调用，不等待结果）
+
+        Args:
+            on_move: 搜索完成后在进程池的回调线程中调用：(房间ID, 玩家ID, 状态版本, 动作或None)
+
+        Returns:
+            是否提交了新的搜索（同一版本正在搜索时不重复提交）
+        """
+        version = game.version
+        with self._lock:
+            if self._pending.get(player_id) == version:
+                return False
+            self._pending[player_id] = version
+            submitted = time.time()
+            future = self._pool().submit(choose_move, game.to_snapshot(), player_id, submitted + self.budget)
+
+        def done(future):
+            with self._lock:
+                if self._pending.get(player_id) == version:
+                    del self._pending[player_id]
+            elapsed = (time.time() - submitted) * 1000
+            self.moves += 1
+            self.total_ms += elapsed
+            self.max_ms = max(self.max_ms, elapsed)
+            action = None
+            try:
+                action = future.result()
+            except Exception as e:
+                self.failures += 1
+                print(f'机器人搜索失败: {e}')
+                traceback.print_exc()
+            on_move(room_id, player_id, version, action)
+
+        future.add_done_callback(done)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """搜索统计（毫秒）"""
+        return {
+            'workers': self.workers,
+            'budget_ms': self.budget * 1000,
+            'pending': len(self._pending),
+            'moves': self.moves,
+            'failures': self.failures,
+            'avg_ms': self.total_ms / self.moves if self.moves else 0.0,
+            'max_ms': self.max_ms
+        }
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -155,6 +155,105 @@ class DodgeCard(Card):
         
         return game_state
 
+# ==================== 卡牌模板（享元） ====================
+
+class CardTemplate:
+    """卡牌模板 - 同名卡牌共享的不可变数据（名称、类型、描述、效果参数）"""
+
+    __slots__ = ('kind', 'name', 'card_type', 'description', 'count', 'effect', 'damage', 'heal', 'cost', '_dict')
+
+    def __init__(self,
+                 kind: int,
+                 name: str,
+                 card_type: CardType,
+                 description: str,
+                 count: int,
+                 effect: str,
+                 damage: int = 0,
+                 heal: int = 0,
+                 cost: int = 0):
+        """
+        初始化卡牌模板
+
+        Args:
+            kind: 卡牌种类编号（在卡牌目录中的下标）
+            name: 卡牌名称
+            card_type: 卡牌类型
+            description: 卡牌描述
+            count: 每副牌中的张数
+            effect: 效果类别
+            damage: 伤害参数
+            heal: 回复参数
+            cost: 使用费用
+        """
+        for field, value in (('kind', kind), ('name', name), ('card_type', card_type),
+                             ('description', description), ('count', count), ('effect', effect),
+                             ('damage', damage), ('heal', heal), ('cost', cost)):
+            object.__setattr__(self, field, value)
+        # 预先生成字典，序列化时只需要补上卡牌ID
+        object.__setattr__(self, '_dict', {
+            'name': name,
+            'card_type': card_type.value,
+            'description': description,
+            'cost': cost,
+            'effect': None
+        })
+
+    def __setattr__(self, field, value):
+        raise AttributeError('卡牌模板不可修改')
+
+    def __reduce__(self):
+        # 序列化时只保存种类编号，反序列化后仍然指向目录中的共享模板
+        return (_template_of_kind, (self.kind,))
+
+    def __repr__(self):
+        return f'CardTemplate({self.kind}, {self.name!r})'
+
+
+def _template_of_kind(kind: int) -> CardTemplate:
+    """按种类编号获取卡牌目录中的模板"""
+    from .catalog import CARD_CATALOG
+    return CARD_CATALOG[kind]
+
+
+class DeckCard:
+    """牌堆中的卡牌实例 - 只保存对局内的整数ID和共享模板的引用"""
+
+    __slots__ = ('card_id', 'template')
+
+    def __init__(self, card_id: int, template: CardTemplate):
+        self.card_id = card_id
+        self.template = template
+
+    @property
+    def kind(self) -> int:
+        return self.template.kind
+
+    @property
+    def name(self) -> str:
+        return self.template.name
+
+    @property
+    def card_type(self) -> CardType:
+        return self.template.card_type
+
+    @property
+    def description(self) -> str:
+        return self.template.description
+
+    @property
+    def cost(self) -> int:
+        return self.template.cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        data = {'card_id': self.card_id}
+        data.update(self.template._dict)
+        return data
+
+    def __repr__(self):
+        return f'DeckCard({self.card_id}, {self.template.name!r})'
+
 # ==================== 新增卡牌类 ====================
 
 class LinearAlgebraCard(HomeworkCard):
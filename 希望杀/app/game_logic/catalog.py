@@ -0,0 +1,61 @@
+"""
+卡牌目录
+
+所有卡牌的定义（名称、类型、描述、张数、效果类别和参数）在导入时加载一次，
+生成共享的CardTemplate。每局游戏的牌堆只是引用这些模板的DeckCard列表。
+"""
+from typing import Dict, List, Tuple
+
+from .card import CardTemplate, CardType, DeckCard
+
+# 效果类别
+EFFECT_ATTACK = 'attack'  # 普通作业攻击，等待闪避后造成伤害
+EFFECT_LINEAR_ALGEBRA = 'linear_algebra'  # 线性代数：其他玩家弃一套卷子或受伤
+EFFECT_SETTLEMENT = 'settlement'  # 清算时刻：按本回合一套卷子数量造成伤害
+EFFECT_HEAL = 'heal'  # 体术回复
+EFFECT_SCRATCH = 'scratch'  # 挠痒：弃掉目标一张手牌
+EFFECT_TAISHAN = 'taishan'  # 泰山压顶：按自身san值造成伤害
+EFFECT_DODGE = 'dodge'  # 驳回：闪避攻击
+
+# 卡牌定义：(名称, 类型, 描述, 张数, 效果类别, 参数)
+CARD_DEFINITIONS = (
+    ("一套卷子", CardType.HOMEWORK, "对目标造成1点伤害", 3, EFFECT_ATTACK, {'damage': 1}),
+    ("线性代数", CardType.HOMEWORK, "其他所有敌对玩家需要弃掉一张'一套卷子'，否则对其造成1点作业伤害", 2, EFFECT_LINEAR_ALGEBRA, {'damage': 1}),
+    ("清算时刻", CardType.HOMEWORK, "指定一个目标对其造成N点作业伤害，N=本回合使用过的'一套卷子'的数量", 1, EFFECT_SETTLEMENT, {}),
+    ("运动", CardType.PHYSICAL, "恢复1点san值", 2, EFFECT_HEAL, {'heal': 1}),
+    ("休息", CardType.PHYSICAL, "恢复1点san值", 2, EFFECT_HEAL, {'heal': 1}),
+    ("冥想", CardType.PHYSICAL, "恢复1点san值", 2, EFFECT_HEAL, {'heal': 1}),
+    ("挠痒", CardType.PHYSICAL, "指定一名玩家，弃掉他的一张手牌", 1, EFFECT_SCRATCH, {}),
+    ("泰山压顶", CardType.PHYSICAL, "指定一个目标对其造成N点伤害，N=(当前的san值/2)", 1, EFFECT_TAISHAN, {}),
+    ("驳回", CardType.PHYSICAL, "闪避一次攻击", 4, EFFECT_DODGE, {}),
+)
+
+
+def _load_catalog(definitions) -> Tuple[CardTemplate, ...]:
+    """根据卡牌定义生成模板，种类编号即下标"""
+    return tuple(
+        CardTemplate(kind, name, card_type, description, count, effect, **params)
+        for kind, (name, card_type, description, count, effect, params) in enumerate(definitions)
+    )
+
+
+# 卡牌目录：按种类编号索引的模板
+CARD_CATALOG = _load_catalog(CARD_DEFINITIONS)
+
+# 按名称索引的模板
+CATALOG_BY_NAME: Dict[str, CardTemplate] = {template.name: template for template in CARD_CATALOG}
+
+# 一副牌中每张牌对应的模板（未洗牌的顺序）
+DECK_TEMPLATES: Tuple[CardTemplate, ...] = tuple(
+    template for template in CARD_CATALOG for _ in range(template.count)
+)
+
+
+def get_template(name: str) -> CardTemplate:
+    """按名称获取卡牌模板"""
+    return CATALOG_BY_NAME[name]
+
+
+def build_deck() -> List[DeckCard]:
+    """生成一副未洗牌的牌堆，卡牌ID为对局内的整数编号"""
+    return [DeckCard(card_id, template) for card_id, template in enumerate(DECK_TEMPLATES)]
@@ -0,0 +1,144 @@
+"""
+服务器端的行动期限
+
+对局中总有一名玩家需要行动（GameState.to_act()），为他设置期限，到期时由服务器代为行动：
+- 闪避窗口：被攻击者在dodge_timeout内没有回应时自动结算攻击
+- 回合时限：当前玩家在turn_timeout内没有结束回合时自动结束回合（期间挂起的攻击先等闪避窗口结算）
+- 断线宽限：需要行动的玩家断线超过disconnect_grace时立即代为结算攻击或结束回合
+
+所有房间的期限放在同一个TimerWheel中。房间状态每次变化后调用sync()，按当前状态计算每种期限的键
+（回合数、挂起的攻击、需要行动的玩家），键没有变化时保留原来的定时器，变化时取消旧的并重新计时。
+到期的处理交给房间的邮箱，执行前重新检查键，排队期间玩家已经行动的期限直接丢弃。
+"""
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .game_state import ACTION_END, ACTION_RESOLVE
+from .timer_wheel import Timer, TimerWheel
+
+# 默认期限（秒），0表示不启用
+DEFAULT_DODGE_TIMEOUT = 15.0
+DEFAULT_TURN_TIMEOUT = 60.0
+DEFAULT_DISCONNECT_GRACE = 10.0
+
+# 期限类型
+DEADLINE_DODGE = 'dodge'
+DEADLINE_TURN = 'turn'
+DEADLINE_GRACE = 'grace'
+
+
+class RoomDeadlines:
+    """按房间维护闪避窗口、回合时限和断线宽限"""
+
+    def __init__(self, game_manager, wheel: TimerWheel, dodge_timeout: float = DEFAULT_DODGE_TIMEOUT,
+                 turn_timeout: float = DEFAULT_TURN_TIMEOUT, disconnect_grace: float = DEFAULT_DISCONNECT_GRACE,
+                 on_expired: Optional[Callable[[str, str, str, str], None]] = None):
+        """
+        Args:
+            game_manager: 房间所在的GameManager
+            wheel: 共用的时间轮
+            dodge_timeout: 闪避窗口
+            turn_timeout: 回合时限
+            disconnect_grace: 需要行动的玩家断线后的宽限时间
+            on_expired: 服务器代为行动后在房间的邮箱中调用：(期限类型, 房间ID, 代为行动的玩家ID, 动作类型)
+        """
+        self.game_manager = game_manager
+        self.wheel = wheel
+        self.timeouts = {
+            DEADLINE_DODGE: dodge_timeout,
+            DEADLINE_TURN: turn_timeout,
+            DEADLINE_GRACE: disconnect_grace
+        }
+        self.on_expired = on_expired
+        self._lock = threading.Lock()
+        self._armed: Dict[str, Dict[str, Tuple[Any, Timer]]] = {}  # 房间ID -> {期限类型: (键, 定时器)}
+
+        # 统计信息
+        self.expired = {DEADLINE_DODGE: 0, DEADLINE_TURN: 0, DEADLINE_GRACE: 0}
+        self.stale = 0  # 到期时状态已经变化、被丢弃的期限
+
+    def _keys(self, room_id: str) -> Dict[str, Any]:
+        """房间当前应该设置的期限：{期限类型: 键}"""
+        game = self.game_manager.games.get(room_id)
+        if game is None or game.game_phase != 'playing':
+            return {}
+        keys = {}
+        actor = game.to_act()
+        if game.waiting_for_dodge and game.pending_attack:
+            keys[DEADLINE_DODGE] = (game.turn_number, game.attack_target, game.pending_attack['card'].card_id)
+        keys[DEADLINE_TURN] = (game.turn_number, game.current_turn)
+        if actor is not None and actor in self.game_manager.disconnected:
+            keys[DEADLINE_GRACE] = (game.turn_number, actor, game.waiting_for_dodge)
+        return {kind: key for kind, key in keys.items() if self.timeouts[kind] > 0}
+
+    def sync(self, room_id: str):
+        """按房间的当前状态设置或取消期限（在房间的邮箱中调用）"""
+        keys = self._keys(room_id)
+        with self._lock:
+            armed = self._armed.get(room_id, {})
+            for kind in list(armed):
+                if keys.get(kind) != armed[kind][0]:
+                    self.wheel.cancel(armed.pop(kind)[1])
+            for kind, key in keys.items():
+                if kind not in armed:
+                    armed[kind] = (key, self.wheel.schedule(self.timeouts[kind], self._fire, room_id, kind, key))
+            if armed:
+                self._armed[room_id] = armed
+            else:
+                self._armed.pop(room_id, None)
+
+    def cancel_room(self, room_id: str):
+        """取消房间的所有期限（房间删除时调用）"""
+        with self._lock:
+            for _, timer in self._armed.pop(room_id, {}).values():
+                self.wheel.cancel(timer)
+
+    def _fire(self, room_id: str, kind: str, key: Any):
+        """时间轮线程：把到期处理交给房间的邮箱"""
+        self.game_manager.executor.submit(room_id, self._expire, room_id, kind, key)
+
+    def _expire(self, room_id: str, kind: str, key: Any):
+        """在房间的邮箱中代为行动"""
+        with self._lock:
+            armed = self._armed.get(room_id, {})
+            if kind in armed and armed[kind][0] == key:
+                del armed[kind]
+        if self._keys(room_id).get(kind) != key:
+            self.stale += 1
+            self.sync(room_id)
+            return
+
+        game = self.game_manager.games[room_id]
+        if kind == DEADLINE_TURN and game.waiting_for_dodge:
+            # 回合到时但攻击还在等待回应，由闪避窗口结算后再结束回合
+            with self._lock:
+                armed = self._armed.setdefault(room_id, {})
+                armed[kind] = (key, self.wheel.schedule(self.timeouts[DEADLINE_DODGE] or self.wheel.tick,
+                                                        self._fire, room_id, kind, key))
+            return
+
+        player_id = game.to_act()
+        action = ACTION_RESOLVE if game.waiting_for_dodge else ACTION_END
+        if not self.game_manager.apply_action(room_id, player_id, (action,)):
+            self.stale += 1
+            return
+        self.expired[kind] += 1
+        if self.on_expired:
+            self.on_expired(kind, room_id, player_id, action)
+        self.sync(room_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """期限统计"""
+        with self._lock:
+            armed = {DEADLINE_DODGE: 0, DEADLINE_TURN: 0, DEADLINE_GRACE: 0}
+            for kinds in self._armed.values():
+                for kind in kinds:
+                    armed[kind] += 1
+        return {
+            'timeouts': dict(self.timeouts),
+            'rooms': len(self._armed),
+            'armed': armed,
+            'expired': dict(self.expired),
+            'stale': self.stale,
+            'wheel': self.wheel.stats()
+        }
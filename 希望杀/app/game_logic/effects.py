@@ -0,0 +1,213 @@
+"""
+卡牌效果注册表
+
+每种效果类别（见catalog中的EFFECT_*）注册一个CardEffect，声明：
+- validate: 主动打出时的目标校验
+- needs_dodge: 打出后是否挂起攻击、等待目标回应后再结算
+- answers / respond: 能否回应挂起的攻击，以及作为被攻击者回应时的处理（驳回闪避、一套卷子抵消线性代数）
+- play / resolve: 立即生效的效果和攻击的结算
+
+导入时按卡牌目录生成EFFECTS_BY_KIND，GameState按卡牌种类编号直接取效果，
+分发只需要一次下标访问。新增卡牌只需要在目录中添加定义并注册对应的效果类别。
+"""
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from .catalog import (CARD_CATALOG, EFFECT_ATTACK, EFFECT_DODGE, EFFECT_HEAL, EFFECT_LINEAR_ALGEBRA,
+                      EFFECT_SCRATCH, EFFECT_SETTLEMENT, EFFECT_TAISHAN, get_template)
+from .card import DeckCard
+from .statuses import DAMAGE_HOMEWORK, damage_type_of
+from .game_log import (LOG_ATTACK_HIT, LOG_DODGED, LOG_HEAL_USED, LOG_LINEAR_COUNTERED, LOG_LINEAR_DAMAGE,
+                       LOG_LINEAR_DISCARD, LOG_SCRATCH, LOG_SETTLEMENT, LOG_TAISHAN)
+
+if TYPE_CHECKING:
+    from .game_state import GameState
+
+# 一套卷子：线性代数要求弃掉的牌，清算时刻按它的使用次数计算伤害
+PAPER = get_template('一套卷子')
+
+# 效果类别 -> 效果
+EFFECT_REGISTRY: Dict[str, 'CardEffect'] = {}
+
+
+def register_effect(category: str):
+    """类装饰器：注册效果类别的处理类"""
+    def decorator(cls):
+        cls.category = category
+        EFFECT_REGISTRY[category] = cls()
+        return cls
+    return decorator
+
+
+class CardEffect:
+    """卡牌效果基类"""
+
+    category = None
+    needs_dodge = False  # 打出后挂起攻击，等待目标回应或结算
+    dodgeable = True  # 挂起的攻击能否被驳回闪避
+    reactive = False  # 只能作为回应打出
+    usage_limit = None  # 每回合使用次数上限
+    target_self = False  # 合法动作以自己为目标（否则以其他玩家为目标）
+
+    def validate(self, game: 'GameState', player_id: str, target_id: Optional[str]) -> bool:
+        """主动打出前的校验，默认需要有效的目标"""
+        return bool(target_id) and target_id in game.players
+
+    def answers(self, pending: 'CardEffect') -> bool:
+        """这张牌能否回应挂起的攻击（不修改状态，生成合法动作时使用）"""
+        return False
+
+    def respond(self, game: 'GameState', player_id: str, card: DeckCard, pending: 'CardEffect') -> bool:
+        """
+        被攻击者打出这张牌回应挂起的攻击
+
+        Args:
+            pending: 挂起的攻击牌的效果
+
+        Returns:
+            是否作为回应生效（生效后由GameState清除挂起的攻击并弃牌）
+        """
+        return False
+
+    def play(self, game: 'GameState', player_id: str, card: DeckCard, target_id: Optional[str]):
+        """立即生效的效果（needs_dodge为False时调用）"""
+
+    def resolve(self, game: 'GameState', attacker_id: str, target_id: str, card: DeckCard):
+        """结算挂起的攻击（needs_dodge为True时调用）"""
+
+
+@register_effect(EFFECT_ATTACK)
+class AttackEffect(CardEffect):
+    """一套卷子：对目标造成伤害，每回合限用一次，也可以用来抵消线性代数"""
+
+    needs_dodge = True
+    usage_limit = 1
+
+    def answers(self, pending):
+        return pending.category == EFFECT_LINEAR_ALGEBRA
+
+    def respond(self, game, player_id, card, pending):
+        if not self.answers(pending):
+            return False
+        if not game.headless:
+            game.game_log.append(LOG_LINEAR_COUNTERED, game._seat(player_id), kind=card.kind)
+        return True
+
+    def resolve(self, game, attacker_id, target_id, card):
+        target = game.players[target_id]
+        damage = game.deal_damage(attacker_id, target_id, card.template.damage, damage_type_of(card))
+        if not game.headless:
+            print(f"攻击结算：{game.players[attacker_id]['name']} 对 {target['name']} 造成{damage}点伤害，剩余san值：{target['san']}")
+            game.game_log.append(LOG_ATTACK_HIT, game._seat(attacker_id), game._seat(target_id), card.kind, damage)
+
+
+@register_effect(EFFECT_LINEAR_ALGEBRA)
+class LinearAlgebraEffect(CardEffect):
+    """线性代数：其他玩家弃掉一张一套卷子，否则受到伤害；只能用一套卷子抵消"""
+
+    needs_dodge = True
+    dodgeable = False
+
+    def resolve(self, game, attacker_id, target_id, card):
+        for enemy_id, enemy in game.players.items():
+            if enemy_id == attacker_id:
+                continue
+            if enemy['hand_cards'].discard_kind(PAPER.kind) is not None:
+                if not game.headless:
+                    game.game_log.append(LOG_LINEAR_DISCARD, game._seat(attacker_id), game._seat(enemy_id), card.kind)
+                continue
+
+            old_san = enemy['san']
+            game.deal_damage(attacker_id, enemy_id, card.template.damage, DAMAGE_HOMEWORK)
+            if not game.headless:
+                print(f"DEBUG: 线性代数对 {enemy['name']} 造成伤害: {old_san} -> {enemy['san']}")
+                game.game_log.append(LOG_LINEAR_DAMAGE, game._seat(attacker_id), game._seat(enemy_id), card.kind,
+                                     old_san, enemy['san'])
+
+
+@register_effect(EFFECT_SETTLEMENT)
+class SettlementEffect(CardEffect):
+    """清算时刻：伤害等于攻击者本回合使用过的一套卷子数量"""
+
+    needs_dodge = True
+
+    def resolve(self, game, attacker_id, target_id, card):
+        papers = game.get_card_usage_count(attacker_id, PAPER.name)
+        damage = game.deal_damage(attacker_id, target_id, papers, damage_type_of(card))
+        if not game.headless:
+            game.game_log.append(LOG_SETTLEMENT, game._seat(attacker_id), game._seat(target_id), card.kind,
+                                 damage, papers)
+
+
+@register_effect(EFFECT_TAISHAN)
+class TaishanEffect(CardEffect):
+    """泰山压顶：伤害为攻击者当前san值的一半，至少1点"""
+
+    needs_dodge = True
+
+    def resolve(self, game, attacker_id, target_id, card):
+        attacker_san = game.players[attacker_id]['san']
+        damage = game.deal_damage(attacker_id, target_id, max(1, attacker_san // 2), damage_type_of(card))
+        if not game.headless:
+            game.game_log.append(LOG_TAISHAN, game._seat(attacker_id), game._seat(target_id), card.kind,
+                                 damage, attacker_san)
+
+
+@register_effect(EFFECT_HEAL)
+class HealEffect(CardEffect):
+    """体术回复：目标恢复san值，没有有效目标时牌仍然打出"""
+
+    target_self = True
+
+    def validate(self, game, player_id, target_id):
+        return True
+
+    def play(self, game, player_id, card, target_id):
+        if target_id and target_id in game.players:
+            target = game.players[target_id]
+            target['san'] = min(target['max_san'], target['san'] + card.template.heal)
+            if not game.headless:
+                print(f"体术牌效果：{game.players[player_id]['name']} 为 {target['name']} 恢复{card.template.heal}点san值，当前san值：{target['san']}")
+        if not game.headless:
+            game.game_log.append(LOG_HEAL_USED, game._seat(player_id), game._seat(target_id), card.kind)
+
+
+@register_effect(EFFECT_SCRATCH)
+class ScratchEffect(CardEffect):
+    """挠痒：弃掉目标的第一张手牌"""
+
+    def play(self, game, player_id, card, target_id):
+        target_hand = game.players[target_id]['hand_cards']
+        had_cards = bool(target_hand)
+        if had_cards:
+            target_hand.pop(0)
+        if not game.headless:
+            game.game_log.append(LOG_SCRATCH, game._seat(player_id), game._seat(target_id), card.kind, int(had_cards))
+
+
+@register_effect(EFFECT_DODGE)
+class DodgeEffect(CardEffect):
+    """驳回：闪避可以闪避的攻击，只能作为回应打出"""
+
+    reactive = True
+
+    def answers(self, pending):
+        return pending.dodgeable
+
+    def respond(self, game, player_id, card, pending):
+        if not self.answers(pending):
+            return False
+        if not game.headless:
+            game.game_log.append(LOG_DODGED, game._seat(player_id), kind=card.kind)
+        return True
+
+
+def _effects_by_kind() -> Tuple[CardEffect, ...]:
+    """按卡牌种类编号排列的效果，目录中的效果类别必须都已注册"""
+    missing = sorted({template.effect for template in CARD_CATALOG} - set(EFFECT_REGISTRY))
+    if missing:
+        raise ValueError(f'卡牌效果类别没有注册处理类: {missing}')
+    return tuple(EFFECT_REGISTRY[template.effect] for template in CARD_CATALOG)
+
+
+# 卡牌种类编号 -> 效果
+EFFECTS_BY_KIND = _effects_by_kind()
@@ -0,0 +1,368 @@
+"""
+结构化游戏日志
+
+每条日志是一个定长记录：(序号, 事件代码, 行动者编号, 目标编号, 卡牌种类, 参数1, 参数2)。
+内存中只保留最近LOG_CAPACITY条，更早的记录以定长二进制格式写入房间的日志文件，
+按序号直接定位分页读取。显示用的中文消息只在发送给客户端时生成。
+
+溢出的记录先留在内存缓冲区，房间的邮箱中不做文件I/O：快照写入线程（没有时由回收线程）在邮箱中用take_spill
+取出一批，在自己的线程中写入文件；写完之后下一次取出时才从缓冲区移出。
+"""
+import os
+import re
+import struct
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .catalog import CARD_CATALOG
+
+# 内存中保留的日志条数
+LOG_CAPACITY = 64
+
+# 溢出文件的记录格式：序号、事件代码、行动者、目标、卡牌种类、两个数值参数（参数1容纳开局的63位随机种子）
+RECORD_FORMAT = struct.Struct('<IBhhbqh')
+
+NO_INDEX = -1  # 没有行动者/目标/卡牌
+
+# 事件代码
+LOG_PLAYER_JOINED = 1
+LOG_PLAYER_LEFT = 2
+LOG_GAME_STARTED = 3
+LOG_CARD_DRAWN = 4
+LOG_DECK_RESHUFFLED = 5
+LOG_DODGED = 6
+LOG_LINEAR_COUNTERED = 7
+LOG_ATTACK_DECLARED = 8
+LOG_HEAL_USED = 9
+LOG_SCRATCH = 10
+LOG_LINEAR_DISCARD = 11
+LOG_LINEAR_DAMAGE = 12
+LOG_SETTLEMENT = 13
+LOG_TAISHAN = 14
+LOG_ATTACK_HIT = 15
+LOG_TURN_ENDED = 16
+LOG_GAME_WON = 17
+LOG_GAME_DRAW = 18
+LOG_GAME_ENDED = 19
+LOG_STATUS_ADDED = 20
+LOG_STATUS_DAMAGE = 21
+LOG_STATUS_EXPIRED = 22
+
+# 状态名称，状态事件的参数1记录下标（只能在末尾追加）
+STATUS_NAMES = ('狂暴', '集中', '脆弱', '失神', '眩晕', '睡眠', '石化', '恐惧', '混乱', '诅咒', '变羊', '魅惑',
+                '灼烧', '冰冻', '中毒', '剧毒', '感染')
+
+# 参数1是状态下标的事件
+STATUS_EVENTS = frozenset((LOG_STATUS_ADDED, LOG_STATUS_DAMAGE, LOG_STATUS_EXPIRED))
+
+# 事件代码 -> (日志类型, 行动者字段名, 目标字段名, 消息模板, 效果模板)
+# 模板中可以使用 {actor} {target} {card} {arg0} {arg1} {effect} {status}
+LOG_EVENTS = {
+    LOG_PLAYER_JOINED: ('player_joined', 'player', None, '{actor} 加入了游戏', None),
+    LOG_PLAYER_LEFT: ('player_left', 'player', None, '{actor} 离开了游戏', None),
+    # 参数为房间的随机种子和开局洗牌的序号，用于按日志重放房间；种子能推算出牌堆顺序，不渲染给客户端
+    LOG_GAME_STARTED: ('game_started', None, None, '游戏开始！', None),
+    LOG_CARD_DRAWN: ('card_drawn', 'player', None, '{actor} 抽了一张牌', None),
+    LOG_DECK_RESHUFFLED: ('deck_reshuffled', None, None, '牌堆重新洗牌', None),
+    LOG_DODGED: ('card_used', 'player', None, '{actor} 使用了 {card} 闪避了攻击', None),
+    LOG_LINEAR_COUNTERED: ('card_used', 'player', None, '{actor} 使用了一套卷子抵消了线性代数的攻击', None),
+    LOG_ATTACK_DECLARED: ('card_used', 'player', 'target', '{actor} 对 {target} 使用了 {card}，等待闪避', None),
+    LOG_HEAL_USED: ('card_used', 'player', 'target', '{actor} 使用了 {card}', None),
+    LOG_SCRATCH: ('card_used', 'player', 'target', '{actor} 对 {target} 使用了 {card}，{effect}', None),
+    LOG_LINEAR_DISCARD: ('attack_resolved', 'player', 'target', "{target} 弃掉了一张'一套卷子'",
+                         "{target} 弃掉了一张'一套卷子'"),
+    LOG_LINEAR_DAMAGE: ('attack_resolved', 'player', 'target',
+                        "{target} 没有'一套卷子'，受到1点伤害，san值从{arg0}降至{arg1}",
+                        "{target} 没有'一套卷子'，受到1点伤害，san值从{arg0}降至{arg1}"),
+    LOG_SETTLEMENT: ('card_used', 'player', 'target',
+                     '{actor} 的 {card} 对 {target} 造成 {arg0} 点伤害',
+                     '对 {target} 造成 {arg0} 点伤害（本回合使用了 {arg1} 张一套卷子）'),
+    LOG_TAISHAN: ('attack_resolved', 'player', 'target',
+                  '{actor} 的 {card} 对 {target} 造成了 {arg0} 点伤害（基于攻击者san值 {arg1}）', None),
+    LOG_ATTACK_HIT: ('attack_resolved', 'player', 'target', '{actor} 的 {card} 对 {target} 造成了{arg0}点伤害', None),
+    LOG_TURN_ENDED: ('turn_ended', 'player', 'next_player', '{actor} 的回合结束，轮到 {target}', None),
+    LOG_GAME_WON: ('game_over', 'winner', None, '游戏结束！{actor} 获胜！', None),
+    LOG_GAME_DRAW: ('game_over', None, None, '游戏结束！平局！', None),
+    LOG_GAME_ENDED: ('game_ended', None, None, '游戏结束', None),
+    LOG_STATUS_ADDED: ('status_added', 'player', None, '{actor} 获得了“{status}”状态，持续{arg1}回合', None),
+    LOG_STATUS_DAMAGE: ('status_damage', 'player', None, '{actor} 受到“{status}”的 {arg1} 点伤害', None),
+    LOG_STATUS_EXPIRED: ('status_expired', 'player', None, '{actor} 的“{status}”状态结束了', None),
+}
+
+# 日志记录：(序号, 事件代码, 行动者, 目标, 卡牌种类, 参数1, 参数2)
+LogRecord = Tuple[int, int, int, int, int, int, int]
+
+# 溢出文件所在目录，为None时溢出的记录直接丢弃（例如批量模拟）
+_spill_dir: Optional[str] = None
+
+
+def set_spill_dir(path: Optional[str]):
+    """设置溢出文件目录"""
+    global _spill_dir
+    if path:
+        os.makedirs(path, exist_ok=True)
+    _spill_dir = path
+
+
+def _spill_file_name(room_id: str) -> str:
+    """房间ID转换为安全的文件名"""
+    if re.fullmatch(r'[A-Za-z0-9_-]{1,64}', room_id):
+        return f'{room_id}.log'
+    return f"room-{room_id.encode('utf-8').hex()[:120]}.log"
+
+
+class SpillChunk:
+    """一批等待写入溢出文件的记录（在房间的邮箱中取出，由后台线程写入）"""
+
+    __slots__ = ('path', 'offset', 'records', 'truncate', 'written', 'discarded', '_lock')
+
+    def __init__(self, path: str, offset: int, records: List[LogRecord], truncate: bool):
+        """
+        Args:
+            path: 溢出文件
+            offset: 第一条记录的序号（文件中的位置）
+            records: 要写入的记录
+            truncate: 是否先清空文件（新建的日志第一次写入时覆盖同名房间留下的旧文件）
+        """
+        self.path = path
+        self.offset = offset
+        self.records = records
+        self.truncate = truncate
+        self.written = False
+        self.discarded = False
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    def write(self):
+        """按序号定位写入文件（重复写入同一批是幂等的）"""
+        with self._lock:
+            if self.written or self.discarded:
+                return
+            data = b''.join(RECORD_FORMAT.pack(*record) for record in self.records)
+            flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if self.truncate else 0)
+            with os.fdopen(os.open(self.path, flags, 0o644), 'wb') as f:
+                f.seek(self.offset * RECORD_FORMAT.size)
+                f.write(data)
+            self.written = True
+
+    def discard(self):
+        """房间已经删除，不再写入（正在写入时等它写完，随后删除文件）"""
+        with self._lock:
+            self.discarded = True
+
+
+class GameLog:
+    """固定容量的结构化日志，旧记录溢出到文件"""
+
+    def __init__(self, room_id: str, capacity: int = LOG_CAPACITY):
+        """
+        Args:
+            room_id: 房间ID（决定溢出文件名）
+            capacity: 内存中保留的记录数
+        """
+        self.records = deque(maxlen=capacity)  # 最近的记录
+        self.total = 0  # 已记录的总条数，即下一条记录的序号
+        self.epoch = 0  # 每次重新开局加一
+        self.epoch_start = 0  # 本局第一条记录的序号
+        self.names: List[str] = []  # 行动者/目标编号 -> 玩家名称
+        self._seats: Dict[str, int] = {}  # 玩家ID -> 编号
+        self._spill_buffer: List[LogRecord] = []  # 还没确认写入文件的溢出记录
+        self._chunk: Optional[SpillChunk] = None  # 已经交给后台线程写入的一批
+        self._fresh = True  # 新建的日志（不是从快照恢复的），第一次写入时清空同名的旧文件
+        self.spilled = 0  # 已写入文件的记录数
+        self.spill_path = os.path.join(_spill_dir, _spill_file_name(room_id)) if _spill_dir else None
+
+    def __len__(self) -> int:
+        return self.total
+
+    def seat(self, player_id: str, name: str) -> int:
+        """玩家在日志中的编号（第一次出现时登记名称）"""
+        index = self._seats.get(player_id)
+        if index is None or self.names[index] != name:
+            index = len(self.names)
+            self.names.append(name)
+            self._seats[player_id] = index
+        return index
+
+    def append(self, code: int, actor: int = NO_INDEX, target: int = NO_INDEX, kind: int = NO_INDEX,
+               arg0: int = 0, arg1: int = 0):
+        """
+        追加一条记录
+
+        Args:
+            code: 事件代码
+            actor: 行动者编号（seat()的返回值）
+            target: 目标编号
+            kind: 卡牌种类编号
+            arg0, arg1: 数值参数（伤害、san值、开局的随机种子等）
+        """
+        if len(self.records) == self.records.maxlen:
+            self._spill(self.records[0])
+        self.records.append((self.total, code, actor, target, kind, arg0, arg1))
+        self.total += 1
+
+    def reset(self):
+        """开始新的一局：当前记录全部移入溢出文件"""
+        for record in self.records:
+            self._spill(record)
+        self.records.clear()
+        self.epoch += 1
+        self.epoch_start = self.total
+
+    # ==================== 溢出文件 ====================
+
+    def _spill(self, record: LogRecord):
+        if self.spill_path:
+            self._spill_buffer.append(record)
+
+    @property
+    def spill_pending(self) -> bool:
+        """是否有还没确认写入文件的溢出记录"""
+        return bool(self._spill_buffer)
+
+    def take_spill(self) -> Optional[SpillChunk]:
+        """
+        取出等待写入文件的溢出记录（在房间的邮箱中调用，不做文件I/O）
+
+        返回的SpillChunk由调用方在后台线程中write。上一批写完之后才移出缓冲区、计入spilled，
+        没有写成功的记录和新的记录一起重新取出；在此之前page()仍然从缓冲区读取这些记录。
+
+        Returns:
+            要写入的一批记录，没有时返回None
+        """
+        chunk = self._chunk
+        if chunk is not None and chunk.written:
+            del self._spill_buffer[:chunk.count]
+            self.spilled += chunk.count
+            self._fresh = False
+        self._chunk = None
+        if not self._spill_buffer or not self.spill_path:
+            return None
+        # 从快照恢复的日志按序号写入已有的文件，只有新建的日志从序号0开始时清空同名房间留下的旧文件
+        self._chunk = SpillChunk(self.spill_path, self.spilled, self._spill_buffer[:],
+                                 self._fresh and self.spilled == 0)
+        return self._chunk
+
+    def discard(self):
+        """删除溢出文件（房间删除时调用），已经取出、还没写入的一批不再写入"""
+        self._spill_buffer = []
+        if self._chunk is not None:
+            self._chunk.discard()
+            self._chunk = None
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    def _read_spilled(self, start: int, stop: int) -> List[LogRecord]:
+        """从溢出文件读取序号在[start, stop)的记录"""
+        if start >= stop or not self.spill_path or not os.path.exists(self.spill_path):
+            return []
+        # 溢出文件从序号0开始连续存放，按序号直接定位
+        start = max(start, 0)
+        with open(self.spill_path, 'rb') as f:
+            f.seek(start * RECORD_FORMAT.size)
+            data = f.read((stop - start) * RECORD_FORMAT.size)
+        records = [RECORD_FORMAT.unpack_from(data, offset) for offset in range(0, len(data), RECORD_FORMAT.size)]
+        # 文件丢失后重新写入会在前面留下空洞（全零），序号对不上的记录不返回
+        return [record for seq, record in enumerate(records, start) if record[0] == seq and record[1] in LOG_EVENTS]
+
+    # ==================== 读取 ====================
+
+    def render(self, record: LogRecord) -> Dict[str, Any]:
+        """把记录渲染成客户端使用的字典（包含中文消息）"""
+        seq, code, actor, target, kind, arg0, arg1 = record
+        log_type, actor_key, target_key, template, effect_template = LOG_EVENTS[code]
+        values = {
+            'actor': self.names[actor] if actor >= 0 else '',
+            'target': self.names[target] if target >= 0 else '自己',
+            'card': CARD_CATALOG[kind].name if kind >= 0 else '',
+            'arg0': arg0,
+            'arg1': arg1,
+            'effect': '',
+            'status': STATUS_NAMES[arg0] if code in STATUS_EVENTS else ''
+        }
+        entry = {'seq': seq, 'type': log_type}
+        if actor_key and actor >= 0:
+            entry[actor_key] = values['actor']
+        if target_key:
+            entry[target_key] = values['target']
+        if kind >= 0:
+            entry['card'] = values['card']
+        if code == LOG_SCRATCH:
+            values['effect'] = (f"弃掉了 {values['target']} 的一张手牌" if arg0
+                                else f"{values['target']} 没有手牌可弃")
+            entry['effect'] = values['effect']
+        elif effect_template:
+            entry['effect'] = effect_template.format(**values)
+        entry['message'] = template.format(**values)
+        return entry
+
+    def since(self, seq: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """内存中序号不小于seq的最近limit条记录（已渲染）"""
+        records = [record for record in self.records if record[0] >= seq]
+        return [self.render(record) for record in records[-limit:]]
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """本局最近的limit条记录（已渲染）"""
+        return self.since(self.epoch_start, limit)
+
+    def page(self, before: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        分页读取完整历史（包括溢出到文件的记录）
+
+        Args:
+            before: 只返回序号小于它的记录，默认从最新开始
+            limit: 每页条数
+
+        Returns:
+            {'entries': 按时间顺序的记录, 'next_before': 下一页的before参数（没有更早的记录时为None）, 'total': 总条数}
+        """
+        # 没有溢出文件时只能读取内存中的记录
+        available = 0 if self.spill_path else (self.records[0][0] if self.records else self.total)
+        stop = self.total if before is None else max(0, min(before, self.total))
+        start = max(available, stop - limit)
+
+        buffer_first = self._spill_buffer[0][0] if self._spill_buffer else self.total
+        memory_first = self.records[0][0] if self.records else self.total
+        records = self._read_spilled(start, min(stop, buffer_first, memory_first))
+        records += [record for record in self._spill_buffer if start <= record[0] < stop]
+        records += [record for record in self.records if start <= record[0] < stop]
+
+        return {
+            'entries': [self.render(record) for record in records],
+            'next_before': start if start > available else None,
+            'total': self.total
+        }
+
+    # ==================== 快照 ====================
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """可以JSON序列化的快照（未写入文件的溢出记录一起保存）"""
+        return {
+            'records': [list(record) for record in self.records],
+            'spill_buffer': [list(record) for record in self._spill_buffer],
+            'total': self.total,
+            'epoch': self.epoch,
+            'epoch_start': self.epoch_start,
+            'spilled': self.spilled,
+            'names': list(self.names),
+            'seats': dict(self._seats)
+        }
+
+    @classmethod
+    def from_snapshot(cls, room_id: str, snapshot: Dict[str, Any]) -> 'GameLog':
+        """从快照恢复"""
+        log = cls(room_id)
+        log.records.extend(tuple(record) for record in snapshot['records'])
+        log._spill_buffer = [tuple(record) for record in snapshot['spill_buffer']]
+        log.total = snapshot['total']
+        log.epoch = snapshot['epoch']
+        log.epoch_start = snapshot['epoch_start']
+        log.spilled = snapshot['spilled']
+        log._fresh = False  # 文件中可能已经有快照之后写入的记录，按序号覆盖写入，不清空
+        log.names = list(snapshot['names'])
+        log._seats = dict(snapshot['seats'])
+        return log
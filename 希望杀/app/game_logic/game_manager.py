@@ -1,6 +1,20 @@
-from typing import Dict, Optional
-from .game_state import GameState
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .bot import BOT_ID_PREFIX, BOT_NAME, is_bot
+from .game_log import SpillChunk
+from .game_state import Action, GameState, MAX_PLAYERS
+from .room_executor import RoomExecutor
+from .room_store import MemoryRoomStore, RoomStore, StoreWriter
+from .persistence import SnapshotWriter
+from .sessions import SessionRegistry
+import threading
+import time
 import uuid
+import zlib
+
+# 共享存储中其他进程的大厅摘要的缓存时间（秒），期间大厅请求不扫描共享存储
+LOBBY_CACHE_TTL = 1.0
 
 class GameManager:
     """游戏管理器 - 单例模式"""
@@ -11,27 +25,422 @@ class GameManager:
         if cls._instance is None:
             cls._instance = super(GameManager, cls).__new__(cls)
             cls._instance.games = {}  # 存储所有游戏房间
+            cls._instance.lobby = {}  # 大厅索引：{room_id: 房间摘要}
+            cls._instance._lobby_list = None  # 缓存的大厅列表，索引变化时失效
+            cls._instance._remote_lobby = None  # 共享存储中其他进程的房间摘要：(读取时间, [摘要])
+            cls._instance._shared_lobby = None  # 共享存储时的大厅列表：(合并时的_lobby_list, 合并后的列表)
+            cls._instance._create_lock = threading.Lock()  # 防止并发创建同一个房间
+            cls._instance.executor = RoomExecutor()  # 每个房间串行执行状态修改
+            cls._instance.store = MemoryRoomStore()  # 房间状态存储后端
+            cls._instance.worker_index = 0  # 当前进程的编号
+            cls._instance.worker_urls = []  # 所有进程的访问地址，按编号排列
+            cls._instance.persistence = None  # 房间快照的后台写入器
+            cls._instance.store_writer = None  # 共享存储的后台写入器，为空时直接写入存储后端
+            cls._instance.activity = OrderedDict()  # 房间最后活动时间：{room_id: monotonic}，最久未活动的在前
+            cls._instance.player_rooms = {}  # 玩家所在的房间：{player_id: room_id}
+            cls._instance.disconnected = OrderedDict()  # 断线玩家：{player_id: 断线时间}，按断线顺序
+            cls._instance._activity_lock = threading.Lock()  # 保护activity和disconnected的顺序
+            cls._instance.sweeper = None  # 房间回收线程
+            cls._instance.sessions = SessionRegistry()  # 会话令牌，断线重连时恢复原来的座位
+            cls._instance.bots = None  # 机器人的搜索进程池（BotPool），为空表示不启用AI对手
+            cls._instance.deadlines = None  # 闪避窗口、回合时限和断线宽限（RoomDeadlines），为空表示不限时
+            cls._instance.matchmaker = None  # 快速匹配队列（MatchQueue），为空表示不启用
         return cls._instance
     
-    def create_game(self, room_id: str) -> GameState:
-        """创建新游戏"""
-        if room_id in self.games:
-            return self.games[room_id]
-            
-        game_state = GameState(room_id)
-        self.games[room_id] = game_state
-        return game_state
+    def configure(self, store: Optional[RoomStore] = None, worker_index: int = 0,
+                  worker_urls: Optional[List[str]] = None, persistence: Optional[SnapshotWriter] = None,
+                  store_writer: Optional[StoreWriter] = None):
+        """
+        配置存储后端和多进程路由
+        
+        Args:
+            store: 房间存储后端，默认进程内字典
+            worker_index: 当前进程的编号
+            worker_urls: 所有进程的访问地址，为空表示单进程
+            persistence: 房间快照的后台写入器，为空表示不持久化
+            store_writer: 共享存储的后台写入器（写入store），为空时每次修改直接写入store
+        """
+        self.store = store or MemoryRoomStore()
+        self.worker_index = worker_index
+        self.worker_urls = list(worker_urls or [])
+        self.persistence = persistence
+        if persistence:
+            # 游戏日志的溢出记录随快照一起取出，由快照写入线程写入文件
+            persistence.collect = partial(self.snapshot_rooms, spill=True)
+        self.store_writer = store_writer
+        if store_writer:
+            store_writer.collect = self.snapshot_rooms
+        self._remote_lobby = None
+        
+        # 重启后大厅先列出已保存的房间（快照和共享存储中自己负责的房间），房间状态在第一次访问时再恢复；
+        # 同时记入活动时间，一直没有人打开的房间由回收线程按TTL删除
+        saved = persistence.summaries() if persistence else []
+        if self.store.shared:
+            saved += self.store.summaries()
+        for entry in saved:
+            if self.owns(entry['id']) and entry['id'] not in self.games:
+                self.lobby[entry['id']] = entry
+                self.touch(entry['id'])
+        self._lobby_list = None
+    
+    @property
+    def worker_count(self) -> int:
+        return max(1, len(self.worker_urls))
+    
+    def owner_of(self, room_id: str) -> int:
+        """房间所属的进程编号（按房间ID的crc32取模，所有进程计算结果一致）"""
+        return zlib.crc32(room_id.encode('utf-8')) % self.worker_count
+    
+    def owns(self, room_id: str) -> bool:
+        """当前进程是否负责这个房间"""
+        return self.owner_of(room_id) == self.worker_index
+    
+    def owner_url(self, room_id: str) -> Optional[str]:
+        """负责这个房间的进程地址，单进程时返回None"""
+        if not self.worker_urls:
+            return None
+        return self.worker_urls[self.owner_of(room_id)]
+    
+    def run_in_room(self, room_id: str, fn: Callable, *args, **kwargs) -> Any:
+        """在房间的邮箱中串行执行fn并返回结果，同一房间的修改不会并发"""
+        return self.executor.call(room_id, fn, *args, **kwargs)
+    
+    def create_game(self, room_id: str, room_name: Optional[str] = None, seed: Optional[int] = None) -> GameState:
+        """
+        创建新游戏
+        
+        Args:
+            seed: 房间的随机种子，默认随机生成；指定种子可以重放房间的洗牌
+        """
+        with self._create_lock:
+            existing = self.get_game(room_id)
+            if existing:
+                return existing
+                
+            game_state = GameState(room_id, seed=seed)
+            entry = {
+                'id': room_id,
+                'name': room_name or f'房间 {room_id}',
+                'players': 0,
+                'max_players': MAX_PLAYERS,
+                'status': game_state.game_phase
+            }
+            # 只缓存自己负责的房间，其他进程负责的房间写入共享存储后由所属进程加载
+            if self.owns(room_id):
+                self.games[room_id] = game_state
+                self.lobby[room_id] = entry
+                self._lobby_list = None
+                self.touch(room_id)
+            self._save(room_id, game_state, entry)
+            return game_state
+    
+    def _save(self, room_id: str, game: GameState, entry: dict):
+        """
+        标记房间需要写入存储后端和快照（快照由后台线程在房间的邮箱中生成，序列化和I/O都在后台线程中）
+        
+        没有后台写入器或者房间由其他进程负责（不在本进程的邮箱中）时直接写入存储后端。
+        """
+        if self.store_writer and room_id in self.games:
+            self.store_writer.schedule(room_id)
+        else:
+            self.store.save(room_id, game, entry)
+        if self.persistence:
+            self.persistence.schedule(room_id)
+    
+    def snapshot_rooms(self, room_ids, spill: bool = False) -> Dict[str, Tuple[dict, dict]]:
+        """
+        在各房间的邮箱中生成快照和大厅摘要（后台写入线程调用，各房间并行）
+        
+        Args:
+            spill: 同时取出游戏日志的溢出记录，在调用线程中写入文件（快照写入线程）
+        
+        Returns:
+            {room_id: (快照, 大厅摘要)}，已经删除的房间不返回
+        """
+        futures = {room_id: self.executor.submit(room_id, self._snapshot_room, room_id, spill)
+                   for room_id in room_ids if room_id in self.games}
+        snapshots = {}
+        chunks = []
+        for room_id, future in futures.items():
+            try:
+                item = future.result()
+            except Exception as e:
+                print(f'生成房间 {room_id} 的快照失败: {e}')
+                continue
+            if item is not None:
+                snapshots[room_id] = item[:2]
+                chunks.append(item[2])
+        self._write_spills(chunks)
+        return snapshots
+    
+    def _snapshot_room(self, room_id: str, spill: bool = False) -> Optional[Tuple[dict, dict, Optional[SpillChunk]]]:
+        """房间当前的快照、大厅摘要和要写入的日志溢出记录（在房间的邮箱中调用）"""
+        game = self.games.get(room_id)
+        entry = self.lobby.get(room_id)
+        if game is None or entry is None:
+            return None
+        # 先取出溢出记录：快照中的spilled和缓冲区与这一批一致，写完之前恢复的房间会按序号重新写入
+        chunk = game.game_log.take_spill() if spill else None
+        return game.to_snapshot(), dict(entry), chunk
+    
+    def spill_logs(self) -> int:
+        """
+        把各房间游戏日志的溢出记录写入文件（没有快照写入线程时由回收线程调用）
+        
+        Returns:
+            写入的房间数
+        """
+        if self.persistence:
+            return 0  # 快照写入线程生成快照时一起写入
+        futures = {room_id: self.executor.submit(room_id, self._take_spill, room_id)
+                   for room_id, game in list(self.games.items()) if game.game_log.spill_pending}
+        chunks = []
+        for room_id, future in futures.items():
+            try:
+                chunks.append(future.result())
+            except Exception as e:
+                print(f'取出房间 {room_id} 的日志失败: {e}')
+        return self._write_spills(chunks)
+    
+    def _take_spill(self, room_id: str) -> Optional[SpillChunk]:
+        """取出房间日志的溢出记录（在房间的邮箱中调用）"""
+        game = self.games.get(room_id)
+        return game.game_log.take_spill() if game is not None else None
+    
+    @staticmethod
+    def _write_spills(chunks: List[Optional[SpillChunk]]) -> int:
+        """在调用线程中写入日志的溢出记录，失败的记录留在房间的缓冲区中，下次重新写入"""
+        written = 0
+        for chunk in chunks:
+            if chunk is None:
+                continue
+            try:
+                chunk.write()
+                written += 1
+            except OSError as e:
+                print(f'写入日志文件 {chunk.path} 失败: {e}')
+        return written
+    
+    def _sync_lobby(self, room_id: str):
+        """同步单个房间的大厅摘要（O(1)）并保存到存储后端"""
+        game = self.games.get(room_id)
+        entry = self.lobby.get(room_id)
+        if not game or not entry:
+            return
+        
+        self.touch(room_id)
+        player_count = len(game.players)
+        if entry['players'] != player_count or entry['status'] != game.game_phase:
+            # 替换而不是原地修改，已经返回出去的列表不受影响
+            self.lobby[room_id] = dict(entry, players=player_count, status=game.game_phase)
+            self._lobby_list = None
+        
+        self._save(room_id, game, self.lobby[room_id])
+    
+    def get_lobby(self) -> List[dict]:
+        """获取大厅房间列表，不序列化任何游戏状态"""
+        if self._lobby_list is None:
+            self._lobby_list = list(self.lobby.values())
+        if not self.store.shared:
+            return self._lobby_list
+        
+        # 共享存储中包含所有进程的房间：自己负责的房间总是用内存中的索引，
+        # 其他进程的房间从共享存储读取并缓存LOBBY_CACHE_TTL秒，大厅请求不会每次扫描整个存储
+        now = time.monotonic()
+        remote = self._remote_lobby
+        if remote is None or now - remote[0] >= LOBBY_CACHE_TTL:
+            remote = self._remote_lobby = (now, [entry for entry in self.store.summaries()
+                                                 if not self.owns(entry['id'])])
+            self._shared_lobby = None
+        merged = self._shared_lobby
+        if merged is None or merged[0] is not self._lobby_list:
+            merged = self._shared_lobby = (self._lobby_list, self._lobby_list + remote[1])
+        return merged[1]
     
     def get_game(self, room_id: str) -> Optional[GameState]:
-        """获取游戏状态"""
-        return self.games.get(room_id)
+        """获取游戏状态（共享存储或快照中的房间在第一次访问时加载）"""
+        game = self.games.get(room_id)
+        if game is not None or not self.owns(room_id):
+            return game
+        
+        entry = None
+        if self.store_writer:
+            loaded = self.store_writer.load(room_id)
+            if loaded is not None:
+                game, entry = loaded
+        elif self.store.shared:
+            game = self.store.load(room_id)
+            if game is not None:
+                entry = self.store.summary(room_id)
+        if game is None and self.persistence:
+            saved = self.persistence.load(room_id)
+            if saved is not None:
+                snapshot, entry = saved
+                game = GameState.from_snapshot(snapshot)
+                print(f'从快照恢复房间 {room_id}，版本 {game.version}')
+        
+        if game is not None:
+            self.games[room_id] = game
+            self.lobby[room_id] = dict(entry or {'id': room_id, 'name': f'房间 {room_id}'},
+                                       players=len(game.players),
+                                       max_players=MAX_PLAYERS,
+                                       status=game.game_phase)
+            self._lobby_list = None
+            self.touch(room_id)
+            self._restore_seats(room_id, game)
+        return game
+    
+    def _restore_seats(self, room_id: str, game: GameState):
+        """
+        恢复房间后重新登记座位：玩家所在的房间、会话令牌，并把所有玩家记为断线
+        
+        恢复时没有任何连接，玩家凭保存的令牌恢复座位；一直没有回来的玩家由断线宽限和回收线程处理。
+        """
+        now = time.monotonic()
+        for player_id in game.players:
+            if is_bot(player_id):
+                continue
+            self.player_rooms[player_id] = room_id
+            token = game.session_tokens.get(player_id)
+            if token:
+                self.sessions.restore(room_id, player_id, token)
+            with self._activity_lock:
+                self.disconnected.setdefault(player_id, now)
+        if self.deadlines:
+            self.executor.submit(room_id, self.deadlines.sync, room_id)
+    
+    def issue_session(self, room_id: str, player_id: str) -> str:
+        """为入座的玩家发放会话令牌，令牌记录在房间中随快照保存（在房间的邮箱中调用）"""
+        token = self.sessions.issue(room_id, player_id)
+        game = self.games.get(room_id)
+        if game is not None and player_id in game.players:
+            game.session_tokens[player_id] = token
+            self._sync_lobby(room_id)
+        return token
     
     def remove_game(self, room_id: str) -> bool:
-        """移除游戏"""
-        if room_id in self.games:
-            del self.games[room_id]
-            return True
-        return False
+        """移除游戏（包括重启后从快照列出、还没有加载的房间）"""
+        game = self.games.pop(room_id, None)
+        if game is None and room_id not in self.lobby:
+            return False
+        if game is not None:
+            game.game_log.discard()
+            self._forget_players(room_id, game.players)
+            if self.deadlines:
+                self.deadlines.cancel_room(room_id)
+        self.lobby.pop(room_id, None)
+        self._lobby_list = None
+        self.executor.forget(room_id)
+        with self._activity_lock:
+            self.activity.pop(room_id, None)
+        if self.store_writer:
+            self.store_writer.schedule_delete(room_id)
+        else:
+            self.store.delete(room_id)
+        if self.persistence:
+            self.persistence.schedule_delete(room_id)
+        return True
+    
+    # ==================== 活动时间（房间回收用） ====================
+    
+    def touch(self, room_id: str):
+        """记录房间的活动时间，把房间移到活动顺序的末尾（O(1)）"""
+        with self._activity_lock:
+            self.activity[room_id] = time.monotonic()
+            self.activity.move_to_end(room_id)
+    
+    def last_active(self, room_id: str, default: Optional[float] = None) -> Optional[float]:
+        """房间的最后活动时间"""
+        return self.activity.get(room_id, default)
+    
+    def rooms_idle_since(self, before: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        按活动时间从旧到新列出房间
+        
+        Args:
+            before: 只列出最后活动时间早于这个时间的房间
+            limit: 最多列出的房间数
+        """
+        rooms = []
+        with self._activity_lock:
+            for room_id, active in self.activity.items():
+                if (before is not None and active >= before) or (limit is not None and len(rooms) >= limit):
+                    break
+                rooms.append(room_id)
+        return rooms
+    
+    def player_disconnected(self, sid: str) -> Optional[str]:
+        """
+        记录连接断开，玩家在保留时间内可以凭会话令牌恢复，超时后由回收线程移出房间
+        
+        Returns:
+            玩家所在的房间ID，不在任何房间时返回None
+        """
+        player_id = self.sessions.disconnect(sid)
+        room_id = self.player_rooms.get(player_id)
+        # 新连接已经先恢复了座位（快速匹配后大厅页面跳转到房间页面），旧连接断开不算断线
+        if room_id is not None and self.sessions.sid_of(player_id) == player_id:
+            with self._activity_lock:
+                # 再次断线时移到末尾，保持按断线时间排序（disconnected_before依赖这个顺序提前结束扫描）
+                self.disconnected[player_id] = time.monotonic()
+                self.disconnected.move_to_end(player_id)
+        return room_id
+    
+    def disconnected_before(self, before: float) -> List[Tuple[str, str]]:
+        """断线时间早于指定时间的玩家：[(player_id, room_id)]"""
+        players = []
+        with self._activity_lock:
+            for player_id, since in self.disconnected.items():
+                if since >= before:
+                    break
+                room_id = self.player_rooms.get(player_id)
+                if room_id is not None:
+                    players.append((player_id, room_id))
+        return players
+    
+    def disconnected_longer_than(self, player_id: str, before: float) -> bool:
+        """玩家是否在指定时间之前断线且一直没有回来"""
+        since = self.disconnected.get(player_id)
+        return since is not None and since < before
+    
+    def _forget_players(self, room_id: str, player_ids):
+        """清理房间中玩家的房间记录和断线记录"""
+        for player_id in list(player_ids):
+            if self.player_rooms.get(player_id) == room_id:
+                del self.player_rooms[player_id]
+                self.sessions.drop(player_id)
+                with self._activity_lock:
+                    self.disconnected.pop(player_id, None)
+    
+    def resume_session(self, room_id: str, token: str, sid: str,
+                       since_version: Optional[int] = None) -> Optional[dict]:
+        """
+        新连接凭会话令牌恢复原来的座位（在房间的邮箱中调用）
+        
+        Args:
+            since_version: 客户端最后的状态版本，为空时返回完整状态
+        
+        Returns:
+            {'player_id': 原来的玩家ID, 'patches': [...]}，变更日志不足时为完整状态；
+            令牌无效或玩家已经不在房间时返回None
+        """
+        game = self.get_game(room_id)
+        if not game:
+            return None
+        session = self.sessions.resume(token, room_id, sid)
+        if session is None or session.player_id not in game.players:
+            return None
+        
+        player_id = session.player_id
+        with self._activity_lock:
+            self.disconnected.pop(player_id, None)
+        self.touch(room_id)
+        
+        if since_version is None:
+            update = self.get_state_view(room_id, player_id)
+        else:
+            update = self.get_state_since(room_id, since_version, player_id)
+        return dict(update, player_id=player_id)
     
     def add_player_to_game(self, room_id: str, player_id: str, player_name: str) -> bool:
         """添加玩家到游戏"""
@@ -39,7 +448,23 @@ class GameManager:
         if not game:
             game = self.create_game(room_id)
         
-        return game.add_player(player_id, player_name)
+        success = game.add_player(player_id, player_name)
+        if success:
+            self.player_rooms[player_id] = room_id
+        self._sync_lobby(room_id)
+        return success
+    
+    def add_bot_to_game(self, room_id: str, name: str = BOT_NAME) -> Optional[str]:
+        """
+        让机器人占用房间的一个空座位
+        
+        Returns:
+            机器人的玩家ID，房间已满时返回None
+        """
+        player_id = f'{BOT_ID_PREFIX}{uuid.uuid4().hex[:8]}'
+        if not self.add_player_to_game(room_id, player_id, name):
+            return None
+        return player_id
     
     def remove_player_from_game(self, room_id: str, player_id: str) -> bool:
         """从游戏中移除玩家"""
@@ -48,10 +473,13 @@ class GameManager:
             return False
         
         success = game.remove_player(player_id)
+        self._forget_players(room_id, (player_id,))
         
-        # 如果没有玩家了，删除游戏
-        if not game.players:
+        # 如果没有玩家了（只剩机器人也算），删除游戏
+        if all(is_bot(pid) for pid in game.players):
             self.remove_game(room_id)
+        else:
+            self._sync_lobby(room_id)
         
         return success
     
@@ -61,7 +489,9 @@ class GameManager:
         if not game:
             return False
         
-        return game.start_game()
+        success = game.start_game()
+        self._sync_lobby(room_id)
+        return success
     
     def use_card(self, room_id: str, player_id: str, card_index: int, target_id: Optional[str] = None) -> bool:
         """使用卡牌"""
@@ -69,7 +499,9 @@ class GameManager:
         if not game:
             return False
         
-        return game.use_card(player_id, card_index, target_id)
+        success = game.use_card(player_id, card_index, target_id)
+        self._sync_lobby(room_id)
+        return success
     
     def end_turn(self, room_id: str, player_id: str) -> bool:
         """结束回合"""
@@ -77,7 +509,9 @@ class GameManager:
         if not game:
             return False
         
-        return game.end_turn(player_id)
+        success = game.end_turn(player_id)
+        self._sync_lobby(room_id)
+        return success
     
     def draw_card(self, room_id: str, player_id: str):
         """抽牌"""
@@ -85,7 +519,19 @@ class GameManager:
         if not game:
             return None
         
-        return game.draw_card(player_id)
+        card = game.draw_card(player_id)
+        self._sync_lobby(room_id)
+        return card
+    
+    def apply_action(self, room_id: str, player_id: str, action: Action) -> bool:
+        """执行GameState.legal_actions给出的动作（机器人使用）"""
+        game = self.get_game(room_id)
+        if not game:
+            return False
+        
+        success = game.apply_action(player_id, action)
+        self._sync_lobby(room_id)
+        return success
     
     def resolve_attack(self, room_id: str) -> bool:
         """结算攻击"""
@@ -93,16 +539,76 @@ class GameManager:
         if not game:
             return False
         
-        return game.resolve_attack()
+        success = game.resolve_attack()
+        self._sync_lobby(room_id)
+        return success
+    
+    def check_game_over(self, room_id: str) -> Optional[str]:
+        """检查游戏是否结束，返回获胜者ID"""
+        game = self.get_game(room_id)
+        if not game:
+            return None
+        
+        winner = game.check_game_over()
+        self._sync_lobby(room_id)
+        return winner
     
     def get_game_state(self, room_id: str) -> Optional[dict]:
         """获取游戏状态"""
         game = self.get_game(room_id)
         if not game:
             return None
-        
+
+        # 先提交未同步的变化，保证完整状态和版本号一致
+        game.commit_changes()
         return game.to_dict()
-    
+
+    def get_state_patch(self, room_id: str) -> Optional[dict]:
+        """提交房间的状态变化并返回增量补丁"""
+        game = self.get_game(room_id)
+        if not game:
+            return None
+
+        return game.commit_changes()
+
+    def get_state_view(self, room_id: str, viewer_id: Optional[str] = None) -> Optional[dict]:
+        """获取指定观看者视角的游戏状态（公开状态帧 + 自己的手牌）"""
+        game = self.get_game(room_id)
+        if not game:
+            return None
+
+        game.commit_changes()
+        return game.to_view(viewer_id)
+
+    def get_state_since(self, room_id: str, version: int, viewer_id: Optional[str] = None) -> Optional[dict]:
+        """
+        获取客户端从指定版本同步到最新版本所需的数据
+
+        Returns:
+            {'patches': [...], 'actions': 观看者的可用操作}，变更日志不足时返回观看者视角的完整状态
+        """
+        game = self.get_game(room_id)
+        if not game:
+            return None
+
+        game.commit_changes()
+        patches = game.patches_since(version)
+        if patches is None:
+            return game.to_view(viewer_id)
+        update = {'patches': [game.project_patch(patch, viewer_id) for patch in patches]}
+        actions = game.action_view(viewer_id)
+        if actions is not None:
+            update['actions'] = actions
+        return update
+
+    def get_log_page(self, room_id: str, before: Optional[int] = None, limit: int = 50) -> Optional[dict]:
+        """分页获取房间的完整游戏日志（包括已经溢出到文件的记录）"""
+        game = self.get_game(room_id)
+        if not game:
+            return None
+
+        return game.game_log.page(before, limit)
+
     def get_all_games(self) -> Dict[str, dict]:
         """获取所有游戏状态"""
         return {
@@ -1,27 +1,84 @@
-from typing import Dict, List, Any, Optional
-from .card import Card, CardType
+from typing import Dict, List, Any, Optional, Tuple
+from collections import deque
+from .card import Card, DeckCard
+from .catalog import CARD_CATALOG, build_deck
+from .effects import EFFECTS_BY_KIND
+from .hand import Hand
+from .rng import new_seed, stream
+from .statuses import StatusBoard
+from .game_log import (GameLog, NO_INDEX, LOG_PLAYER_JOINED, LOG_PLAYER_LEFT, LOG_GAME_STARTED, LOG_CARD_DRAWN,
+                       LOG_DECK_RESHUFFLED, LOG_ATTACK_DECLARED, LOG_TURN_ENDED, LOG_GAME_WON, LOG_GAME_DRAW,
+                       LOG_GAME_ENDED)
 import random
-import uuid
+
+# 每个房间的玩家上限
+MAX_PLAYERS = 2
+
+# 变更日志保留的补丁数量，客户端落后超过这个数量时需要重新获取完整状态
+JOURNAL_SIZE = 64
+
+# 玩家公开字段，增量补丁只比较这些字段
+PLAYER_PATCH_FIELDS = ('name', 'san', 'max_san', 'equipment', 'status', 'homework_used_this_turn')
+
+# 快照格式版本，格式变化时递增
+SNAPSHOT_FORMAT = 3
+
+# 状态帧和补丁中携带的最近日志条数
+LOG_WINDOW = 10
+
+# 动作格式：('use', 手牌索引, 目标ID) / ('resolve',) / ('end',)
+Action = Tuple
+ACTION_USE = 'use'
+ACTION_RESOLVE = 'resolve'
+ACTION_END = 'end'
+
+# 不带参数的动作，legal_actions复用同一个元组
+_RESOLVE = (ACTION_RESOLVE,)
+_END = (ACTION_END,)
 
 class GameState:
     """游戏状态管理器"""
     
-    def __init__(self, room_id: str):
+    def __init__(self, room_id: str, headless: bool = False, seed: Optional[int] = None):
+        """
+        初始化游戏状态
+        
+        Args:
+            room_id: 房间ID
+            headless: 无界面模式（批量模拟用），不打印调试信息也不记录游戏日志
+            seed: 洗牌使用的随机种子，默认随机生成；相同的种子和操作序列得到相同的对局
+        """
         self.room_id = room_id
+        self.headless = headless
+        self.seed = new_seed() if seed is None else seed  # 房间的随机种子（不发送给客户端）
+        self.shuffles = 0  # 已经洗牌的次数，第n次洗牌使用由(seed, n)派生的随机流
         self.players = {}  # 玩家信息
         self.current_turn = None  # 当前回合玩家
         self.game_phase = "waiting"  # 游戏阶段: waiting, playing, finished
         self.deck = []  # 牌堆
         self.discard_pile = []  # 弃牌堆
-        self.game_log = []  # 游戏日志
+        self.game_log = GameLog(room_id)  # 游戏日志（固定容量，旧记录溢出到文件）
         self.pending_attack = None  # 待处理的攻击
         self.attack_target = None  # 攻击目标
         self.waiting_for_dodge = False  # 是否等待闪避
         self.turn_card_usage = {}  # 回合使用记录：{player_id: {card_name: count}}
+        self.turn_number = 0  # 本局已经进行的回合数，状态的持续时间按它计算
+        self.statuses = StatusBoard()  # 生效中的状态效果（按阶段索引，玩家的status字段是它的副本）
+        self.session_tokens = {}  # 座位的会话令牌：{player_id: token}，随快照保存，重启后凭令牌恢复座位
+        
+        # 增量同步：版本号与变更日志
+        self.version = 0  # 状态版本号，每次提交变更后递增
+        self.journal = deque(maxlen=JOURNAL_SIZE)  # 变更日志：[(version, patch, public_patch)]
+        self._public_frame = None  # 按版本缓存的公开状态帧：(version, frame)
+        self._action_views = None  # 按版本缓存的每名玩家的可用动作：(version, {player_id: view})
+        self._shadow_players = {}  # 上次提交时的玩家字段和手牌ID
+        self._shadow_fields = {}  # 上次提交时的全局字段
+        self._log_epoch = 0  # 上次提交时的日志局数
+        self._log_cursor = 0  # 上次提交时的日志总条数
         
     def add_player(self, player_id: str, player_name: str) -> bool:
         """添加玩家到游戏"""
-        if len(self.players) >= 2:  # 限制2人游戏
+        if len(self.players) >= MAX_PLAYERS:  # 限制2人游戏
             return False
             
         self.players[player_id] = {
@@ -29,7 +86,7 @@ class GameState:
             'name': player_name,
             'san': 4,  # 初始san值
             'max_san': 4,  # 最大san值
-            'hand_cards': [],  # 手牌
+            'hand_cards': Hand(),  # 手牌（按卡牌种类索引）
             'equipment': [],  # 装备
             'status': [],  # 状态效果
             'homework_used_this_turn': False  # 本回合是否已使用作业牌
@@ -39,11 +96,8 @@ class GameState:
         self.turn_card_usage[player_id] = {}
         
         # 记录日志
-        self.game_log.append({
-            'type': 'player_joined',
-            'player': player_name,
-            'message': f'{player_name} 加入了游戏'
-        })
+        if not self.headless:
+            self.game_log.append(LOG_PLAYER_JOINED, self._seat(player_id))
         
         return True
     
@@ -53,15 +107,14 @@ class GameState:
             player_name = self.players[player_id]['name']
             del self.players[player_id]
             
-            # 清理回合使用记录
+            # 清理回合使用记录和状态
             if player_id in self.turn_card_usage:
                 del self.turn_card_usage[player_id]
+            self.statuses.drop_player(player_id)
+            self.session_tokens.pop(player_id, None)
             
-            self.game_log.append({
-                'type': 'player_left',
-                'player': player_name,
-                'message': f'{player_name} 离开了游戏'
-            })
+            if not self.headless:
+                self.game_log.append(LOG_PLAYER_LEFT, self.game_log.seat(player_id, player_name))
             
             # 如果游戏正在进行，结束游戏
             if self.game_phase == "playing":
@@ -72,23 +125,26 @@ class GameState:
     
     def start_game(self) -> bool:
         """开始游戏"""
-        if len(self.players) != 2:
+        if len(self.players) != MAX_PLAYERS:
             return False
             
         # 清理所有玩家的手牌和状态
         for player_id in self.players:
-            self.players[player_id]['hand_cards'] = []
+            self.players[player_id]['hand_cards'].clear()
             self.players[player_id]['homework_used_this_turn'] = False
             self.players[player_id]['san'] = 4  # 重置san值
+            self.players[player_id]['status'] = []
             self.turn_card_usage[player_id] = {}  # 清理回合使用记录
             
         # 清理游戏状态
         self.deck = []
         self.discard_pile = []
-        self.game_log = []
+        self.game_log.reset()
         self.pending_attack = None
         self.attack_target = None
         self.waiting_for_dodge = False
+        self.turn_number = 0
+        self.statuses.clear()
             
         self.game_phase = "playing"
         self.initialize_deck()
@@ -99,117 +155,22 @@ class GameState:
         self.draw_card(self.current_turn)
         self.draw_card(self.current_turn)
         
-        self.game_log.append({
-            'type': 'game_started',
-            'message': '游戏开始！'
-        })
+        if not self.headless:
+            self.game_log.append(LOG_GAME_STARTED, arg0=self.seed, arg1=self.shuffles - 1)
         
         return True
     
     def initialize_deck(self):
-        """初始化牌堆"""
-        self.deck = []
-        
-        # 添加作业牌
-        homework_cards = [
-            ("一套卷子", "对目标造成1点伤害"),
-            ("线性代数", "其他所有敌对玩家需要弃掉一张'一套卷子'，否则对其造成1点作业伤害"),
-            ("清算时刻", "指定一个目标对其造成N点作业伤害，N=本回合使用过的'一套卷子'的数量"),
-        ]
-        
-        for name, desc in homework_cards:
-            if name == "一套卷子":
-                count = 3  # 一套卷子3张
-            elif name == "线性代数":
-                count = 2  # 线性代数2张
-            elif name == "清算时刻":
-                count = 1  # 清算时刻1张
-            else:
-                count = 2  # 默认2张
-            
-            for _ in range(count):
-                if name == "一套卷子":
-                    from .card import HomeworkCard
-                    card = HomeworkCard(
-                        card_id=str(uuid.uuid4()),
-                        name=name,
-                        description=desc
-                    )
-                elif name == "线性代数":
-                    from .card import LinearAlgebraCard
-                    card = LinearAlgebraCard(card_id=str(uuid.uuid4()))
-                elif name == "清算时刻":
-                    from .card import SettlementCard
-                    card = SettlementCard(card_id=str(uuid.uuid4()))
-                else:
-                    from .card import HomeworkCard
-                    card = HomeworkCard(
-                        card_id=str(uuid.uuid4()),
-                        name=name,
-                        description=desc
-                    )
-                self.deck.append(card)
-        
-        # 添加体术牌
-        physical_cards = [
-            ("运动", "恢复1点san值"),
-            ("休息", "恢复1点san值"),
-            ("冥想", "恢复1点san值"),
-            ("挠痒", "指定一名玩家，弃掉他的一张手牌"),
-            ("泰山压顶", "指定一个目标对其造成N点伤害，N=(当前的san值/2)"),
-        ]
-        
-        # 添加驳回牌
-        dodge_cards = [
-            ("驳回", "闪避一次攻击"),
-        ]
-        
-        for name, desc in physical_cards:
-            if name in ["运动", "休息", "冥想"]:
-                count = 2  # 基础体术牌2张
-            elif name == "挠痒":
-                count = 1  # 挠痒1张
-            elif name == "泰山压顶":
-                count = 1  # 泰山压顶1张
-            else:
-                count = 2  # 默认2张
-            
-            for _ in range(count):
-                if name in ["运动", "休息", "冥想"]:
-                    from .card import PhysicalCard
-                    card = PhysicalCard(
-                        card_id=str(uuid.uuid4()),
-                        name=name,
-                        description=desc
-                    )
-                elif name == "挠痒":
-                    from .card import ScratchCard
-                    card = ScratchCard(card_id=str(uuid.uuid4()))
-                elif name == "泰山压顶":
-                    from .card import TaishanCard
-                    card = TaishanCard(card_id=str(uuid.uuid4()))
-                else:
-                    from .card import PhysicalCard
-                    card = PhysicalCard(
-                        card_id=str(uuid.uuid4()),
-                        name=name,
-                        description=desc
-                    )
-                self.deck.append(card)
-        
-        # 添加驳回牌
-        for name, desc in dodge_cards:
-            for _ in range(4):  # 驳回牌4张
-                from .card import DodgeCard
-                card = DodgeCard(
-                    card_id=str(uuid.uuid4()),
-                    name=name,
-                    description=desc
-                )
-                self.deck.append(card)
+        """初始化牌堆（卡牌目录在导入时加载，这里只生成引用模板的卡牌实例）"""
+        self.deck = build_deck()
         
         # 洗牌
-        random.shuffle(self.deck)
+        self.shuffle(self.deck)
+    
+    def shuffle(self, cards: List[DeckCard]):
+        """用房间的下一条洗牌随机流原地洗牌"""
+        stream(self.seed, 'shuffle', self.shuffles).shuffle(cards)
+        self.shuffles += 1
     
     def deal_initial_cards(self):
         """发初始手牌"""
@@ -218,7 +179,8 @@ class GameState:
             for _ in range(4):
                 if self.deck:
                     card = self.deck.pop()
-                    print(f"DEBUG: 发牌给 {self.players[player_id]['name']}, 卡牌类型: {type(card)}, 卡牌名称: {card.name}")
+                    if not self.headless:
+                        print(f"DEBUG: 发牌给 {self.players[player_id]['name']}, 卡牌类型: {type(card)}, 卡牌名称: {card.name}")
                     self.players[player_id]['hand_cards'].append(card)
     
     def draw_card(self, player_id: str) -> Optional[Card]:
@@ -232,14 +194,12 @@ class GameState:
             
         if self.deck:
             card = self.deck.pop()
-            print(f"DEBUG: {self.players[player_id]['name']} 抽牌, 卡牌类型: {type(card)}, 卡牌名称: {card.name}")
+            if not self.headless:
+                print(f"DEBUG: {self.players[player_id]['name']} 抽牌, 卡牌类型: {type(card)}, 卡牌名称: {card.name}")
             self.players[player_id]['hand_cards'].append(card)
             
-            self.game_log.append({
-                'type': 'card_drawn',
-                'player': self.players[player_id]['name'],
-                'message': f'{self.players[player_id]["name"]} 抽了一张牌'
-            })
+            if not self.headless:
+                self.game_log.append(LOG_CARD_DRAWN, self._seat(player_id))
             
             return card
         return None
@@ -250,12 +210,10 @@ class GameState:
             # 直接使用弃牌堆的卡牌对象，而不是复制
             self.deck = self.discard_pile
             self.discard_pile = []
-            random.shuffle(self.deck)
+            self.shuffle(self.deck)
             
-            self.game_log.append({
-                'type': 'deck_reshuffled',
-                'message': '牌堆重新洗牌'
-            })
+            if not self.headless:
+                self.game_log.append(LOG_DECK_RESHUFFLED)
     
     def use_card(self, player_id: str, card_index: int, target_id: Optional[str] = None) -> bool:
         """使用卡牌"""
@@ -270,225 +228,83 @@ class GameState:
         
         # 确保card是卡牌对象而不是字典
         if isinstance(card, dict):
-            print(f"错误：手牌中存储的是字典而不是卡牌对象")
+            if not self.headless:
+                print(f"错误：手牌中存储的是字典而不是卡牌对象")
             return False
         
-        # 记录卡牌使用
-        self.record_card_usage(player_id, card.name)
-        
-        # 检查作业牌使用限制
-        if card.card_type == CardType.HOMEWORK:
-            if card.name == "一套卷子":
-                # 一套卷子每回合只能使用一次
-                if self.get_card_usage_count(player_id, "一套卷子") > 1:
-                    print(f"错误：{player['name']} 本回合已经使用过一套卷子")
-                    return False
-            elif card.name == "线性代数":
-                # 线性代数不受使用次数限制
-                pass
-            elif card.name == "清算时刻":
-                # 清算时刻不受使用次数限制
-                pass
-            else:
-                # 其他作业牌不受限制
-                pass
-        
-        # 处理驳回牌（闪）
-        if card.name == "驳回":
-            if not self.waiting_for_dodge or player_id != self.attack_target:
-                print(f"错误：{player['name']} 不能在此刻使用驳回牌")
-                return False
-            
-            # 检查是否可以用驳回牌闪避当前攻击
-            if self.pending_attack and self.pending_attack['card'].name == "线性代数":
-                print(f"错误：{player['name']} 不能用驳回牌闪避线性代数")
-                return False
-            
-            # 使用驳回牌闪避攻击
-            self.waiting_for_dodge = False
-            self.pending_attack = None
-            self.attack_target = None
-            
-            # 移除手牌，加入弃牌堆
-            player['hand_cards'].pop(card_index)
-            self.discard_pile.append(card)
-            
-            # 添加游戏日志
-            self.game_log.append({
-                'type': 'card_used',
-                'player': player['name'],
-                'card': card.name,
-                'message': f'{player["name"]} 使用了 {card.name} 闪避了攻击'
-            })
-            
-            return True
-        
-        # 处理一套卷子抵消线性代数
-        if card.name == "一套卷子" and self.waiting_for_dodge and player_id == self.attack_target:
-            if self.pending_attack and self.pending_attack['card'].name == "线性代数":
-                # 使用一套卷子抵消线性代数
+        effect = EFFECTS_BY_KIND[card.template.kind]
+
+        # 检查每回合使用次数限制（一套卷子每回合只能使用一次），只有真正打出的牌才记录使用
+        if not self._within_usage_limit(player_id, card, effect):
+            if not self.headless:
+                print(f"错误：{player['name']} 本回合已经使用过{card.name}")
+            return False
+
+        # 状态效果（眩晕、石化、变羊……）禁止使用手牌
+        responding = self.waiting_for_dodge and player_id == self.attack_target and bool(self.pending_attack)
+        if self.statuses and not self.statuses.can_play(self, player_id, card, responding):
+            if not self.headless:
+                print(f"错误：{player['name']} 的状态不允许使用{card.name}")
+            return False
+
+        # 被攻击者回应挂起的攻击（驳回闪避、一套卷子抵消线性代数）
+        if responding:
+            pending = EFFECTS_BY_KIND[self.pending_attack['card'].kind]
+            if effect.respond(self, player_id, card, pending):
+                self.record_card_usage(player_id, card.name)
                 self.waiting_for_dodge = False
                 self.pending_attack = None
                 self.attack_target = None
-                
+
                 # 移除手牌，加入弃牌堆
-                player['hand_cards'].pop(card_index)
+                player['hand_cards'].remove(card.card_id)
                 self.discard_pile.append(card)
-                
-                # 添加游戏日志
-                self.game_log.append({
-                    'type': 'card_used',
-                    'player': player['name'],
-                    'card': card.name,
-                    'message': f'{player["name"]} 使用了一套卷子抵消了线性代数的攻击'
-                })
-                
                 return True
-        
+
+        # 只能作为回应打出的卡牌
+        if effect.reactive:
+            if not self.headless:
+                print(f"错误：{player['name']} 不能在此刻使用{card.name}")
+            return False
+
         # 检查是否在自己的回合（对于主动使用的卡牌）
         if self.current_turn != player_id:
-            print(f"错误：{player['name']} 不是当前回合玩家，不能使用卡牌")
+            if not self.headless:
+                print(f"错误：{player['name']} 不是当前回合玩家，不能使用卡牌")
             return False
-        
-        # 处理特殊卡牌（需要等待闪避的作业牌）
-        if card.name in ["线性代数", "清算时刻"]:
-            if target_id and target_id in self.players:
-                # 设置待处理的攻击
-                self.pending_attack = {
-                    'attacker': player_id,
-                    'target': target_id,
-                    'card': card
-                }
-                self.attack_target = target_id
-                self.waiting_for_dodge = True
-                
-                # 移除手牌，加入弃牌堆
-                player['hand_cards'].pop(card_index)
-                self.discard_pile.append(card)
-                
-                # 添加游戏日志
-                target_name = self.players[target_id]['name']
-                self.game_log.append({
-                    'type': 'card_used',
-                    'player': player['name'],
-                    'card': card.name,
-                    'target': target_name,
-                    'message': f'{player["name"]} 对 {target_name} 使用了 {card.name}，等待闪避'
-                })
-                
-                return True
-        
-        # 处理立即生效的特殊卡牌
-        if card.name in ["泰山压顶"]:
-            if target_id and target_id in self.players:
-                # 设置待处理的攻击
-                self.pending_attack = {
-                    'attacker': player_id,
-                    'target': target_id,
-                    'card': card
-                }
-                self.attack_target = target_id
-                self.waiting_for_dodge = True
-                
-                # 移除手牌，加入弃牌堆
-                player['hand_cards'].pop(card_index)
-                self.discard_pile.append(card)
-                
-                # 添加游戏日志
-                target_name = self.players[target_id]['name']
-                self.game_log.append({
-                    'type': 'card_used',
-                    'player': player['name'],
-                    'card': card.name,
-                    'target': target_name,
-                    'message': f'{player["name"]} 对 {target_name} 使用了 {card.name}，等待闪避'
-                })
-                
-                return True
-        
-        # 处理普通作业牌攻击
-        if card.card_type == CardType.HOMEWORK:
-            if target_id and target_id in self.players:
-                # 设置待处理的攻击
-                self.pending_attack = {
-                    'attacker': player_id,
-                    'target': target_id,
-                    'card': card
-                }
-                self.attack_target = target_id
-                self.waiting_for_dodge = True
-                
-                # 移除手牌，加入弃牌堆
-                player['hand_cards'].pop(card_index)
-                self.discard_pile.append(card)
-                
-                # 添加游戏日志
-                target_name = self.players[target_id]['name']
-                self.game_log.append({
-                    'type': 'card_used',
-                    'player': player['name'],
-                    'card': card.name,
-                    'target': target_name,
-                    'message': f'{player["name"]} 对 {target_name} 使用了 {card.name}，等待闪避'
-                })
-                
-                return True
-        
-        # 处理普通体术牌（恢复）
-        if card.card_type == CardType.PHYSICAL and card.name not in ["驳回", "挠痒", "泰山压顶"]:
-            if target_id and target_id in self.players:
-                # 体术牌恢复san值
-                target = target_id if target_id else player_id
-                current_san = self.players[target]['san']
-                max_san = self.players[target]['max_san']
-                self.players[target]['san'] = min(max_san, current_san + 1)
-                print(f"体术牌效果：{player['name']} 为 {self.players[target]['name']} 恢复1点san值，当前san值：{self.players[target]['san']}")
-            
-            # 移除手牌，加入弃牌堆
-            player['hand_cards'].pop(card_index)
-            self.discard_pile.append(card)
-            
-            # 添加游戏日志
-            target_name = self.players[target_id]['name'] if target_id and target_id in self.players else '自己'
-            self.game_log.append({
-                'type': 'card_used',
-                'player': player['name'],
-                'card': card.name,
-                'target': target_name,
-                'message': f'{player["name"]} 使用了 {card.name}'
-            })
-            
-            return True
-        
-        # 处理挠痒卡牌
-        if card.name == "挠痒":
-            if target_id and target_id in self.players:
-                # 挠痒效果：直接弃掉目标玩家的第一张手牌
-                target_hand = self.players[target_id]['hand_cards']
-                if target_hand:
-                    discarded_card = target_hand.pop(0)
-                    effect_msg = f'弃掉了 {self.players[target_id]["name"]} 的一张手牌'
-                else:
-                    effect_msg = f'{self.players[target_id]["name"]} 没有手牌可弃'
-                
-                # 移除手牌，加入弃牌堆
-                player['hand_cards'].pop(card_index)
-                self.discard_pile.append(card)
-                
-                # 添加游戏日志
-                target_name = self.players[target_id]['name']
-                self.game_log.append({
-                    'type': 'card_used',
-                    'player': player['name'],
-                    'target': target_name,
-                    'card': card.name,
-                    'effect': effect_msg,
-                    'message': f'{player["name"]} 对 {target_name} 使用了 {card.name}，{effect_msg}'
-                })
-                
-                return True
-        
-        return False
+
+        # 等待被攻击者回应期间不能出牌（否则会覆盖挂起的攻击）
+        if self.waiting_for_dodge:
+            if not self.headless:
+                print(f"错误：{player['name']} 需要等待对方回应攻击")
+            return False
+
+        if not effect.validate(self, player_id, target_id):
+            return False
+
+        # 记录卡牌使用
+        self.record_card_usage(player_id, card.name)
+
+        # 移除手牌，加入弃牌堆
+        player['hand_cards'].remove(card.card_id)
+        self.discard_pile.append(card)
+
+        if effect.needs_dodge:
+            # 设置待处理的攻击，等待目标回应或结算
+            self.pending_attack = {
+                'attacker': player_id,
+                'target': target_id,
+                'card': card
+            }
+            self.attack_target = target_id
+            self.waiting_for_dodge = True
+
+            if not self.headless:
+                self.game_log.append(LOG_ATTACK_DECLARED, self._seat(player_id), self._seat(target_id), card.kind)
+        else:
+            effect.play(self, player_id, card, target_id)
+
+        return True
     
     def resolve_attack(self) -> bool:
         """结算攻击（当没有闪避时）"""
@@ -499,87 +315,7 @@ class GameState:
         target_id = self.pending_attack['target']
         card = self.pending_attack['card']
         
-        # 处理线性代数卡牌
-        if card.name == "线性代数":
-            # 获取所有敌对玩家（除了攻击者）
-            enemies = [pid for pid in self.players.keys() if pid != attacker_id]
-            
-            for enemy_id in enemies:
-                enemy_hand = self.players[enemy_id]['hand_cards']
-                # 检查是否有"一套卷子"
-                has_yitaojuanzi = any(card_obj.name == '一套卷子' for card_obj in enemy_hand)
-                
-                if has_yitaojuanzi:
-                    # 如果有"一套卷子"，需要弃掉一张
-                    # 找到第一张"一套卷子"并移除
-                    for i, card_obj in enumerate(enemy_hand):
-                        if card_obj.name == '一套卷子':
-                            enemy_hand.pop(i)
-                            break
-                    
-                    effect_msg = f"{self.players[enemy_id]['name']} 弃掉了一张'一套卷子'"
-                else:
-                    # 没有"一套卷子"，直接造成伤害
-                    old_san = self.players[enemy_id]['san']
-                    self.players[enemy_id]['san'] = max(0, self.players[enemy_id]['san'] - 1)
-                    new_san = self.players[enemy_id]['san']
-                    print(f"DEBUG: 线性代数对 {self.players[enemy_id]['name']} 造成伤害: {old_san} -> {new_san}")
-                    effect_msg = f"{self.players[enemy_id]['name']} 没有'一套卷子'，受到1点伤害，san值从{old_san}降至{new_san}"
-                
-                # 记录游戏日志
-                self.game_log.append({
-                    'type': 'attack_resolved',
-                    'player': self.players[attacker_id]['name'],
-                    'target': self.players[enemy_id]['name'],
-                    'card': card.name,
-                    'effect': effect_msg,
-                    'message': effect_msg
-                })
-        # 处理清算时刻卡牌
-        elif card.name == "清算时刻":
-            # 计算本回合使用过的"一套卷子"数量
-            yitaojuanzi_count = self.get_card_usage_count(attacker_id, '一套卷子')
-            
-            # 造成伤害
-            damage = yitaojuanzi_count
-            self.players[target_id]['san'] = max(0, self.players[target_id]['san'] - damage)
-            
-            # 记录游戏日志
-            self.game_log.append({
-                'type': 'card_used',
-                'player': self.players[attacker_id]['name'],
-                'target': self.players[target_id]['name'],
-                'card': card.name,
-                'effect': f'对 {self.players[target_id]["name"]} 造成 {damage} 点伤害（本回合使用了 {yitaojuanzi_count} 张一套卷子）'
-            })
-        # 处理泰山压顶卡牌
-        elif card.name == "泰山压顶":
-            # 泰山压顶效果：造成N点伤害，N=(攻击者当前san值/2)
-            attacker_san = self.players[attacker_id]['san']
-            damage = max(1, attacker_san // 2)  # 至少造成1点伤害
-            self.players[target_id]['san'] = max(0, self.players[target_id]['san'] - damage)
-            
-            # 记录游戏日志
-            self.game_log.append({
-                'type': 'attack_resolved',
-                'player': self.players[attacker_id]['name'],
-                'target': self.players[target_id]['name'],
-                'card': card.name,
-                'message': f'{self.players[attacker_id]["name"]} 的 {card.name} 对 {self.players[target_id]["name"]} 造成了 {damage} 点伤害（基于攻击者san值 {attacker_san}）'
-            })
-        else:
-            # 普通攻击牌造成1点伤害
-            self.players[target_id]['san'] = max(0, self.players[target_id]['san'] - 1)
-            print(f"攻击结算：{self.players[attacker_id]['name']} 对 {self.players[target_id]['name']} 造成1点伤害，剩余san值：{self.players[target_id]['san']}")
-            
-            # 添加游戏日志
-            self.game_log.append({
-                'type': 'attack_resolved',
-                'player': self.players[attacker_id]['name'],
-                'target': self.players[target_id]['name'],
-                'card': card.name,
-                'message': f'{self.players[attacker_id]["name"]} 的 {card.name} 对 {self.players[target_id]["name"]} 造成了1点伤害'
-            })
+        EFFECTS_BY_KIND[card.kind].resolve(self, attacker_id, target_id, card)
         
         # 清除待处理的攻击
         self.pending_attack = None
@@ -599,6 +335,13 @@ class GameState:
         # 如果有待处理的攻击，结算攻击
         if self.pending_attack:
             self.resolve_attack()
+
+        # 弃牌阶段和弃牌阶段后的状态效果（恐惧、诅咒、中毒……），没有状态时跳过所有阶段
+        statuses = self.statuses
+        if statuses and self.game_phase == "playing":
+            statuses.discard_phase(self, player_id)
+            if self._status_knockout():
+                return True
             
         # 重置当前玩家的作业牌使用标记
         self.players[player_id]['homework_used_this_turn'] = False
@@ -611,25 +354,57 @@ class GameState:
         current_index = player_ids.index(player_id)
         next_index = (current_index + 1) % len(player_ids)
         self.current_turn = player_ids[next_index]
+        self.turn_number += 1
         
         # 重置下一个玩家的作业牌使用标记
         self.players[self.current_turn]['homework_used_this_turn'] = False
         
-        # 新回合开始，抽两张牌
-        print(f"DEBUG: {self.players[self.current_turn]['name']} 开始抽牌，当前手牌数量: {len(self.players[self.current_turn]['hand_cards'])}")
-        self.draw_card(self.current_turn)
-        print(f"DEBUG: 抽第一张牌后，手牌数量: {len(self.players[self.current_turn]['hand_cards'])}")
-        self.draw_card(self.current_turn)
-        print(f"DEBUG: 抽第二张牌后，手牌数量: {len(self.players[self.current_turn]['hand_cards'])}")
-        
-        self.game_log.append({
-            'type': 'turn_ended',
-            'player': self.players[player_id]['name'],
-            'next_player': self.players[self.current_turn]['name'],
-            'message': f'{self.players[player_id]["name"]} 的回合结束，轮到 {self.players[self.current_turn]["name"]}'
-        })
+        # 新回合开始，摸牌阶段抽两张牌（状态效果可以改变摸牌数量）
+        draws = statuses.draw_count(self, self.current_turn, 2) if statuses else 2
+        drawn = []
+        if not self.headless:
+            print(f"DEBUG: {self.players[self.current_turn]['name']} 开始抽牌，当前手牌数量: {len(self.players[self.current_turn]['hand_cards'])}")
+        for _ in range(draws):
+            card = self.draw_card(self.current_turn)
+            if card is not None:
+                drawn.append(card)
+            if not self.headless:
+                print(f"DEBUG: 抽第{len(drawn)}张牌后，手牌数量: {len(self.players[self.current_turn]['hand_cards'])}")
+        if not self.headless:
+            self.game_log.append(LOG_TURN_ENDED, self._seat(player_id), self._seat(self.current_turn))
+
+        # 摸牌阶段后的状态效果（灼烧、混乱、魅惑），之后移除在这个回合到期的状态
+        if statuses:
+            if self.game_phase == "playing":
+                statuses.after_draw(self, self.current_turn, drawn)
+                self._status_knockout()
+            statuses.expire(self)
         
         return True
+
+    def deal_damage(self, source_id: Optional[str], target_id: str, damage: int, damage_type: str) -> int:
+        """
+        对玩家造成伤害（卡牌效果和状态效果都经过这里）
+
+        Args:
+            source_id: 造成伤害的玩家，状态造成的伤害为None
+            damage_type: 伤害类型（statuses.DAMAGE_*），决定哪些状态会修改伤害
+
+        Returns:
+            经过状态修改后实际造成的伤害
+        """
+        if self.statuses:
+            damage = self.statuses.modify_damage(self, source_id, target_id, damage, damage_type)
+        target = self.players[target_id]
+        target['san'] = max(0, target['san'] - damage)
+        return damage
+
+    def _status_knockout(self) -> bool:
+        """状态效果造成伤害后检查游戏是否结束"""
+        if any(player['san'] <= 0 for player in self.players.values()):
+            self.check_game_over()
+            return self.game_phase != "playing"
+        return False
     
     def check_game_over(self) -> Optional[str]:
         """检查游戏是否结束，返回获胜者ID"""
@@ -644,17 +419,11 @@ class GameState:
             
             # 添加游戏结束日志
             if winner_id:
-                winner_name = self.players[winner_id]['name']
-                self.game_log.append({
-                    'type': 'game_over',
-                    'winner': winner_name,
-                    'message': f'游戏结束！{winner_name} 获胜！'
-                })
+                if not self.headless:
+                    self.game_log.append(LOG_GAME_WON, self._seat(winner_id))
             else:
-                self.game_log.append({
-                    'type': 'game_over',
-                    'message': '游戏结束！平局！'
-                })
+                if not self.headless:
+                    self.game_log.append(LOG_GAME_DRAW)
             
             return winner_id
         
@@ -663,46 +432,277 @@ class GameState:
     def end_game(self):
         """结束游戏"""
         self.game_phase = "finished"
-        self.game_log.append({
-            'type': 'game_ended',
-            'message': '游戏结束'
-        })
+        if not self.headless:
+            self.game_log.append(LOG_GAME_ENDED)
     
     def record_card_usage(self, player_id: str, card_name: str):
         """记录卡牌使用"""
-        if player_id not in self.turn_card_usage:
-            self.turn_card_usage[player_id] = {}
-        
-        if card_name not in self.turn_card_usage[player_id]:
-            self.turn_card_usage[player_id][card_name] = 0
-        
-        self.turn_card_usage[player_id][card_name] += 1
+        usage = self.turn_card_usage.get(player_id)
+        if usage is None:
+            usage = self.turn_card_usage[player_id] = {}
+        usage[card_name] = usage.get(card_name, 0) + 1
     
     def get_card_usage_count(self, player_id: str, card_name: str) -> int:
         """获取指定卡牌的使用次数"""
-        if player_id in self.turn_card_usage and card_name in self.turn_card_usage[player_id]:
-            return self.turn_card_usage[player_id][card_name]
-        return 0
+        usage = self.turn_card_usage.get(player_id)
+        return usage.get(card_name, 0) if usage else 0
+    
+    def _seat(self, player_id: Optional[str]) -> int:
+        """玩家在游戏日志中的编号"""
+        if player_id not in self.players:
+            return NO_INDEX
+        return self.game_log.seat(player_id, self.players[player_id]['name'])
     
     def clear_turn_usage(self, player_id: str):
         """清除指定玩家的回合使用记录"""
         if player_id in self.turn_card_usage:
             self.turn_card_usage[player_id] = {}
     
+    def _pending_attack_key(self):
+        """待处理攻击的比较键"""
+        if not self.pending_attack:
+            return None
+        card = self.pending_attack['card']
+        return (self.pending_attack['attacker'], self.pending_attack['target'], getattr(card, 'card_id', None))
+
+    def _serialize_pending_attack(self) -> Optional[Dict[str, Any]]:
+        """序列化待处理的攻击"""
+        if not self.pending_attack:
+            return None
+        return {
+            'attacker': self.pending_attack['attacker'],
+            'target': self.pending_attack['target'],
+            'card': self.pending_attack['card'].to_dict() if hasattr(self.pending_attack['card'], 'to_dict') else self.pending_attack['card'],
+            'type': self.pending_attack.get('type')
+        }
+
+    def commit_changes(self) -> Optional[Dict[str, Any]]:
+        """
+        提交自上次提交以来的状态变化
+
+        与上次提交时记录的影子状态比较，只序列化发生变化的部分。
+        没有变化时返回None且版本号不变。
+
+        Returns:
+            增量补丁（包含新版本号），或None
+        """
+        players_patch = {}
+        hands_patch = {}
+
+        # 离开的玩家
+        removed_players = [pid for pid in self._shadow_players if pid not in self.players]
+        for pid in removed_players:
+            del self._shadow_players[pid]
+
+        for pid, player in self.players.items():
+            shadow = self._shadow_players.get(pid)
+            hand = player['hand_cards']
+            hand_ids = hand.ids()
+
+            if shadow is None:
+                # 新加入的玩家，发送全部公开字段和手牌
+                fields = {field: self._copy_field(player[field]) for field in PLAYER_PATCH_FIELDS}
+                players_patch[pid] = dict(fields, id=pid, hand_count=len(hand))
+                hands_patch[pid] = {'cards': [card.to_dict() for card in hand]}
+                self._shadow_players[pid] = {'fields': fields, 'hand': hand_ids}
+                continue
+
+            # 比较公开字段
+            changed = {}
+            for field in PLAYER_PATCH_FIELDS:
+                if player[field] != shadow['fields'][field]:
+                    value = self._copy_field(player[field])
+                    changed[field] = value
+                    shadow['fields'][field] = value
+
+            # 比较手牌：手牌只会从中间移除或在末尾追加
+            old_ids = shadow['hand']
+            if hand_ids != old_ids:
+                hands_patch[pid] = self._diff_hand(old_ids, hand, hand_ids)
+                shadow['hand'] = hand_ids
+                if len(hand_ids) != len(old_ids):
+                    changed['hand_count'] = len(hand_ids)
+
+            if changed:
+                players_patch[pid] = changed
+
+        # 比较全局字段
+        current_fields = {
+            'current_turn': self.current_turn,
+            'game_phase': self.game_phase,
+            'deck_count': len(self.deck),
+            'discard_count': len(self.discard_pile),
+            'waiting_for_dodge': self.waiting_for_dodge,
+            'attack_target': self.attack_target,
+            'pending_attack': self._pending_attack_key(),
+            'turn_card_usage': {pid: dict(usage) for pid, usage in self.turn_card_usage.items()},
+            'turn_number': self.turn_number
+        }
+        fields_patch = {}
+        for field, value in current_fields.items():
+            if field not in self._shadow_fields or self._shadow_fields[field] != value:
+                fields_patch[field] = value
+                self._shadow_fields[field] = value
+        if 'pending_attack' in fields_patch:
+            fields_patch['pending_attack'] = self._serialize_pending_attack()
+
+        # 新增的日志（start_game会开始新的一局日志），只在这里渲染要发送的几条
+        log_reset = self.game_log.epoch != self._log_epoch
+        new_logs = self.game_log.recent(LOG_WINDOW) if log_reset else self.game_log.since(self._log_cursor, LOG_WINDOW)
+        self._log_epoch = self.game_log.epoch
+        self._log_cursor = self.game_log.total
+
+        if not (players_patch or hands_patch or removed_players or fields_patch or new_logs or log_reset):
+            return None
+
+        self.version += 1
+        patch = {'version': self.version, 'base_version': self.version - 1}
+        if players_patch:
+            patch['players'] = players_patch
+        if removed_players:
+            patch['removed_players'] = removed_players
+        if hands_patch:
+            patch['hands'] = hands_patch
+        if fields_patch:
+            patch['fields'] = fields_patch
+        if log_reset:
+            patch['log_reset'] = True
+        if new_logs:
+            patch['log'] = new_logs
+
+        # 公开补丁不含手牌内容，所有观看者共用
+        public_patch = {key: value for key, value in patch.items() if key != 'hands'}
+        self.journal.append((self.version, patch, public_patch))
+        return patch
+
+    @staticmethod
+    def _copy_field(value):
+        """复制可变的字段值，避免影子状态被原地修改"""
+        return list(value) if isinstance(value, list) else value
+
+    @staticmethod
+    def _diff_hand(old_ids: List, hand: Hand, hand_ids: List) -> Dict[str, Any]:
+        """计算手牌的增量：移除的卡牌ID和追加的卡牌"""
+        new_set = set(hand_ids)
+        old_set = set(old_ids)
+        kept = [card_id for card_id in old_ids if card_id in new_set]
+
+        # 保留的卡牌必须是新手牌的前缀，否则顺序变了，发送完整手牌
+        if hand_ids[:len(kept)] != kept or any(card_id in old_set for card_id in hand_ids[len(kept):]):
+            return {'cards': [card.to_dict() for card in hand]}
+
+        return {
+            'removed': [card_id for card_id in old_ids if card_id not in new_set],
+            'added': [card.to_dict() for card in hand[len(kept):]]
+        }
+
+    def patches_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取指定版本之后的所有补丁
+
+        Args:
+            version: 客户端当前的版本号
+
+        Returns:
+            补丁列表；变更日志已不包含所需版本时返回None
+        """
+        if version > self.version:
+            return None
+        if version == self.version:
+            return []
+        if not self.journal or self.journal[0][0] > version + 1:
+            return None
+        return [patch for patch_version, patch, _ in self.journal if patch_version > version]
+
+    def project_patch(self, patch: Dict[str, Any], viewer_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        把补丁投影到指定观看者的视角
+
+        Args:
+            patch: commit_changes返回的补丁
+            viewer_id: 观看者的玩家ID，旁观者为None
+
+        Returns:
+            {'patch': 公开补丁, 'hand': 观看者自己的手牌变化（如有）}
+        """
+        public_patch = None
+        for patch_version, _, cached in reversed(self.journal):
+            if patch_version == patch['version']:
+                public_patch = cached
+                break
+        if public_patch is None:
+            public_patch = {key: value for key, value in patch.items() if key != 'hands'}
+
+        view = {'patch': public_patch}
+        hand = patch.get('hands', {}).get(viewer_id)
+        if hand is not None:
+            view['hand'] = hand
+        return view
+
+    def public_frame(self) -> Dict[str, Any]:
+        """
+        当前版本的公开状态帧
+
+        只包含所有人都能看到的信息（手牌只给出数量），每个版本只构建一次，
+        由所有玩家和旁观者共用。调用前应先commit_changes()。
+        """
+        if self._public_frame is not None and self._public_frame[0] == self.version:
+            return self._public_frame[1]
+
+        frame = {
+            'room_id': self.room_id,
+            'version': self.version,
+            'players': {
+                pid: {
+                    'id': p['id'],
+                    'name': p['name'],
+                    'san': p['san'],
+                    'max_san': p['max_san'],
+                    'hand_count': len(p['hand_cards']),
+                    'equipment': p['equipment'],
+                    'status': p['status'],
+                    'homework_used_this_turn': p['homework_used_this_turn']
+                }
+                for pid, p in self.players.items()
+            },
+            'current_turn': self.current_turn,
+            'game_phase': self.game_phase,
+            'deck_count': len(self.deck),
+            'discard_count': len(self.discard_pile),
+            'game_log': self.game_log.recent(LOG_WINDOW),
+            'waiting_for_dodge': self.waiting_for_dodge,
+            'attack_target': self.attack_target,
+            'turn_card_usage': self.turn_card_usage,
+            'pending_attack': self._serialize_pending_attack(),
+            'turn_number': self.turn_number
+        }
+        self._public_frame = (self.version, frame)
+        return frame
+
+    def to_view(self, viewer_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        指定观看者看到的游戏状态
+
+        Returns:
+            {'game_state': 共用的公开状态帧, 'private': 观看者自己的手牌和可用操作（旁观者为None）}
+        """
+        private = None
+        if viewer_id in self.players:
+            private = {
+                'player_id': viewer_id,
+                'hand_cards': [card.to_dict() for card in self.players[viewer_id]['hand_cards']],
+                'actions': self.action_view(viewer_id)
+            }
+        return {'game_state': self.public_frame(), 'private': private}
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
         # 处理pending_attack的序列化
-        pending_attack_dict = None
-        if self.pending_attack:
-            pending_attack_dict = {
-                'attacker': self.pending_attack['attacker'],
-                'target': self.pending_attack['target'],
-                'card': self.pending_attack['card'].to_dict() if hasattr(self.pending_attack['card'], 'to_dict') else self.pending_attack['card'],
-                'type': self.pending_attack.get('type')
-            }
-        
+        pending_attack_dict = self._serialize_pending_attack()
+
         return {
             'room_id': self.room_id,
+            'version': self.version,
             'players': {
                 pid: {
                     'id': p['id'],
@@ -720,9 +720,294 @@ class GameState:
             'game_phase': self.game_phase,
             'deck_count': len(self.deck),
             'discard_count': len(self.discard_pile),
-            'game_log': self.game_log[-10:],  # 只返回最近10条日志
+            'game_log': self.game_log.recent(LOG_WINDOW),  # 只返回最近10条日志
             'waiting_for_dodge': self.waiting_for_dodge,
             'attack_target': self.attack_target,
             'turn_card_usage': self.turn_card_usage,  # 添加回合使用记录
-            'pending_attack': pending_attack_dict  # 添加待处理攻击信息
+            'pending_attack': pending_attack_dict,  # 添加待处理攻击信息
+            'turn_number': self.turn_number
+        }
+
+    # ==================== 搜索接口 ====================
+
+    def to_act(self) -> Optional[str]:
+        """当前需要行动的玩家：等待闪避时是被攻击者，否则是当前回合玩家；对局未进行时为None"""
+        if self.game_phase != "playing":
+            return None
+        if self.waiting_for_dodge:
+            return self.attack_target
+        return self.current_turn
+
+    def _within_usage_limit(self, player_id: str, card: DeckCard, effect) -> bool:
+        """本回合是否还能使用这张牌"""
+        return effect.usage_limit is None or self.get_card_usage_count(player_id, card.template.name) < effect.usage_limit
+
+    def legal_actions(self, player_id: str) -> List[Action]:
+        """
+        列出玩家当前可以执行的动作
+
+        规则与use_card保持一致：被攻击时只能用能回应这次攻击的牌（每种牌给出第一张）或放弃回应，
+        自己的回合可以打出非回应牌或结束回合。
+        """
+        if self.game_phase != "playing" or player_id not in self.players:
+            return []
+        hand = self.players[player_id]['hand_cards']
+        usage = self.turn_card_usage.get(player_id) or {}
+        restricted = self.statuses.play_hooks(player_id) is not None  # 有限制出牌的状态时逐张校验
+
+        # 等待闪避：被攻击者选择回应或者直接结算
+        if self.waiting_for_dodge:
+            if player_id != self.attack_target or not self.pending_attack:
+                return []
+            actions = [_RESOLVE]
+            pending = EFFECTS_BY_KIND[self.pending_attack['card'].template.kind]
+            # 手牌按种类索引，先确定可以回应的种类，没有时不需要扫描手牌
+            kinds = set()
+            for kind in hand.kinds():
+                effect = EFFECTS_BY_KIND[kind]
+                if not effect.answers(pending):
+                    continue
+                card = hand.first(kind)
+                if effect.usage_limit is not None and usage.get(card.template.name, 0) >= effect.usage_limit:
+                    continue
+                if restricted and not self.statuses.can_play(self, player_id, card, True):
+                    continue
+                kinds.add(kind)
+            if kinds:
+                for index, card in enumerate(hand):
+                    kind = card.template.kind
+                    if kind in kinds:
+                        actions.append((ACTION_USE, index, None))
+                        kinds.discard(kind)
+                        if not kinds:
+                            break
+            return actions
+
+        if self.current_turn != player_id:
+            return []
+
+        opponents = None
+        actions = [_END]
+        for index, card in enumerate(hand):
+            template = card.template
+            effect = EFFECTS_BY_KIND[template.kind]
+            if effect.reactive:
+                continue
+            if effect.usage_limit is not None and usage.get(template.name, 0) >= effect.usage_limit:
+                continue
+            if restricted and not self.statuses.can_play(self, player_id, card, False):
+                continue
+            if effect.target_self:
+                actions.append((ACTION_USE, index, player_id))
+                continue
+            if opponents is None:
+                opponents = [pid for pid in self.players if pid != player_id]
+            for target_id in opponents:
+                if effect.validate(self, player_id, target_id):
+                    actions.append((ACTION_USE, index, target_id))
+        return actions
+
+    def action_view(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """
+        玩家当前可以执行的操作（随状态更新发给客户端）
+
+        每张手牌给出现在能否打出以及可以选择的目标（与use_card的校验一致），
+        另外给出能否结束回合、能否放弃回应。每个版本每名玩家只计算一次，调用前应先commit_changes()。
+
+        Returns:
+            {'version', 'options': [{'card_id', 'playable', 'targets'}]（按手牌顺序）, 'end_turn', 'resolve'}，
+            不是玩家或无界面模式（模拟和搜索只使用legal_actions）时返回None
+        """
+        if self.headless or player_id not in self.players:
+            return None
+        if self._action_views is None or self._action_views[0] != self.version:
+            self._action_views = (self.version, {})
+        views = self._action_views[1]
+        view = views.get(player_id)
+        if view is None:
+            view = views[player_id] = self._build_action_view(player_id)
+        return view
+
+    def _build_action_view(self, player_id: str) -> Dict[str, Any]:
+        playing = self.game_phase == "playing"
+        responding = playing and self.waiting_for_dodge and player_id == self.attack_target and bool(self.pending_attack)
+        my_turn = playing and not self.waiting_for_dodge and self.current_turn == player_id
+        pending = EFFECTS_BY_KIND[self.pending_attack['card'].kind] if responding else None
+
+        options = []
+        for card in self.players[player_id]['hand_cards']:
+            effect = EFFECTS_BY_KIND[card.kind]
+            targets = []
+            playable = False
+            if (self._within_usage_limit(player_id, card, effect)
+                    and self.statuses.can_play(self, player_id, card, responding)):
+                if responding:
+                    playable = effect.answers(pending)
+                elif my_turn and not effect.reactive:
+                    targets = [pid for pid in self.players if effect.validate(self, player_id, pid)]
+                    playable = bool(targets)
+            options.append({'card_id': card.card_id, 'playable': playable, 'targets': targets})
+
+        return {
+            'version': self.version,
+            'options': options,
+            'end_turn': playing and self.current_turn == player_id,
+            'resolve': responding
+        }
+
+    def apply_action(self, player_id: str, action: Action) -> bool:
+        """执行legal_actions给出的动作"""
+        kind = action[0]
+        if kind == ACTION_USE:
+            return self.use_card(player_id, action[1], action[2])
+        if kind == ACTION_RESOLVE:
+            return self.resolve_attack()
+        if kind == ACTION_END:
+            return self.end_turn(player_id)
+        return False
+
+    def clone(self, seed: Optional[int] = None) -> 'GameState':
+        """
+        复制一份无界面的游戏状态，供搜索时反复执行动作
+
+        卡牌实例不可变，牌堆、弃牌堆和手牌只复制列表和索引；
+        不复制游戏日志、变更日志和增量同步的影子状态。
+
+        Args:
+            seed: 副本的随机种子，默认随机生成（不沿用房间的种子，搜索无法预知之后的洗牌）
+        """
+        game = GameState(self.room_id, headless=True, seed=seed)
+        game.players = {
+            pid: dict(player,
+                      hand_cards=player['hand_cards'].copy(),
+                      equipment=list(player['equipment']),
+                      status=list(player['status']))
+            for pid, player in self.players.items()
         }
+        game.current_turn = self.current_turn
+        game.game_phase = self.game_phase
+        game.deck = list(self.deck)
+        game.discard_pile = list(self.discard_pile)
+        game.pending_attack = dict(self.pending_attack) if self.pending_attack else None
+        game.attack_target = self.attack_target
+        game.waiting_for_dodge = self.waiting_for_dodge
+        game.turn_card_usage = {pid: dict(usage) for pid, usage in self.turn_card_usage.items()}
+        game.turn_number = self.turn_number
+        game.statuses = self.statuses.copy()
+        game.version = self.version
+        return game
+
+    def determinize(self, viewer_id: str, rng: random.Random):
+        """
+        随机化观看者看不到的信息（在clone()得到的副本上调用）
+
+        其他玩家的手牌和牌堆放在一起重新洗牌，再按原来的张数发回；
+        观看者自己的手牌、弃牌堆和挂起的攻击都是已知信息，保持不变。
+        """
+        hidden = list(self.deck)
+        hands = []
+        for pid, player in self.players.items():
+            if pid != viewer_id:
+                hand = player['hand_cards']
+                hands.append((hand, len(hand)))
+                hidden.extend(hand)
+        rng.shuffle(hidden)
+
+        offset = 0
+        for hand, count in hands:
+            hand.clear()
+            for card in hidden[offset:offset + count]:
+                hand.append(card)
+            offset += count
+        self.deck = hidden[offset:]
+
+    # ==================== 快照 ====================
+
+    @staticmethod
+    def _encode_cards(cards: List[DeckCard]) -> List[List[int]]:
+        """卡牌编码为[卡牌ID, 种类编号]"""
+        return [[card.card_id, card.kind] for card in cards]
+
+    @staticmethod
+    def _decode_cards(items: List[List[int]]) -> List[DeckCard]:
+        """从[卡牌ID, 种类编号]还原引用卡牌目录模板的卡牌"""
+        return [DeckCard(card_id, CARD_CATALOG[kind]) for card_id, kind in items]
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """
+        生成可以JSON序列化的完整快照（包括手牌、牌堆顺序和弃牌堆）
+
+        返回的结构不引用游戏状态中的可变对象，可以交给其他线程写入磁盘。
+        """
+        pending_attack = None
+        if self.pending_attack:
+            pending_attack = {key: value for key, value in self.pending_attack.items() if key != 'card'}
+            pending_attack['card'] = self._encode_cards([self.pending_attack['card']])[0]
+
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'room_id': self.room_id,
+            'seed': self.seed,
+            'shuffles': self.shuffles,
+            'version': self.version,
+            'game_phase': self.game_phase,
+            'current_turn': self.current_turn,
+            'players': [
+                {
+                    'id': p['id'],
+                    'name': p['name'],
+                    'san': p['san'],
+                    'max_san': p['max_san'],
+                    'hand_cards': self._encode_cards(p['hand_cards']),
+                    'equipment': list(p['equipment']),
+                    'status': list(p['status']),
+                    'homework_used_this_turn': p['homework_used_this_turn']
+                }
+                for p in self.players.values()
+            ],
+            'deck': self._encode_cards(self.deck),
+            'discard_pile': self._encode_cards(self.discard_pile),
+            'pending_attack': pending_attack,
+            'attack_target': self.attack_target,
+            'waiting_for_dodge': self.waiting_for_dodge,
+            'turn_card_usage': {pid: dict(usage) for pid, usage in self.turn_card_usage.items()},
+            'turn_number': self.turn_number,
+            'session_tokens': dict(self.session_tokens),
+            'game_log': self.game_log.to_snapshot()
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> 'GameState':
+        """
+        从快照恢复游戏状态
+
+        恢复后的版本号与快照一致，变更日志为空，落后的客户端会收到完整状态。
+        随机种子和洗牌次数一并恢复，之后的洗牌与没有重启时相同（旧快照没有种子时重新生成）。
+        """
+        game = cls(snapshot['room_id'], seed=snapshot.get('seed'))
+        game.shuffles = snapshot.get('shuffles', 0)
+        game.game_phase = snapshot['game_phase']
+        game.current_turn = snapshot['current_turn']
+        for data in snapshot['players']:
+            player = dict(data)
+            player['hand_cards'] = Hand(cls._decode_cards(data['hand_cards']))
+            game.players[player['id']] = player
+        game.deck = cls._decode_cards(snapshot['deck'])
+        game.discard_pile = cls._decode_cards(snapshot['discard_pile'])
+        if snapshot['pending_attack']:
+            game.pending_attack = dict(snapshot['pending_attack'])
+            game.pending_attack['card'] = cls._decode_cards([snapshot['pending_attack']['card']])[0]
+        game.attack_target = snapshot['attack_target']
+        game.waiting_for_dodge = snapshot['waiting_for_dodge']
+        game.turn_card_usage = {pid: dict(usage) for pid, usage in snapshot['turn_card_usage'].items()}
+        game.turn_number = snapshot.get('turn_number', 0)
+        game.statuses = StatusBoard.from_players(game.players, game.turn_number)
+        game.session_tokens = dict(snapshot.get('session_tokens', {}))
+        if snapshot.get('format') == SNAPSHOT_FORMAT:
+            game.game_log = GameLog.from_snapshot(game.room_id, snapshot['game_log'])
+
+        # 以恢复后的状态作为增量同步的基准
+        game.commit_changes()
+        game.version = snapshot['version']
+        game.journal.clear()
+        return game
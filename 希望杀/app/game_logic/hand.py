@@ -0,0 +1,129 @@
+"""
+玩家手牌
+
+手牌按卡牌ID保存在有序字典中（插入顺序即客户端显示的顺序），同时按卡牌种类维护索引。
+"是否持有某种牌"、"某种牌有几张"、"弃掉一张某种牌"和按卡牌ID移除都是常数时间，
+规则引擎和机器人反复查询时不需要扫描整手牌。
+按显示位置访问使用缓存的有序列表，手牌变化后才重新生成。
+"""
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .card import DeckCard
+
+
+class Hand:
+    """一名玩家的手牌"""
+
+    __slots__ = ('_cards', '_by_kind', '_order')
+
+    def __init__(self, cards: Iterable[DeckCard] = ()):
+        """
+        Args:
+            cards: 初始手牌，按显示顺序排列
+        """
+        self._cards: Dict[int, DeckCard] = {}  # 卡牌ID -> 卡牌，按显示顺序
+        self._by_kind: Dict[int, Dict[int, DeckCard]] = {}  # 种类编号 -> {卡牌ID: 卡牌}，按加入顺序
+        self._order: Optional[List[DeckCard]] = None  # 按显示顺序缓存的卡牌列表，手牌变化时失效
+        for card in cards:
+            self.append(card)
+
+    # ==================== 有序列表接口 ====================
+
+    def append(self, card: DeckCard):
+        """把卡牌加到手牌末尾"""
+        self._cards[card.card_id] = card
+        self._order = None
+        kind = card.template.kind
+        cards_of_kind = self._by_kind.get(kind)
+        if cards_of_kind is None:
+            cards_of_kind = self._by_kind[kind] = {}
+        cards_of_kind[card.card_id] = card
+
+    def pop(self, index: int = -1) -> DeckCard:
+        """按显示位置移除并返回卡牌，首尾两端是常数时间"""
+        if not self._cards:
+            raise IndexError('手牌为空')
+        if index == 0:
+            card_id = next(iter(self._cards))
+        elif index == -1:
+            card_id = next(reversed(self._cards))
+        else:
+            card_id = self[index].card_id
+        return self.remove(card_id)
+
+    def clear(self):
+        """清空手牌"""
+        self._cards.clear()
+        self._by_kind.clear()
+        self._order = None
+
+    def __getitem__(self, index):
+        order = self._order
+        if order is None:
+            order = self._order = list(self._cards.values())
+        return order[index]
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __iter__(self) -> Iterator[DeckCard]:
+        return iter(self._cards.values())
+
+    def copy(self) -> 'Hand':
+        """复制手牌（卡牌是不可变的实例，只复制索引）"""
+        hand = Hand.__new__(Hand)
+        hand._cards = dict(self._cards)
+        hand._by_kind = {kind: dict(cards_of_kind) for kind, cards_of_kind in self._by_kind.items()}
+        hand._order = self._order
+        return hand
+
+    def __repr__(self):
+        return f'Hand({list(self._cards.values())!r})'
+
+    # ==================== 索引查询 ====================
+
+    def ids(self) -> List[int]:
+        """按显示顺序排列的卡牌ID"""
+        return list(self._cards)
+
+    def get(self, card_id: int) -> Optional[DeckCard]:
+        """按卡牌ID获取卡牌，不在手牌中时返回None"""
+        return self._cards.get(card_id)
+
+    def remove(self, card_id: int) -> DeckCard:
+        """按卡牌ID移除并返回卡牌"""
+        card = self._cards.pop(card_id)
+        self._order = None
+        kind = card.template.kind
+        cards_of_kind = self._by_kind[kind]
+        del cards_of_kind[card_id]
+        if not cards_of_kind:
+            del self._by_kind[kind]
+        return card
+
+    def count(self, kind: int) -> int:
+        """某种卡牌的张数"""
+        cards_of_kind = self._by_kind.get(kind)
+        return len(cards_of_kind) if cards_of_kind else 0
+
+    def has(self, kind: int) -> bool:
+        """是否持有某种卡牌"""
+        return kind in self._by_kind
+
+    def kinds(self) -> List[int]:
+        """手牌中持有的卡牌种类"""
+        return list(self._by_kind)
+
+    def first(self, kind: int) -> Optional[DeckCard]:
+        """最早加入手牌的一张某种卡牌，没有时返回None"""
+        cards_of_kind = self._by_kind.get(kind)
+        if not cards_of_kind:
+            return None
+        return next(iter(cards_of_kind.values()))
+
+    def discard_kind(self, kind: int) -> Optional[DeckCard]:
+        """移除并返回最早加入手牌的一张某种卡牌，没有时返回None"""
+        card = self.first(kind)
+        if card is not None:
+            self.remove(card.card_id)
+        return card
@@ -0,0 +1,347 @@
+"""
+快速匹配
+
+大厅中的玩家发送quick_match进入匹配队列，不需要轮询房间列表、挑选半满的房间。
+队列按(分数, 入队序号)保存在有序列表中，二分查找新玩家的位置后只需要比较左右相邻的两名玩家
+（分数最接近的对手一定与它相邻），查找对手为O(log n)。有序列表的插入和删除是O(n)的内存移动，
+排队人数在数万以内时远小于一次Socket.IO事件的开销。
+
+两名玩家的分差不超过双方允许范围中较大的一个时配对。允许范围从band开始，每等待一秒放宽widen_rate，
+最多max_band；后台线程每隔interval秒按等待顺序重新检查一遍，等待较久的玩家逐渐能和分差更大的对手配对。
+
+配对成功后为两名玩家创建新房间（当前进程负责的房间ID），在房间的邮箱中一次完成入座和开局：
+房间ID此前没有公开，其他事件不会插在两名玩家入座之间。入座期间取消匹配（离开队列、断开连接、手动加入房间）的玩家
+标记为已取消，不会入座；入座失败时删除房间，没有取消的玩家按原来的入队时间回到队列。
+"""
+import bisect
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 默认分数和分数范围
+DEFAULT_RATING = 1500
+MIN_RATING = 0
+MAX_RATING = 3000
+
+# 默认的匹配参数：初始允许分差、每秒放宽的分差、允许分差的上限、重新检查的间隔（秒）
+DEFAULT_BAND = 100.0
+DEFAULT_WIDEN_RATE = 25.0
+DEFAULT_MAX_BAND = 1000.0
+DEFAULT_INTERVAL = 1.0
+
+# 保留最近多少次配对的等待时间用于计算分位数
+WAIT_SAMPLES = 1024
+
+# 输出的等待时间分位数
+WAIT_PERCENTILES = (50, 90, 99)
+
+
+class Ticket:
+    """队列中的一名玩家"""
+
+    __slots__ = ('player_id', 'player_name', 'rating', 'enqueued', 'seq', 'cancelled')
+
+    def __init__(self, player_id: str, player_name: str, rating: float, enqueued: float, seq: int):
+        self.player_id = player_id
+        self.player_name = player_name
+        self.rating = rating
+        self.enqueued = enqueued  # 入队时间（clock()）
+        self.seq = seq  # 入队序号，分数相同时按入队顺序排列
+        self.cancelled = False  # 配对后、入座完成前取消了匹配
+
+    @property
+    def key(self) -> Tuple[float, int]:
+        return (self.rating, self.seq)
+
+
+def clamp_rating(rating: Any) -> float:
+    """把客户端提供的分数限制在有效范围内，无效时使用默认分数"""
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        return DEFAULT_RATING
+    if rating != rating:  # NaN
+        return DEFAULT_RATING
+    return min(MAX_RATING, max(MIN_RATING, rating))
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """已排序样本的分位数（最近秩），没有样本时为0"""
+    if not samples:
+        return 0.0
+    rank = max(1, -(-len(samples) * percent // 100))
+    return samples[int(rank) - 1]
+
+
+class MatchQueue:
+    """按分数配对的快速匹配队列"""
+
+    def __init__(self, game_manager, band: float = DEFAULT_BAND, widen_rate: float = DEFAULT_WIDEN_RATE,
+                 max_band: float = DEFAULT_MAX_BAND, interval: float = DEFAULT_INTERVAL,
+                 on_matched: Optional[Callable[[str, Tuple[Ticket, Ticket]], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            game_manager: 创建房间的GameManager
+            band: 刚入队时允许的分差
+            widen_rate: 每等待一秒放宽的分差
+            max_band: 允许分差的上限
+            interval: 后台线程重新检查队列的间隔
+            on_matched: 两名玩家入座并开局后在房间的邮箱中调用：(房间ID, (玩家1, 玩家2))
+            clock: 时钟，默认time.monotonic
+        """
+        self.game_manager = game_manager
+        self.band = band
+        self.widen_rate = widen_rate
+        self.max_band = max(band, max_band)
+        self.interval = interval
+        self.on_matched = on_matched
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[float, int]] = []  # 按(分数, 入队序号)排序
+        self._by_key: Dict[Tuple[float, int], Ticket] = {}
+        self._tickets: 'OrderedDict[str, Ticket]' = OrderedDict()  # 玩家ID -> 排队信息，等待最久的在前
+        self._seating: Dict[str, Ticket] = {}  # 已经配对、正在入座的玩家
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=WAIT_SAMPLES)  # 最近配对的等待时间（秒）
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.enqueued = 0
+        self.matched = 0  # 配对成功的对局数
+        self.cancelled = 0
+        self.failed = 0  # 入座失败、回到队列的次数
+        self.last_poll_ms = 0.0
+
+    # ==================== 队列 ====================
+
+    def enqueue(self, player_id: str, player_name: str, rating: Any = DEFAULT_RATING) -> Optional[str]:
+        """
+        玩家进入匹配队列，已经在队列中时更新名称和分数（保留原来的入队时间）
+
+        Returns:
+            立即配对成功时返回新房间的ID，否则返回None（包括玩家已经配对、正在入座）
+        """
+        now = self.clock()
+        with self._lock:
+            if player_id in self._seating:
+                return None
+            old = self._tickets.get(player_id)
+            enqueued = now
+            if old is not None:
+                self._remove(old)
+                enqueued = old.enqueued
+            ticket = Ticket(player_id, player_name, clamp_rating(rating), enqueued, next(self._seq))
+            self._insert(ticket)
+            if old is None:
+                self.enqueued += 1
+            pair = self._take_pair(ticket, now)
+        if pair is None:
+            return None
+        return self._seat(pair, now)
+
+    def cancel(self, player_id: str) -> bool:
+        """
+        玩家离开匹配队列（断开连接、手动加入房间时也调用）
+
+        已经配对、正在入座的玩家标记为已取消，入座时放弃这次配对
+
+        Returns:
+            不在队列中也没有正在入座时返回False
+        """
+        with self._lock:
+            ticket = self._tickets.get(player_id)
+            if ticket is not None:
+                self._remove(ticket)
+            else:
+                ticket = self._seating.get(player_id)
+                if ticket is None or ticket.cancelled:
+                    return False
+                ticket.cancelled = True
+            self.cancelled += 1
+        return True
+
+    def position(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """玩家在队列中的分数、已等待时间和当前允许的分差"""
+        now = self.clock()
+        with self._lock:
+            ticket = self._tickets.get(player_id)
+            if ticket is None:
+                return None
+            return {
+                'rating': ticket.rating,
+                'waited': now - ticket.enqueued,
+                'band': self.band_of(ticket, now),
+                'queue_depth': len(self._tickets)
+            }
+
+    def __len__(self) -> int:
+        return len(self._tickets)
+
+    def band_of(self, ticket: Ticket, now: float) -> float:
+        """玩家当前允许的分差（随等待时间放宽）"""
+        return min(self.max_band, self.band + self.widen_rate * max(0.0, now - ticket.enqueued))
+
+    def _insert(self, ticket: Ticket):
+        """加入有序列表和索引（调用方持有锁）"""
+        bisect.insort(self._keys, ticket.key)
+        self._by_key[ticket.key] = ticket
+        self._tickets[ticket.player_id] = ticket
+
+    def _remove(self, ticket: Ticket):
+        """从有序列表和索引中删除（调用方持有锁）"""
+        index = bisect.bisect_left(self._keys, ticket.key)
+        del self._keys[index]
+        del self._by_key[ticket.key]
+        del self._tickets[ticket.player_id]
+
+    def _take_pair(self, ticket: Ticket, now: float) -> Optional[Tuple[Ticket, Ticket]]:
+        """
+        为玩家找到分数最接近且在允许范围内的对手，找到时把两人移出队列（调用方持有锁）
+
+        分数最接近的对手一定与玩家在有序列表中相邻，只需要比较左右两名
+        """
+        index = bisect.bisect_left(self._keys, ticket.key)
+        best = None
+        for neighbour in (index - 1, index + 1):
+            if 0 <= neighbour < len(self._keys):
+                other = self._by_key[self._keys[neighbour]]
+                gap = abs(other.rating - ticket.rating)
+                if gap <= max(self.band_of(ticket, now), self.band_of(other, now)):
+                    if best is None or gap < abs(best.rating - ticket.rating):
+                        best = other
+        if best is None:
+            return None
+        self._remove(ticket)
+        self._remove(best)
+        self._seating[ticket.player_id] = ticket
+        self._seating[best.player_id] = best
+        # 等待较久的玩家在前
+        return (best, ticket) if best.enqueued <= ticket.enqueued else (ticket, best)
+
+    # ==================== 配对 ====================
+
+    def poll(self, now: Optional[float] = None) -> List[str]:
+        """
+        按等待顺序重新检查队列，放宽后能够配对的玩家入座
+
+        Args:
+            now: 当前时间（clock()），默认取当前值
+
+        Returns:
+            新房间的ID列表
+        """
+        started = time.perf_counter()
+        if now is None:
+            now = self.clock()
+        pairs = []
+        with self._lock:
+            for ticket in list(self._tickets.values()):
+                if ticket.player_id in self._tickets:
+                    pair = self._take_pair(ticket, now)
+                    if pair is not None:
+                        pairs.append(pair)
+        rooms = [room_id for room_id in (self._seat(pair, now) for pair in pairs) if room_id]
+        self.last_poll_ms = (time.perf_counter() - started) * 1000
+        return rooms
+
+    def _new_room_id(self) -> str:
+        """当前进程负责的新房间ID（两名玩家的连接都在当前进程）"""
+        while True:
+            room_id = str(uuid.uuid4())[:8]
+            if self.game_manager.owns(room_id) and self.game_manager.get_game(room_id) is None:
+                return room_id
+
+    def _seat(self, pair: Tuple[Ticket, Ticket], now: float) -> Optional[str]:
+        """创建房间，在房间的邮箱中让两名玩家入座并开局；失败时没有取消的玩家回到队列"""
+        game_manager = self.game_manager
+        room_id = self._new_room_id()
+        game_manager.create_game(room_id, f'快速匹配 {room_id}')
+        seated = game_manager.run_in_room(room_id, self._seat_in_room, room_id, pair)
+
+        with self._lock:
+            for ticket in pair:
+                self._seating.pop(ticket.player_id, None)
+            if seated:
+                self.matched += 1
+                for ticket in pair:
+                    self._waits.append(now - ticket.enqueued)
+                return room_id
+
+            self.failed += 1
+            for ticket in pair:
+                if (not ticket.cancelled and ticket.player_id not in self._tickets
+                        and ticket.player_id not in game_manager.player_rooms):
+                    self._insert(ticket)
+        return None
+
+    def _seat_in_room(self, room_id: str, pair: Tuple[Ticket, Ticket]) -> bool:
+        """在房间的邮箱中让两名玩家入座并开局，任何一步失败时删除房间"""
+        game_manager = self.game_manager
+        # 配对后取消了匹配或已经在其他房间中的玩家不能入座（入座会覆盖玩家所在的房间）
+        with self._lock:
+            available = all(not ticket.cancelled and ticket.player_id not in game_manager.player_rooms
+                            for ticket in pair)
+        seated = available and all(game_manager.add_player_to_game(room_id, ticket.player_id, ticket.player_name)
+                                   for ticket in pair)
+        if not seated or not game_manager.start_game(room_id):
+            game = game_manager.games.get(room_id)
+            for player_id in list(game.players if game else ()):
+                game_manager.remove_player_from_game(room_id, player_id)
+            game_manager.remove_game(room_id)
+            return False
+        if self.on_matched:
+            self.on_matched(room_id, pair)
+        return True
+
+    # ==================== 后台线程 ====================
+
+    def start(self):
+        """启动定期重新检查队列的后台线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='match-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self._tickets:
+                    self.poll()
+            except Exception as e:
+                print(f'快速匹配失败: {e}')
+                traceback.print_exc()
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度和等待时间分位数（秒）"""
+        now = self.clock()
+        with self._lock:
+            waits = sorted(self._waits)
+            waiting = [now - ticket.enqueued for ticket in self._tickets.values()]
+        matched_waits = {f'p{p}': percentile(waits, p) for p in WAIT_PERCENTILES}
+        return {
+            'queue_depth': len(waiting),
+            'longest_wait': max(waiting, default=0.0),
+            'wait_percentiles': matched_waits,
+            'wait_samples': len(waits),
+            'enqueued': self.enqueued,
+            'matched': self.matched,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'last_poll_ms': self.last_poll_ms,
+            'band': self.band,
+            'widen_rate': self.widen_rate,
+            'max_band': self.max_band
+        }
@@ -0,0 +1,313 @@
+"""
+房间快照持久化（后台写入）
+
+请求线程只把房间ID记入待写入表（同一房间多次修改只记一次），不生成快照也不等待磁盘。
+后台线程定期取出待写入表，通过collect回调在各房间的邮箱中生成快照和大厅摘要（与房间的修改串行），
+再把这一批快照在一个事务里写入SQLite。服务器重启后房间在第一次访问时从快照恢复。
+按房间合并、批量写入的部分（WriteBehind）也用于共享房间存储的后台写入（room_store.StoreWriter）。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 两次批量写入之间的间隔（秒），期间同一房间的多次修改合并为一次写入
+DEFAULT_INTERVAL = 0.5
+
+# 房间快照和大厅摘要
+Snapshot = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+def snapshot_path_from_uri(uri: str, instance_path: str) -> Optional[str]:
+    """
+    从SQLALCHEMY_DATABASE_URI取出SQLite数据库文件路径
+
+    相对路径放在实例目录下（与Flask-SQLAlchemy的约定一致），不是SQLite时返回None。
+    """
+    prefix = 'sqlite:///'
+    if not uri or not uri.startswith(prefix):
+        return None
+    path = uri[len(prefix):]
+    if path == ':memory:':
+        return None
+    if not os.path.isabs(path):
+        os.makedirs(instance_path, exist_ok=True)
+        path = os.path.join(instance_path, path)
+    return path
+
+
+class WriteBehind:
+    """
+    后台线程按房间合并修改、批量写入
+
+    请求线程只把房间ID记入待写入表（同一房间多次修改只记一次）；后台线程每隔interval取出一批，
+    通过collect回调在各房间的邮箱中生成(快照, 大厅摘要)，再调用_write写入。
+    子类实现_write，需要每个线程一个连接时实现_open和_release。
+    """
+
+    thread_name = 'write-behind'
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL,
+                 collect: Optional[Callable[[Iterable[str]], Dict[str, Snapshot]]] = None):
+        """
+        启动后台线程
+
+        Args:
+            interval: 批量写入的间隔（秒）
+            collect: 为一批房间生成(快照, 大厅摘要)的回调，已经删除的房间不返回；
+                     通常由GameManager.configure设置为GameManager.snapshot_rooms
+        """
+        self.interval = interval
+        self.collect = collect
+        self._cond = threading.Condition()
+        self._pending: Dict[str, bool] = {}  # 房间ID -> True表示需要写入，False表示删除
+        self._writing = False
+        self._inflight: Dict[str, Optional[Snapshot]] = {}  # 正在写入的一批快照（None表示删除），写完之前读取仍然以它为准
+        self._flushing = 0  # 等待flush的调用数，此时不再等待合并间隔
+        self._closed = False
+
+        # 统计信息
+        self.scheduled = 0  # 请求线程提交的修改数
+        self.coalesced = 0  # 与同一房间还没写入的修改合并的次数
+        self.written = 0  # 实际写入的房间数
+        self.batches = 0  # 写入批次数
+        self.errors = 0
+        self.last_batch_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def _open(self) -> Any:
+        """后台线程使用的连接"""
+        return None
+
+    def _write(self, handle: Any, batch: Dict[str, Optional[Snapshot]]):
+        """写入一批快照（None表示删除）"""
+        raise NotImplementedError
+
+    def _release(self, handle: Any):
+        """后台线程退出时释放连接"""
+
+    def schedule(self, room_id: str):
+        """记录房间有修改需要写入（不生成快照，不做任何I/O）"""
+        with self._cond:
+            if self._pending.get(room_id):
+                self.coalesced += 1
+            self._pending[room_id] = True
+            self.scheduled += 1
+            self._cond.notify()
+
+    def schedule_delete(self, room_id: str):
+        """提交删除房间"""
+        with self._cond:
+            self._pending[room_id] = False
+            self._cond.notify()
+
+    def _run(self):
+        handle = self._open()
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                # 等待一个间隔，让这段时间内的修改合并到同一批
+                deadline = time.monotonic() + self.interval
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                marks, self._pending = self._pending, {}
+                self._writing = True
+
+            failed = False
+            try:
+                # 在各房间的邮箱中生成快照（房间在这期间被删除时不返回，删除标记随后写入）
+                dirty = [room_id for room_id, dirty in marks.items() if dirty]
+                snapshots = self.collect(dirty) if dirty and self.collect else {}
+                batch = {room_id: snapshots[room_id] if dirty else None
+                         for room_id, dirty in marks.items() if not dirty or room_id in snapshots}
+                with self._cond:
+                    self._inflight = batch
+                start = time.perf_counter()
+                self._write(handle, batch)
+                self.written += len(batch)
+                self.batches += 1
+                self.last_batch_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                failed = True
+                self.errors += 1
+                print(f'{self.thread_name} 写入失败: {e}')
+                # 写入失败时放回待写入表，之后的删除优先
+                with self._cond:
+                    for room_id, dirty in marks.items():
+                        self._pending.setdefault(room_id, dirty)
+            finally:
+                with self._cond:
+                    self._inflight = {}
+                    self._writing = False
+                    self._cond.notify_all()
+
+            if failed and not self._closed:
+                time.sleep(self.interval)
+        self._release(handle)
+
+    def _unwritten(self, room_id: str) -> Tuple[bool, Optional[Snapshot]]:
+        """
+        还没写完的修改
+
+        Returns:
+            (是否有还没写完的修改, 快照)：等待删除时快照为None；没有时读取应当以已写入的数据为准
+        """
+        with self._cond:
+            if self._pending.get(room_id) is False:
+                return True, None
+            if room_id in self._inflight:
+                return True, self._inflight[room_id]
+        return False, None
+
+    def _overlay(self, summaries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """把还没写完的修改叠加到已写入的大厅摘要上：{房间ID: 摘要}"""
+        with self._cond:
+            for room_id, item in self._inflight.items():
+                if item is None:
+                    summaries.pop(room_id, None)
+                else:
+                    summaries[room_id] = item[1]
+            for room_id, dirty in self._pending.items():
+                if not dirty:
+                    summaries.pop(room_id, None)
+        return summaries
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待待写入的快照全部写入，返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._writing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """写完剩余的快照后停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """写入统计"""
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'scheduled': self.scheduled,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_batch_ms': self.last_batch_ms
+        }
+
+
+class SnapshotWriter(WriteBehind):
+    """后台线程批量写入房间快照"""
+
+    thread_name = 'snapshot-writer'
+
+    def __init__(self, path: str, interval: float = DEFAULT_INTERVAL,
+                 collect: Optional[Callable[[Iterable[str]], Dict[str, Snapshot]]] = None):
+        """
+        初始化数据库并启动后台线程
+
+        Args:
+            path: SQLite数据库文件路径
+            interval: 批量写入的间隔（秒）
+            collect: 见WriteBehind
+        """
+        self.path = path
+
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS room_snapshots ('
+            'room_id TEXT PRIMARY KEY, version INTEGER NOT NULL, summary TEXT NOT NULL, '
+            'snapshot TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        conn.commit()
+        conn.close()
+
+        super().__init__(interval, collect)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        return self._connect()
+
+    def _release(self, conn: sqlite3.Connection):
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: Dict[str, Optional[Snapshot]]):
+        """在一个事务中写入一批快照"""
+        now = time.time()
+        upserts = []
+        deletes = []
+        for room_id, item in batch.items():
+            if item is None:
+                deletes.append((room_id,))
+                continue
+            snapshot, summary = item
+            upserts.append((room_id, snapshot['version'], json.dumps(summary, ensure_ascii=False),
+                            json.dumps(snapshot, ensure_ascii=False), now))
+
+        with conn:
+            if upserts:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO room_snapshots (room_id, version, summary, snapshot, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)', upserts
+                )
+            if deletes:
+                conn.executemany('DELETE FROM room_snapshots WHERE room_id = ?', deletes)
+
+    def load(self, room_id: str) -> Optional[Snapshot]:
+        """
+        读取房间快照（优先使用还没写入的快照）
+
+        Returns:
+            (快照, 大厅摘要)，不存在时返回None
+        """
+        found, item = self._unwritten(room_id)
+        if found:
+            return item
+
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT snapshot, summary FROM room_snapshots WHERE room_id = ?',
+                               (room_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """所有已保存房间的大厅摘要（不解析快照）"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT room_id, summary FROM room_snapshots ORDER BY updated_at').fetchall()
+        finally:
+            conn.close()
+        return list(self._overlay({room_id: json.loads(summary) for room_id, summary in rows}).values())
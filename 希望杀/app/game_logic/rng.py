@@ -0,0 +1,33 @@
+"""
+随机数流
+
+每个房间在创建时生成一个种子，洗牌只使用由种子派生的随机流，不使用全局random：
+并发的房间互不影响，同一个种子在同样的操作序列下洗出完全相同的牌。
+
+派生的随机流由(种子, 路径)经SHA-256得到，例如第n次洗牌使用derive_seed(seed, 'shuffle', n)。
+每次洗牌独立取流，恢复快照或重放对局只需要种子和已经洗牌的次数，不需要保存生成器的内部状态；
+模拟的第i局同样按(种子, i)取流，可以单独重放，结果也与工作进程的数量和划分方式无关。
+Python的梅森旋转生成器没有跳跃（jump-ahead）接口，派生种子起到同样的作用：任意两条流互不相关。
+"""
+import hashlib
+import random
+import secrets
+
+# 种子的位数（保存在JSON快照和SQLite中，保持在有符号64位整数范围内）
+SEED_BITS = 63
+
+
+def new_seed() -> int:
+    """生成新的随机种子（取自操作系统的随机源）"""
+    return secrets.randbits(SEED_BITS)
+
+
+def derive_seed(seed: int, *path) -> int:
+    """由种子和路径派生子种子，不同的路径得到互不相关的种子"""
+    key = '/'.join([str(seed)] + [str(part) for part in path]).encode('utf-8')
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big') >> (64 - SEED_BITS)
+
+
+def stream(seed: int, *path) -> random.Random:
+    """由种子和路径派生的独立随机数生成器"""
+    return random.Random(derive_seed(seed, *path))
@@ -0,0 +1,166 @@
+"""
+房间执行器
+
+每个房间拥有一个串行的邮箱：同一房间的任务按提交顺序逐个执行，
+不同房间的任务在共享的线程池上并行执行，不需要全局锁。
+"""
+import contextvars
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 单次调度最多连续处理的任务数，处理完后让出线程，避免繁忙的房间占住工作线程
+DRAIN_BATCH = 32
+
+
+class _Mailbox:
+    """单个房间的任务队列和统计信息"""
+
+    __slots__ = ('queue', 'scheduled', 'closed', 'processed', 'total_wait', 'max_wait', 'last_wait')
+
+    def __init__(self):
+        self.queue = deque()  # [(future, 上下文, fn, args, kwargs, 入队时间)]
+        self.scheduled = False  # 是否已经在线程池中排队或执行
+        self.closed = False  # 房间已删除，队列清空后移除邮箱
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+
+class RoomExecutor:
+    """按房间串行、跨房间并行的执行器"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 工作线程数量，默认与ThreadPoolExecutor相同
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='room')
+        self._lock = threading.Lock()  # 只保护邮箱字典和调度标记
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        self._local = threading.local()  # 当前线程正在执行的房间
+
+    @property
+    def max_workers(self) -> int:
+        return self._pool._max_workers
+
+    def submit(self, room_id: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        把任务放入房间的邮箱
+
+        Returns:
+            任务完成时返回结果的Future
+        """
+        future = Future()
+        with self._lock:
+            mailbox = self._mailboxes.get(room_id)
+            if mailbox is None:
+                mailbox = self._mailboxes[room_id] = _Mailbox()
+            # 任务在提交者的上下文中执行（上下文变量随任务一起传递）
+            mailbox.queue.append((future, contextvars.copy_context(), fn, args, kwargs, time.perf_counter()))
+            if not mailbox.scheduled:
+                mailbox.scheduled = True
+                self._pool.submit(self._drain, room_id, mailbox)
+        return future
+
+    def call(self, room_id: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        在房间的邮箱中执行任务并等待结果
+
+        如果当前线程已经在执行这个房间的任务，直接执行，避免自己等待自己。
+        """
+        if getattr(self._local, 'room_id', None) == room_id:
+            return fn(*args, **kwargs)
+        return self.submit(room_id, fn, *args, **kwargs).result(timeout)
+
+    def _drain(self, room_id: str, mailbox: _Mailbox):
+        """依次执行邮箱中的任务"""
+        self._local.room_id = room_id
+        try:
+            for _ in range(DRAIN_BATCH):
+                with self._lock:
+                    if not mailbox.queue:
+                        self._release(room_id, mailbox)
+                        return
+                    future, context, fn, args, kwargs, enqueued = mailbox.queue.popleft()
+
+                wait = time.perf_counter() - enqueued
+                mailbox.processed += 1
+                mailbox.total_wait += wait
+                mailbox.last_wait = wait
+                if wait > mailbox.max_wait:
+                    mailbox.max_wait = wait
+
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(context.run(fn, *args, **kwargs))
+                except BaseException as e:
+                    print(f'房间 {room_id} 的任务执行出错: {e}')
+                    traceback.print_exc()
+                    future.set_exception(e)
+        finally:
+            self._local.room_id = None
+
+        # 处理了一批任务后重新排队，让其他房间有机会执行
+        with self._lock:
+            if mailbox.queue:
+                self._pool.submit(self._drain, room_id, mailbox)
+            else:
+                self._release(room_id, mailbox)
+
+    def _release(self, room_id: str, mailbox: _Mailbox):
+        """邮箱处理完毕（调用方持有锁）"""
+        mailbox.scheduled = False
+        if mailbox.closed and self._mailboxes.get(room_id) is mailbox:
+            del self._mailboxes[room_id]
+
+    def forget(self, room_id: str):
+        """房间删除后清理邮箱，仍有任务时等任务执行完再清理"""
+        with self._lock:
+            mailbox = self._mailboxes.get(room_id)
+            if mailbox is None:
+                return
+            if mailbox.queue or mailbox.scheduled:
+                mailbox.closed = True
+            else:
+                del self._mailboxes[room_id]
+
+    def room_stats(self, room_id: str) -> Optional[Dict[str, Any]]:
+        """单个房间的队列深度和等待时间（毫秒）"""
+        mailbox = self._mailboxes.get(room_id)
+        if mailbox is None:
+            return None
+        return {
+            'queue_depth': len(mailbox.queue),
+            'running': mailbox.scheduled,
+            'processed': mailbox.processed,
+            'avg_wait_ms': mailbox.total_wait / mailbox.processed * 1000 if mailbox.processed else 0.0,
+            'max_wait_ms': mailbox.max_wait * 1000,
+            'last_wait_ms': mailbox.last_wait * 1000
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """所有房间的队列统计"""
+        with self._lock:
+            room_ids = list(self._mailboxes)
+        rooms = {}
+        for room_id in room_ids:
+            room = self.room_stats(room_id)
+            if room is not None:
+                rooms[room_id] = room
+        return {
+            'max_workers': self.max_workers,
+            'queued': sum(room['queue_depth'] for room in rooms.values()),
+            'rooms': rooms
+        }
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._pool.shutdown(wait=wait)
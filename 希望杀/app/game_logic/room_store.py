@@ -0,0 +1,391 @@
+"""
+房间状态存储后端
+
+GameManager把房间状态和大厅摘要保存到可替换的存储后端：
+- memory://                     进程内字典（默认，单进程）
+- sqlite:///path/to/rooms.db    多个进程共享的SQLite数据库（WAL模式）
+- redis://host:port/db          Redis协议服务器（任何兼容RESP协议的服务都可以）
+
+多进程部署时每个进程只修改自己负责的房间（见GameManager.owner_of），
+共享后端用于大厅列表和进程重启后恢复房间。写入共享后端需要序列化和磁盘/网络I/O，
+由StoreWriter在后台线程中按房间合并、批量写入，不占用房间的邮箱。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .game_state import GameState
+from .persistence import DEFAULT_INTERVAL, Snapshot, WriteBehind
+
+
+def dump_snapshot(snapshot: Dict[str, Any]) -> bytes:
+    """序列化房间快照（JSON）"""
+    return json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+
+
+def dump_game(game: GameState) -> bytes:
+    """序列化房间状态（JSON快照）"""
+    return dump_snapshot(game.to_snapshot())
+
+
+def load_game(data: bytes) -> GameState:
+    """反序列化房间状态"""
+    return GameState.from_snapshot(json.loads(data))
+
+
+class RoomStore:
+    """房间存储后端基类"""
+
+    shared = False  # 数据是否由多个进程共享
+
+    def load(self, room_id: str) -> Optional[GameState]:
+        """读取房间状态，不存在时返回None"""
+        raise NotImplementedError
+
+    def save(self, room_id: str, game: GameState, summary: Dict[str, Any]):
+        """
+        保存房间状态和大厅摘要
+
+        Args:
+            room_id: 房间ID
+            game: 房间状态
+            summary: 大厅摘要（id、name、players、max_players、status）
+        """
+        raise NotImplementedError
+
+    def delete(self, room_id: str):
+        """删除房间"""
+        raise NotImplementedError
+
+    def save_batch(self, batch: Dict[str, Optional[Snapshot]]):
+        """
+        写入一批房间（StoreWriter的后台线程调用）
+
+        Args:
+            batch: {room_id: (快照, 大厅摘要)}，None表示删除
+        """
+        for room_id, item in batch.items():
+            if item is None:
+                self.delete(room_id)
+            else:
+                self.save(room_id, GameState.from_snapshot(item[0]), item[1])
+
+    def summary(self, room_id: str) -> Optional[Dict[str, Any]]:
+        """单个房间的大厅摘要"""
+        raise NotImplementedError
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """所有房间的大厅摘要"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放连接"""
+
+
+class MemoryRoomStore(RoomStore):
+    """进程内存储：直接保存对象引用，不做序列化"""
+
+    def __init__(self):
+        self._games: Dict[str, GameState] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, room_id):
+        return self._games.get(room_id)
+
+    def save(self, room_id, game, summary):
+        self._games[room_id] = game
+        self._summaries[room_id] = summary
+
+    def delete(self, room_id):
+        self._games.pop(room_id, None)
+        self._summaries.pop(room_id, None)
+
+    def summary(self, room_id):
+        return self._summaries.get(room_id)
+
+    def summaries(self):
+        return list(self._summaries.values())
+
+
+class SQLiteRoomStore(RoomStore):
+    """SQLite存储：WAL模式下多个进程可以同时读，写入互不阻塞读取"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        self._local = threading.local()  # sqlite3连接不能跨线程使用，每个线程一个连接
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rooms ('
+            'room_id TEXT PRIMARY KEY, summary TEXT NOT NULL, state BLOB NOT NULL, updated_at REAL NOT NULL)'
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, room_id):
+        row = self._connection().execute('SELECT state FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
+        return load_game(row[0]) if row else None
+
+    def save(self, room_id, game, summary):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO rooms (room_id, summary, state, updated_at) VALUES (?, ?, ?, ?)',
+            (room_id, json.dumps(summary, ensure_ascii=False), dump_game(game), time.time())
+        )
+        conn.commit()
+
+    def delete(self, room_id):
+        conn = self._connection()
+        conn.execute('DELETE FROM rooms WHERE room_id = ?', (room_id,))
+        conn.commit()
+
+    def save_batch(self, batch):
+        now = time.time()
+        upserts = [(room_id, json.dumps(item[1], ensure_ascii=False), dump_snapshot(item[0]), now)
+                   for room_id, item in batch.items() if item is not None]
+        deletes = [(room_id,) for room_id, item in batch.items() if item is None]
+        conn = self._connection()
+        with conn:
+            if upserts:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rooms (room_id, summary, state, updated_at) VALUES (?, ?, ?, ?)', upserts
+                )
+            if deletes:
+                conn.executemany('DELETE FROM rooms WHERE room_id = ?', deletes)
+
+    def summary(self, room_id):
+        row = self._connection().execute('SELECT summary FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def summaries(self):
+        rows = self._connection().execute('SELECT summary FROM rooms ORDER BY updated_at').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RespError(Exception):
+    """Redis协议服务器返回的错误"""
+
+
+class RespClient:
+    """最小的Redis协议（RESP）客户端，只实现存储后端需要的命令"""
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()  # 一条连接上的请求和回复必须成对
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.password:
+            self._request('AUTH', self.password)
+        if self.db:
+            self._request('SELECT', self.db)
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('Redis连接已关闭')
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b'+':
+            return body.decode('utf-8')
+        if prefix == b'-':
+            raise RespError(body.decode('utf-8'))
+        if prefix == b':':
+            return int(body)
+        if prefix == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RespError(f'无法解析的回复: {line!r}')
+
+    def _request(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """发送一条命令并返回回复，连接断开时重连一次"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._request(*args)
+                except (ConnectionError, OSError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+class RedisRoomStore(RoomStore):
+    """Redis存储：房间状态保存在字符串键中，大厅摘要保存在一个哈希中"""
+
+    shared = True
+
+    def __init__(self, client: RespClient, prefix: str = 'xiwangsha:'):
+        self.client = client
+        self.prefix = prefix
+        self._lobby_key = prefix + 'lobby'
+
+    def _room_key(self, room_id: str) -> str:
+        return f'{self.prefix}room:{room_id}'
+
+    def load(self, room_id):
+        data = self.client.execute('GET', self._room_key(room_id))
+        return load_game(data) if data is not None else None
+
+    def save(self, room_id, game, summary):
+        self.client.execute('SET', self._room_key(room_id), dump_game(game))
+        self.client.execute('HSET', self._lobby_key, room_id, json.dumps(summary, ensure_ascii=False))
+
+    def delete(self, room_id):
+        self.client.execute('DEL', self._room_key(room_id))
+        self.client.execute('HDEL', self._lobby_key, room_id)
+
+    def save_batch(self, batch):
+        # 整批最多四条命令：MSET房间状态、HSET大厅摘要、DEL和HDEL删除的房间
+        states = []
+        summaries = []
+        deleted = [room_id for room_id, item in batch.items() if item is None]
+        for room_id, item in batch.items():
+            if item is not None:
+                states += [self._room_key(room_id), dump_snapshot(item[0])]
+                summaries += [room_id, json.dumps(item[1], ensure_ascii=False)]
+        if states:
+            self.client.execute('MSET', *states)
+            self.client.execute('HSET', self._lobby_key, *summaries)
+        if deleted:
+            self.client.execute('DEL', *[self._room_key(room_id) for room_id in deleted])
+            self.client.execute('HDEL', self._lobby_key, *deleted)
+
+    def summary(self, room_id):
+        value = self.client.execute('HGET', self._lobby_key, room_id)
+        return json.loads(value) if value is not None else None
+
+    def summaries(self):
+        values = self.client.execute('HVALS', self._lobby_key) or []
+        return [json.loads(value) for value in values]
+
+    def close(self):
+        self.client.close()
+
+
+class StoreWriter(WriteBehind):
+    """共享存储的后台写入：房间的修改按房间合并，快照在房间的邮箱中生成，序列化和I/O在后台线程中进行"""
+
+    thread_name = 'store-writer'
+
+    def __init__(self, store: RoomStore, interval: float = DEFAULT_INTERVAL,
+                 collect: Optional[Callable[[Iterable[str]], Dict[str, Snapshot]]] = None):
+        """
+        Args:
+            store: 共享存储后端
+            interval: 批量写入的间隔（秒）
+            collect: 见persistence.WriteBehind
+        """
+        self.store = store
+        super().__init__(interval, collect)
+
+    def _write(self, handle, batch):
+        self.store.save_batch(batch)
+
+    def load(self, room_id: str) -> Optional[Tuple[GameState, Optional[Dict[str, Any]]]]:
+        """
+        读取房间（优先使用还没写入的快照）
+
+        Returns:
+            (房间状态, 大厅摘要)，不存在或等待删除时返回None
+        """
+        found, item = self._unwritten(room_id)
+        if found:
+            return None if item is None else (GameState.from_snapshot(item[0]), item[1])
+        game = self.store.load(room_id)
+        if game is None:
+            return None
+        return game, self.store.summary(room_id)
+
+
+def create_store(url: Optional[str] = None) -> RoomStore:
+    """
+    根据URL创建存储后端
+
+    Args:
+        url: memory:// / sqlite:///路径 / redis://[:密码@]主机:端口/库，默认memory://
+    """
+    if not url or url == 'memory://':
+        return MemoryRoomStore()
+
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        path = url[len('sqlite:///'):]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteRoomStore(path)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        client = RespClient(parsed.hostname or 'localhost', parsed.port or 6379, db, parsed.password)
+        return RedisRoomStore(client)
+    raise ValueError(f'不支持的房间存储: {url}')
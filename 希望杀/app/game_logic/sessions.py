@@ -0,0 +1,113 @@
+"""
+玩家会话
+
+玩家ID是加入房间时的Socket.IO连接ID。加入成功后发放一个会话令牌，
+客户端重新连接（网络切换、刷新页面）时凭令牌恢复原来的座位：新连接映射到原来的玩家ID，
+再按客户端最后的状态版本补发变更日志中缺失的补丁，不需要重新加入房间。
+"""
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+
+class Session:
+    """一名玩家的会话"""
+
+    __slots__ = ('token', 'room_id', 'player_id', 'sid', 'issued', 'resumed')
+
+    def __init__(self, token: str, room_id: str, player_id: str, sid: str):
+        self.token = token
+        self.room_id = room_id
+        self.player_id = player_id
+        self.sid = sid  # 当前连接ID，断线时为None
+        self.issued = time.time()
+        self.resumed = 0  # 恢复次数
+
+
+class SessionRegistry:
+    """会话令牌、玩家ID和当前连接之间的映射"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_token: Dict[str, Session] = {}
+        self._by_player: Dict[str, Session] = {}
+        self._player_of_sid: Dict[str, str] = {}  # 恢复后的连接ID -> 原来的玩家ID
+
+    def issue(self, room_id: str, player_id: str) -> str:
+        """为加入房间的玩家发放会话令牌（重复加入时换发新令牌）"""
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            old = self._by_player.get(player_id)
+            if old is not None:
+                del self._by_token[old.token]
+            session = Session(token, room_id, player_id, player_id)
+            self._by_token[token] = session
+            self._by_player[player_id] = session
+        return token
+
+    def restore(self, room_id: str, player_id: str, token: str):
+        """重新登记从快照恢复的座位的令牌（没有连接，等待客户端凭令牌恢复）"""
+        with self._lock:
+            if token in self._by_token or player_id in self._by_player:
+                return
+            session = Session(token, room_id, player_id, None)
+            self._by_token[token] = session
+            self._by_player[player_id] = session
+
+    def resume(self, token: str, room_id: str, sid: str) -> Optional[Session]:
+        """
+        新连接凭令牌恢复会话
+
+        Returns:
+            恢复的会话；令牌无效或不属于这个房间时返回None
+        """
+        with self._lock:
+            session = self._by_token.get(token)
+            if session is None or session.room_id != room_id:
+                return None
+            if session.sid is not None and session.sid != session.player_id:
+                self._player_of_sid.pop(session.sid, None)
+            session.sid = sid
+            session.resumed += 1
+            if sid != session.player_id:
+                self._player_of_sid[sid] = session.player_id
+        return session
+
+    def player_of(self, sid: str) -> str:
+        """连接对应的玩家ID（没有恢复过的连接就是它自己）"""
+        return self._player_of_sid.get(sid, sid)
+
+    def sid_of(self, player_id: str) -> str:
+        """玩家当前的连接ID（断线或没有会话时返回玩家ID）"""
+        session = self._by_player.get(player_id)
+        if session is None or session.sid is None:
+            return player_id
+        return session.sid
+
+    def disconnect(self, sid: str) -> str:
+        """
+        连接断开，会话保留等待恢复
+
+        Returns:
+            断开的玩家ID
+        """
+        with self._lock:
+            player_id = self._player_of_sid.pop(sid, sid)
+            session = self._by_player.get(player_id)
+            if session is not None and session.sid == sid:
+                session.sid = None
+        return player_id
+
+    def drop(self, player_id: str):
+        """玩家离开房间，令牌作废"""
+        with self._lock:
+            session = self._by_player.pop(player_id, None)
+            if session is None:
+                return
+            del self._by_token[session.token]
+            if session.sid is not None and session.sid != player_id:
+                self._player_of_sid.pop(session.sid, None)
+
+    def __len__(self) -> int:
+        return len(self._by_player)
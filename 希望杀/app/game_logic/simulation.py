@@ -0,0 +1,265 @@
+"""
+无界面的批量对局模拟
+
+直接驱动GameState（start_game、legal_actions、apply_action），
+不依赖Flask和Socket.IO，不打印也不记录游戏日志，用于牌堆平衡性分析。
+第i局的洗牌和策略各使用由(种子, i)派生的随机流，任意一局都可以单独重放，
+统计结果与工作进程的数量无关。
+
+用法：
+    python -m app.game_logic.simulation --games 100000 --workers 4 --seed 1
+"""
+import argparse
+import random
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from .card import CardType
+from .game_state import ACTION_END, ACTION_RESOLVE, Action, GameState
+from .rng import derive_seed, stream
+
+# 模拟对局中的玩家ID
+PLAYER_IDS = ('p0', 'p1')
+
+# 单局最多回合数，防止双方反复回血导致对局无法结束
+MAX_TURNS = 200
+
+# 回复san值的基础体术牌
+HEAL_CARDS = ('运动', '休息', '冥想')
+
+
+class Policy:
+    """玩家策略基类"""
+
+    def choose(self, game: GameState, player_id: str, actions: List[Action], rng: random.Random) -> Action:
+        """
+        选择一个动作
+
+        Args:
+            game: 当前游戏状态（只读）
+            player_id: 行动的玩家ID
+            actions: GameState.legal_actions给出的合法动作
+            rng: 随机数生成器
+
+        Returns:
+            actions中的一个动作
+        """
+        raise NotImplementedError
+
+
+class RandomPolicy(Policy):
+    """随机策略：在合法动作中均匀选择"""
+
+    def choose(self, game, player_id, actions, rng):
+        return actions[int(rng.random() * len(actions))]
+
+
+class GreedyPolicy(Policy):
+    """贪心策略：能闪避就闪避，满血不回血，优先出攻击牌，最后才结束回合"""
+
+    def choose(self, game, player_id, actions, rng):
+        if game.waiting_for_dodge:
+            return actions[-1]
+
+        player = game.players[player_id]
+        hand = player['hand_cards']
+        best = actions[0]
+        best_score = 0
+        for action in actions[1:]:
+            card = hand[action[1]]
+            if card.name in HEAL_CARDS:
+                score = 1 if player['san'] < player['max_san'] else -1
+            elif card.card_type == CardType.HOMEWORK:
+                score = 3
+            else:
+                score = 2
+            if score > best_score:
+                best, best_score = action, score
+        return best
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'greedy': GreedyPolicy,
+}
+
+
+class SimulationStats:
+    """模拟结果统计，可以跨进程合并"""
+
+    def __init__(self):
+        self.games = 0
+        self.wins = [0, 0]  # 按座位统计胜场
+        self.draws = 0  # 平局或达到回合上限
+        self.turns = 0
+        self.card_plays = {}  # {卡牌名称: 使用次数}
+        self.winner_card_plays = {}  # {卡牌名称: 获胜方的使用次数}
+
+    def merge(self, other: 'SimulationStats') -> 'SimulationStats':
+        """合并另一份统计"""
+        self.games += other.games
+        self.wins[0] += other.wins[0]
+        self.wins[1] += other.wins[1]
+        self.draws += other.draws
+        self.turns += other.turns
+        for source, target in ((other.card_plays, self.card_plays),
+                               (other.winner_card_plays, self.winner_card_plays)):
+            for name, count in source.items():
+                target[name] = target.get(name, 0) + count
+        return self
+
+    def to_dict(self) -> Dict:
+        """转换为字典格式"""
+        return {
+            'games': self.games,
+            'wins': list(self.wins),
+            'draws': self.draws,
+            'average_turns': self.turns / self.games if self.games else 0,
+            'card_plays': dict(self.card_plays),
+            'winner_card_plays': dict(self.winner_card_plays),
+        }
+
+
+def play_game(policies: List[Policy], rng: random.Random, stats: SimulationStats,
+              max_turns: int = MAX_TURNS, seed: Optional[int] = None) -> Optional[int]:
+    """
+    完整地进行一局游戏
+
+    Args:
+        policies: 两个座位的策略
+        rng: 策略使用的随机数生成器
+        stats: 统计结果写入这里
+        max_turns: 回合上限
+        seed: 洗牌使用的随机种子，默认随机生成
+
+    Returns:
+        获胜者座位号，平局返回None
+    """
+    game = GameState('simulation', headless=True, seed=seed)
+    for player_id in PLAYER_IDS:
+        game.add_player(player_id, player_id)
+    game.start_game()
+
+    seat_of = {player_id: seat for seat, player_id in enumerate(PLAYER_IDS)}
+    plays = ({}, {})
+    turns = 0
+    while game.game_phase == 'playing' and turns < max_turns:
+        player_id = game.current_turn
+        action = policies[seat_of[player_id]].choose(game, player_id, game.legal_actions(player_id), rng)
+        if action[0] == ACTION_END:
+            game.end_turn(player_id)
+            turns += 1
+            continue
+
+        seat_plays = plays[seat_of[player_id]]
+        name = game.players[player_id]['hand_cards'][action[1]].name
+        seat_plays[name] = seat_plays.get(name, 0) + 1
+        game.apply_action(player_id, action)
+
+        # 被攻击者立即做出回应
+        if game.waiting_for_dodge:
+            target_id = game.attack_target
+            response = policies[seat_of[target_id]].choose(game, target_id, game.legal_actions(target_id), rng)
+            if response[0] == ACTION_RESOLVE:
+                game.resolve_attack()
+            else:
+                target_plays = plays[seat_of[target_id]]
+                name = game.players[target_id]['hand_cards'][response[1]].name
+                target_plays[name] = target_plays.get(name, 0) + 1
+                game.apply_action(target_id, response)
+
+    winner = None
+    if game.game_phase == 'finished':
+        alive = [seat for seat, player_id in enumerate(PLAYER_IDS) if game.players[player_id]['san'] > 0]
+        if len(alive) == 1:
+            winner = alive[0]
+
+    stats.games += 1
+    stats.turns += turns
+    if winner is None:
+        stats.draws += 1
+    else:
+        stats.wins[winner] += 1
+    for seat, seat_plays in enumerate(plays):
+        for name, count in seat_plays.items():
+            stats.card_plays[name] = stats.card_plays.get(name, 0) + count
+            if seat == winner:
+                stats.winner_card_plays[name] = stats.winner_card_plays.get(name, 0) + count
+    return winner
+
+
+def run_batch(start: int, games: int, seed: int, policy_names: Tuple[str, str] = ('greedy', 'random'),
+              max_turns: int = MAX_TURNS) -> SimulationStats:
+    """
+    在当前进程中连续模拟第start局起的games局
+
+    Args:
+        start: 第一局的编号
+        games: 对局数量
+        seed: 基础种子，第i局的洗牌和策略使用由(seed, i)派生的随机流
+        policy_names: 两个座位的策略名称
+        max_turns: 单局回合上限
+    """
+    policies = [POLICIES[name]() for name in policy_names]
+    stats = SimulationStats()
+    for index in range(start, start + games):
+        play_game(policies, stream(seed, 'policy', index), stats, max_turns, derive_seed(seed, 'deck', index))
+    return stats
+
+
+def _run_batch_args(args) -> SimulationStats:
+    """进程池入口"""
+    return run_batch(*args)
+
+
+def run_parallel(games: int, workers: int, seed: int = 0,
+                 policy_names: Tuple[str, str] = ('greedy', 'random'),
+                 max_turns: int = MAX_TURNS) -> SimulationStats:
+    """
+    使用进程池并行模拟，每个工作进程负责一段连续编号的对局
+
+    Args:
+        games: 总对局数量
+        workers: 工作进程数量
+        seed: 基础种子，每局的随机流由它和对局编号派生，结果与workers无关
+    """
+    chunks = [games // workers + (1 if i < games % workers else 0) for i in range(workers)]
+    starts = [sum(chunks[:i]) for i in range(workers)]
+    tasks = [(start, count, seed, policy_names, max_turns) for start, count in zip(starts, chunks) if count]
+
+    stats = SimulationStats()
+    if workers <= 1:
+        for task in tasks:
+            stats.merge(_run_batch_args(task))
+        return stats
+
+    with Pool(workers) as pool:
+        for result in pool.imap_unordered(_run_batch_args, tasks):
+            stats.merge(result)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='希望杀批量对局模拟')
+    parser.add_argument('--games', type=int, default=10000, help='对局数量')
+    parser.add_argument('--workers', type=int, default=1, help='工作进程数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--policies', nargs=2, default=['greedy', 'random'],
+                        choices=sorted(POLICIES), help='两个座位的策略')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help='单局回合上限')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = run_parallel(args.games, args.workers, args.seed, tuple(args.policies), args.max_turns)
+    elapsed = time.perf_counter() - start
+
+    result = stats.to_dict()
+    print(f"对局数: {result['games']}，用时: {elapsed:.2f}秒，{result['games'] / elapsed:.0f} 局/秒")
+    print(f"胜场: {result['wins']}，平局: {result['draws']}，平均回合数: {result['average_turns']:.1f}")
+    for name, count in sorted(result['card_plays'].items(), key=lambda item: -item[1]):
+        print(f"  {name}: 使用 {count} 次，获胜方使用 {result['winner_card_plays'].get(name, 0)} 次")
+
+
+if __name__ == '__main__':
+    main()
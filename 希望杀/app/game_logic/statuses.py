@@ -0,0 +1,525 @@
+"""
+状态效果
+
+角色文档中定义的限时状态（狂暴、眩晕、灼烧……）。每种状态注册一个StatusEffect，声明挂载的阶段：
+- PHASE_DRAW: 摸牌阶段的摸牌数量（眩晕、冰冻）和摸牌阶段后（灼烧、混乱、魅惑）
+- PHASE_PLAY: 使用手牌前的校验（眩晕、睡眠、石化、变羊、冰冻）
+- PHASE_DISCARD: 回合结束时的弃牌阶段和弃牌阶段后（恐惧、诅咒、中毒、剧毒）
+- PHASE_DEAL_DAMAGE / PHASE_TAKE_DAMAGE: 造成和受到伤害时修改伤害（狂暴、集中、脆弱、失神、石化、睡眠、感染）
+
+每个房间的StatusBoard按(阶段, 玩家)索引生效中的状态，进入一个阶段时只遍历挂在这个阶段上的状态，
+没有状态的玩家只需要一次字典查找。持续时间按回合计数：持续N回合的状态在之后第N个回合的摸牌阶段后、
+出牌阶段前失效（角色文档中"持续一回合"的定义）；状态按失效的回合分桶，每回合只取出当回合到期的一桶。
+
+san值是整数，文档中0.5点的伤害累积在状态上，凑满1点时结算。
+"""
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .card import CardType, DeckCard
+from .catalog import get_template
+from .game_log import LOG_STATUS_ADDED, LOG_STATUS_DAMAGE, LOG_STATUS_EXPIRED, STATUS_NAMES
+from .rng import stream
+
+if TYPE_CHECKING:
+    from .game_state import GameState
+
+# 阶段
+PHASE_DRAW = 'draw'
+PHASE_PLAY = 'play'
+PHASE_DISCARD = 'discard'
+PHASE_DEAL_DAMAGE = 'deal_damage'
+PHASE_TAKE_DAMAGE = 'take_damage'
+PHASES = (PHASE_DRAW, PHASE_PLAY, PHASE_DISCARD, PHASE_DEAL_DAMAGE, PHASE_TAKE_DAMAGE)
+
+# 一套卷子：两层冰冻时不能使用
+PAPER = get_template('一套卷子')
+
+# 伤害类型
+DAMAGE_HOMEWORK = 'homework'  # 作业伤害
+DAMAGE_PHYSICAL = 'physical'  # 体术伤害
+DAMAGE_NONE = 'none'  # 没有类型的伤害（状态造成的伤害）
+DAMAGE_TRUE = 'true'  # 真伤，不受任何增减伤影响
+
+# 状态名 -> 效果
+STATUS_REGISTRY: Dict[str, 'StatusEffect'] = {}
+
+
+def register_status(name: str):
+    """类装饰器：注册状态的处理类"""
+    def decorator(cls):
+        if name not in STATUS_NAMES:
+            raise ValueError(f'状态没有登记日志编号: {name}')
+        cls.name = name
+        cls.index = STATUS_NAMES.index(name)
+        STATUS_REGISTRY[name] = cls()
+        return cls
+    return decorator
+
+
+def damage_type_of(card: DeckCard) -> str:
+    """卡牌造成的伤害类型"""
+    return DAMAGE_PHYSICAL if card.card_type == CardType.PHYSICAL else DAMAGE_HOMEWORK
+
+
+class Status:
+    """玩家身上的一个状态"""
+
+    __slots__ = ('name', 'player_id', 'source_id', 'expires', 'stacks', 'charge')
+
+    def __init__(self, name: str, player_id: str, source_id: Optional[str], expires: int,
+                 stacks: int = 1, charge: int = 0):
+        self.name = name
+        self.player_id = player_id
+        self.source_id = source_id  # 施加状态的玩家
+        self.expires = expires  # 在这个回合的摸牌阶段后失效
+        self.stacks = stacks  # 层数
+        self.charge = charge  # 累积的半点伤害
+
+    def copy(self) -> 'Status':
+        return Status(self.name, self.player_id, self.source_id, self.expires, self.stacks, self.charge)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'stacks': self.stacks, 'expires': self.expires,
+                'source': self.source_id, 'charge': self.charge}
+
+
+class StatusEffect:
+    """状态效果基类，只有phases中声明的阶段会被调用"""
+
+    name = None
+    index = None  # 日志中的状态编号
+    phases: Tuple[str, ...] = ()  # 挂载的阶段
+    max_stacks = 1  # 再次获得时叠加一层并延长持续回合，最多叠加的层数
+
+    def draw_count(self, game: 'GameState', status: Status, count: int) -> int:
+        """摸牌阶段：修改摸牌数量"""
+        return count
+
+    def after_draw(self, game: 'GameState', status: Status, drawn: List[DeckCard]):
+        """摸牌阶段后（drawn为本次摸到、仍在手中的牌，交出或弃掉摸到的牌时从中移除）"""
+
+    def can_play(self, game: 'GameState', status: Status, card: DeckCard, responding: bool) -> bool:
+        """能否使用手牌（responding表示回应挂起的攻击，不在出牌阶段）"""
+        return True
+
+    def on_discard(self, game: 'GameState', status: Status):
+        """弃牌阶段和弃牌阶段后"""
+
+    def deal_damage(self, game: 'GameState', status: Status, target_id: str, damage: int, damage_type: str) -> int:
+        """持有者造成伤害时修改伤害"""
+        return damage
+
+    def take_damage(self, game: 'GameState', status: Status, source_id: Optional[str], damage: int,
+                    damage_type: str) -> int:
+        """持有者受到伤害时修改伤害"""
+        return damage
+
+
+def _half_points(game: 'GameState', status: Status, halves: int) -> int:
+    """累积半点伤害，返回凑满的整点数"""
+    status.charge += halves
+    points, status.charge = divmod(status.charge, 2)
+    game.statuses.publish(game, status.player_id)
+    return points
+
+
+def _status_damage(game: 'GameState', status: Status, damage: int, damage_type: str = DAMAGE_NONE):
+    """状态对持有者造成伤害（不经过施加者的增伤）"""
+    if damage <= 0 or status.player_id not in game.players:
+        return
+    dealt = game.deal_damage(None, status.player_id, damage, damage_type)
+    if not game.headless:
+        game.game_log.append(LOG_STATUS_DAMAGE, game._seat(status.player_id), arg0=STATUS_REGISTRY[status.name].index, arg1=dealt)
+
+
+@register_status('狂暴')
+class RageStatus(StatusEffect):
+    """狂暴：造成的所有体术伤害翻倍"""
+
+    phases = (PHASE_DEAL_DAMAGE,)
+
+    def deal_damage(self, game, status, target_id, damage, damage_type):
+        return damage * 2 if damage_type == DAMAGE_PHYSICAL else damage
+
+
+@register_status('集中')
+class FocusStatus(StatusEffect):
+    """集中：造成的所有作业伤害翻倍"""
+
+    phases = (PHASE_DEAL_DAMAGE,)
+
+    def deal_damage(self, game, status, target_id, damage, damage_type):
+        return damage * 2 if damage_type == DAMAGE_HOMEWORK else damage
+
+
+@register_status('脆弱')
+class FragileStatus(StatusEffect):
+    """脆弱：受到的所有体术伤害翻倍"""
+
+    phases = (PHASE_TAKE_DAMAGE,)
+
+    def take_damage(self, game, status, source_id, damage, damage_type):
+        return damage * 2 if damage_type == DAMAGE_PHYSICAL else damage
+
+
+@register_status('失神')
+class DazedStatus(StatusEffect):
+    """失神：受到的所有作业伤害翻倍"""
+
+    phases = (PHASE_TAKE_DAMAGE,)
+
+    def take_damage(self, game, status, source_id, damage, damage_type):
+        return damage * 2 if damage_type == DAMAGE_HOMEWORK else damage
+
+
+@register_status('眩晕')
+class StunStatus(StatusEffect):
+    """眩晕：封印摸牌阶段、出牌阶段和弃牌阶段（仍然可以回应攻击）"""
+
+    phases = (PHASE_DRAW, PHASE_PLAY)
+
+    def draw_count(self, game, status, count):
+        return 0
+
+    def can_play(self, game, status, card, responding):
+        return responding
+
+
+@register_status('睡眠')
+class SleepStatus(StatusEffect):
+    """睡眠：封印出牌阶段和弃牌阶段；受到伤害时失去睡眠，这次伤害翻倍"""
+
+    phases = (PHASE_PLAY, PHASE_TAKE_DAMAGE)
+
+    def can_play(self, game, status, card, responding):
+        return responding
+
+    def take_damage(self, game, status, source_id, damage, damage_type):
+        if damage <= 0:
+            return damage
+        game.statuses.remove(game, status.player_id, self.name)
+        return damage * 2
+
+
+@register_status('石化')
+class PetrifyStatus(StatusEffect):
+    """石化：受到的所有伤害减半（向下取整），无法使用手牌"""
+
+    phases = (PHASE_PLAY, PHASE_TAKE_DAMAGE)
+
+    def can_play(self, game, status, card, responding):
+        return False
+
+    def take_damage(self, game, status, source_id, damage, damage_type):
+        return damage // 2
+
+
+@register_status('恐惧')
+class FearStatus(StatusEffect):
+    """恐惧：弃牌阶段手牌多于1张时弃到只剩1张（从最后摸到的牌开始弃）"""
+
+    phases = (PHASE_DISCARD,)
+
+    def on_discard(self, game, status):
+        hand = game.players[status.player_id]['hand_cards']
+        while len(hand) > 1:
+            game.discard_pile.append(hand.pop(len(hand) - 1))
+
+
+@register_status('混乱')
+class ConfusionStatus(StatusEffect):
+    """混乱：摸牌阶段后随机弃掉摸到的其中一张牌"""
+
+    phases = (PHASE_DRAW,)
+
+    def after_draw(self, game, status, drawn):
+        if not drawn:
+            return
+        rng = stream(game.seed, 'status', self.name, game.turn_number)
+        card = drawn.pop(rng.randrange(len(drawn)))
+        game.players[status.player_id]['hand_cards'].remove(card.card_id)
+        game.discard_pile.append(card)
+
+
+@register_status('诅咒')
+class CurseStatus(StatusEffect):
+    """诅咒：弃牌阶段后受到（手牌数量/2）的伤害"""
+
+    phases = (PHASE_DISCARD,)
+
+    def on_discard(self, game, status):
+        halves = len(game.players[status.player_id]['hand_cards'])
+        _status_damage(game, status, _half_points(game, status, halves))
+
+
+@register_status('变羊')
+class SheepStatus(StatusEffect):
+    """变羊：无法使用作业牌和体术牌"""
+
+    phases = (PHASE_PLAY,)
+
+    def can_play(self, game, status, card, responding):
+        return card.card_type not in (CardType.HOMEWORK, CardType.PHYSICAL)
+
+
+@register_status('魅惑')
+class CharmStatus(StatusEffect):
+    """魅惑：摸牌阶段后把摸到的第一张牌交给魅惑者"""
+
+    phases = (PHASE_DRAW,)
+
+    def after_draw(self, game, status, drawn):
+        charmer = game.players.get(status.source_id)
+        if not drawn or charmer is None or status.source_id == status.player_id:
+            return
+        card = drawn.pop(0)
+        game.players[status.player_id]['hand_cards'].remove(card.card_id)
+        charmer['hand_cards'].append(card)
+
+
+@register_status('灼烧')
+class BurnStatus(StatusEffect):
+    """灼烧：摸牌阶段后每层受到0.5点伤害，最多叠加两层"""
+
+    phases = (PHASE_DRAW,)
+    max_stacks = 2
+
+    def after_draw(self, game, status, drawn):
+        _status_damage(game, status, _half_points(game, status, status.stacks))
+
+
+@register_status('冰冻')
+class FreezeStatus(StatusEffect):
+    """冰冻：一层摸牌-1；两层时一套卷子的使用次数再-1（每回合限用一次，即不能使用），最多叠加两层"""
+
+    phases = (PHASE_DRAW, PHASE_PLAY)
+    max_stacks = 2
+
+    def draw_count(self, game, status, count):
+        return count - 1
+
+    def can_play(self, game, status, card, responding):
+        return status.stacks < 2 or card.kind != PAPER.kind
+
+
+@register_status('中毒')
+class PoisonStatus(StatusEffect):
+    """中毒：弃牌阶段后受到1点伤害"""
+
+    phases = (PHASE_DISCARD,)
+
+    def on_discard(self, game, status):
+        _status_damage(game, status, 1)
+
+
+@register_status('剧毒')
+class VenomStatus(StatusEffect):
+    """剧毒：弃牌阶段后受到1点真伤"""
+
+    phases = (PHASE_DISCARD,)
+
+    def on_discard(self, game, status):
+        _status_damage(game, status, 1, DAMAGE_TRUE)
+
+
+@register_status('感染')
+class InfectionStatus(StatusEffect):
+    """感染：受到的所有体术伤害每层+0.5，最多叠加三层"""
+
+    phases = (PHASE_TAKE_DAMAGE,)
+    max_stacks = 3
+
+    def take_damage(self, game, status, source_id, damage, damage_type):
+        if damage_type != DAMAGE_PHYSICAL or damage <= 0:
+            return damage
+        return damage + _half_points(game, status, status.stacks)
+
+
+class StatusBoard:
+    """一个房间中生效的状态：按阶段和玩家索引，按失效回合分桶"""
+
+    def __init__(self):
+        self._statuses: Dict[str, Dict[str, Status]] = {}  # 玩家ID -> {状态名: 状态}
+        self._hooks: Dict[str, Dict[str, Dict[str, Status]]] = {phase: {} for phase in PHASES}  # 阶段 -> 玩家ID -> {状态名: 状态}
+        self._expiry: Dict[int, List[Tuple[str, str]]] = {}  # 失效回合 -> [(玩家ID, 状态名)]，延长后的旧记录在取出时跳过
+
+    def __len__(self) -> int:
+        return sum(len(statuses) for statuses in self._statuses.values())
+
+    def __bool__(self) -> bool:
+        """是否有生效中或等待到期清理的状态（常数时间，没有时GameState跳过所有阶段）"""
+        return bool(self._statuses or self._expiry)
+
+    def get(self, player_id: str, name: str) -> Optional[Status]:
+        return self._statuses.get(player_id, {}).get(name)
+
+    def _index(self, status: Status):
+        self._statuses.setdefault(status.player_id, {})[status.name] = status
+        for phase in STATUS_REGISTRY[status.name].phases:
+            self._hooks[phase].setdefault(status.player_id, {})[status.name] = status
+
+    def _schedule(self, status: Status):
+        self._expiry.setdefault(status.expires, []).append((status.player_id, status.name))
+
+    def publish(self, game: 'GameState', player_id: str):
+        """把玩家的状态写回玩家的status字段（客户端和快照使用）"""
+        if player_id in game.players:
+            game.players[player_id]['status'] = [status.to_dict()
+                                                 for status in self._statuses.get(player_id, {}).values()]
+
+    # ==================== 获得和失去 ====================
+
+    def add(self, game: 'GameState', player_id: str, name: str, turns: int = 1,
+            source_id: Optional[str] = None) -> Optional[Status]:
+        """
+        使玩家获得持续turns回合的状态
+
+        已经有这个状态时：可以叠加的状态叠加一层（不超过上限）并延长turns回合，
+        不能叠加的状态刷新持续时间（取较长的一个）。
+
+        Returns:
+            玩家身上的状态，状态名未注册或玩家不存在时返回None
+        """
+        effect = STATUS_REGISTRY.get(name)
+        if effect is None or player_id not in game.players or turns <= 0:
+            return None
+
+        status = self.get(player_id, name)
+        if status is None:
+            status = Status(name, player_id, source_id, game.turn_number + turns)
+            self._index(status)
+        elif effect.max_stacks > 1:
+            status.stacks = min(effect.max_stacks, status.stacks + 1)
+            status.expires += turns
+        else:
+            status.expires = max(status.expires, game.turn_number + turns)
+        if source_id is not None:
+            status.source_id = source_id
+        self._schedule(status)
+        self.publish(game, player_id)
+
+        if not game.headless:
+            game.game_log.append(LOG_STATUS_ADDED, game._seat(player_id), arg0=effect.index,
+                                 arg1=status.expires - game.turn_number)
+        return status
+
+    def remove(self, game: 'GameState', player_id: str, name: str) -> bool:
+        """移除玩家的状态"""
+        statuses = self._statuses.get(player_id)
+        if not statuses or name not in statuses:
+            return False
+        del statuses[name]
+        if not statuses:
+            del self._statuses[player_id]
+        for phase in STATUS_REGISTRY[name].phases:
+            hooks = self._hooks[phase][player_id]
+            del hooks[name]
+            if not hooks:
+                del self._hooks[phase][player_id]
+        self.publish(game, player_id)
+
+        if not game.headless:
+            game.game_log.append(LOG_STATUS_EXPIRED, game._seat(player_id), arg0=STATUS_REGISTRY[name].index)
+        return True
+
+    def drop_player(self, player_id: str):
+        """玩家离开房间时丢弃他的所有状态"""
+        self._statuses.pop(player_id, None)
+        for hooks in self._hooks.values():
+            hooks.pop(player_id, None)
+
+    def clear(self):
+        """清除所有状态（重新开局）"""
+        self._statuses.clear()
+        for hooks in self._hooks.values():
+            hooks.clear()
+        self._expiry.clear()
+
+    def expire(self, game: 'GameState'):
+        """移除在当前回合到期的状态（摸牌阶段后调用）"""
+        for player_id, name in self._expiry.pop(game.turn_number, ()):
+            status = self.get(player_id, name)
+            if status is not None and status.expires <= game.turn_number:
+                self.remove(game, player_id, name)
+
+    # ==================== 阶段 ====================
+
+    def draw_count(self, game: 'GameState', player_id: str, count: int) -> int:
+        """摸牌阶段的摸牌数量"""
+        hooks = self._hooks[PHASE_DRAW].get(player_id)
+        if not hooks:
+            return count
+        for status in tuple(hooks.values()):
+            count = STATUS_REGISTRY[status.name].draw_count(game, status, count)
+        return max(0, count)
+
+    def after_draw(self, game: 'GameState', player_id: str, drawn: List[DeckCard]):
+        """摸牌阶段后"""
+        hooks = self._hooks[PHASE_DRAW].get(player_id)
+        if not hooks:
+            return
+        for status in tuple(hooks.values()):
+            if player_id in game.players:
+                STATUS_REGISTRY[status.name].after_draw(game, status, drawn)
+
+    def play_hooks(self, player_id: str) -> Optional[Dict[str, Status]]:
+        """玩家挂在出牌校验上的状态（没有时为None，调用方可以跳过逐张校验）"""
+        return self._hooks[PHASE_PLAY].get(player_id)
+
+    def can_play(self, game: 'GameState', player_id: str, card: DeckCard, responding: bool) -> bool:
+        """状态是否允许玩家使用这张手牌"""
+        hooks = self._hooks[PHASE_PLAY].get(player_id)
+        if not hooks:
+            return True
+        return all(STATUS_REGISTRY[status.name].can_play(game, status, card, responding)
+                   for status in hooks.values())
+
+    def discard_phase(self, game: 'GameState', player_id: str):
+        """弃牌阶段和弃牌阶段后"""
+        hooks = self._hooks[PHASE_DISCARD].get(player_id)
+        if not hooks:
+            return
+        for status in tuple(hooks.values()):
+            if player_id in game.players:
+                STATUS_REGISTRY[status.name].on_discard(game, status)
+
+    def modify_damage(self, game: 'GameState', source_id: Optional[str], target_id: str, damage: int,
+                      damage_type: str) -> int:
+        """经过造成者和受到者的状态修改后的伤害（真伤不修改）"""
+        if damage_type == DAMAGE_TRUE:
+            return damage
+        hooks = self._hooks[PHASE_DEAL_DAMAGE].get(source_id) if source_id else None
+        if hooks:
+            for status in tuple(hooks.values()):
+                damage = STATUS_REGISTRY[status.name].deal_damage(game, status, target_id, damage, damage_type)
+        hooks = self._hooks[PHASE_TAKE_DAMAGE].get(target_id)
+        if hooks:
+            for status in tuple(hooks.values()):
+                damage = STATUS_REGISTRY[status.name].take_damage(game, status, source_id, damage, damage_type)
+        return max(0, damage)
+
+    # ==================== 复制和快照 ====================
+
+    def copy(self) -> 'StatusBoard':
+        """复制（搜索用的游戏状态副本）"""
+        board = StatusBoard()
+        for statuses in self._statuses.values():
+            for status in statuses.values():
+                board._index(status.copy())
+        board._expiry = {turn: list(entries) for turn, entries in self._expiry.items()}
+        return board
+
+    @classmethod
+    def from_players(cls, players: Dict[str, Dict[str, Any]], turn_number: int) -> 'StatusBoard':
+        """从玩家的status字段重建（恢复快照时使用），已经过期的状态丢弃"""
+        board = cls()
+        for player_id, player in players.items():
+            for data in player.get('status', ()):
+                if data['name'] not in STATUS_REGISTRY or data['expires'] <= turn_number:
+                    continue
+                status = Status(data['name'], player_id, data.get('source'), data['expires'],
+                                data.get('stacks', 1), data.get('charge', 0))
+                board._index(status)
+                board._schedule(status)
+        return board
+
@@ -0,0 +1,213 @@
+"""
+房间回收
+
+GameManager按最后活动时间维护房间的顺序（最久未活动的在前），后台线程定期回收：
+- 已结束的对局超过finished_ttl没有活动时删除
+- 没有玩家的房间超过empty_ttl没有活动时删除
+- 断开连接超过disconnected_ttl仍未离开的玩家从房间中移除
+- 房间数量超过max_rooms时按最久未活动的顺序删除（LRU）
+
+每次回收只查看活动时间早于最短TTL的房间，不扫描全部房间。检查过、没有到期的房间记下当时的活动时间和
+最早可能到期的时间，活动时间没有变化且还没到这个时间时跳过，不再进入房间的邮箱（进行中的对局只有活动后才需要重新检查）。
+重启后从快照列出、超过TTL仍然没有人打开的房间直接删除（保存的玩家都没有凭令牌回来）。
+回收在房间的邮箱中执行，与玩家事件串行；结果通过回调通知路由层向客户端广播。
+没有快照写入线程时，游戏日志的溢出记录也由回收线程写入文件（在邮箱中取出，在回收线程中写入）。
+"""
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默认回收参数（秒）
+DEFAULT_INTERVAL = 30.0
+DEFAULT_FINISHED_TTL = 300.0
+DEFAULT_EMPTY_TTL = 600.0
+DEFAULT_DISCONNECTED_TTL = 60.0
+
+# 默认的房间数量上限，0表示不限制
+DEFAULT_MAX_ROOMS = 10000
+
+# 回收原因
+EVICT_FINISHED = 'finished'  # 对局已结束
+EVICT_EMPTY = 'empty'  # 房间没有玩家
+EVICT_GHOST = 'ghost'  # 玩家断开连接后没有回来
+EVICT_CAPACITY = 'capacity'  # 超出房间数量上限
+
+# 回收记录：(原因, 房间ID, 玩家ID或None)
+Eviction = Tuple[str, str, Optional[str]]
+
+
+class RoomSweeper:
+    """按TTL和房间数量上限回收房间和断线玩家的后台线程"""
+
+    def __init__(self, game_manager, interval: float = DEFAULT_INTERVAL,
+                 finished_ttl: float = DEFAULT_FINISHED_TTL, empty_ttl: float = DEFAULT_EMPTY_TTL,
+                 disconnected_ttl: float = DEFAULT_DISCONNECTED_TTL, max_rooms: int = DEFAULT_MAX_ROOMS,
+                 on_evict: Optional[Callable[[str, str, Optional[str], Optional[str]], None]] = None,
+                 on_swept: Optional[Callable[[List[Eviction]], None]] = None):
+        """
+        Args:
+            game_manager: 要回收的GameManager
+            interval: 两次回收的间隔
+            finished_ttl: 已结束对局的保留时间
+            empty_ttl: 没有玩家的房间的保留时间
+            disconnected_ttl: 断线玩家的保留时间
+            max_rooms: 房间数量上限，0表示不限制
+            on_evict: 每回收一项时在房间的邮箱中调用：(原因, 房间ID, 玩家ID, 玩家名称)
+            on_swept: 一次回收有结果时调用，参数为本次的回收记录
+        """
+        self.game_manager = game_manager
+        self.interval = interval
+        self.finished_ttl = finished_ttl
+        self.empty_ttl = empty_ttl
+        self.disconnected_ttl = disconnected_ttl
+        self.max_rooms = max_rooms
+        self.on_evict = on_evict
+        self.on_swept = on_swept
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._checked: Dict[str, Tuple[float, float]] = {}  # 检查过没有到期的房间：{room_id: (活动时间, 下次检查的时间)}
+
+        # 统计信息
+        self.skipped = 0  # 活动时间没有变化、跳过检查的次数
+        self.sweeps = 0
+        self.evicted = {EVICT_FINISHED: 0, EVICT_EMPTY: 0, EVICT_GHOST: 0, EVICT_CAPACITY: 0}
+        self.last_sweep_ms = 0.0
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='room-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f'回收房间失败: {e}')
+                traceback.print_exc()
+
+    def sweep(self, now: Optional[float] = None) -> List[Eviction]:
+        """
+        执行一次回收
+
+        Args:
+            now: 当前时间（time.monotonic()），默认取当前值
+
+        Returns:
+            本次的回收记录
+        """
+        started = time.perf_counter()
+        if now is None:
+            now = time.monotonic()
+        game_manager = self.game_manager
+        evictions: List[Eviction] = []
+
+        # 断线玩家（移除最后一名玩家时房间随之删除）
+        for player_id, room_id in game_manager.disconnected_before(now - self.disconnected_ttl):
+            if game_manager.run_in_room(room_id, self._evict_player, room_id, player_id, now):
+                evictions.append((EVICT_GHOST, room_id, player_id))
+
+        # 超过TTL的空房间和已结束的对局，按活动时间从旧到新，遇到还没到期的就停止；
+        # 上次检查后没有活动、也还没到可能到期的时间的房间跳过
+        for room_id in game_manager.rooms_idle_since(now - min(self.finished_ttl, self.empty_ttl)):
+            checked = self._checked.get(room_id)
+            if checked is not None and checked[0] == game_manager.last_active(room_id) and now < checked[1]:
+                self.skipped += 1
+                continue
+            reason = game_manager.run_in_room(room_id, self._evict_idle_room, room_id, now)
+            if reason:
+                evictions.append((reason, room_id, None))
+
+        # 已经删除的房间不再需要记录
+        for room_id in [room_id for room_id in self._checked if room_id not in game_manager.activity]:
+            del self._checked[room_id]
+
+        # 超出数量上限时回收最久未活动的房间
+        if self.max_rooms:
+            excess = len(game_manager.games) - self.max_rooms
+            if excess > 0:
+                for room_id in game_manager.rooms_idle_since(limit=excess):
+                    if game_manager.run_in_room(room_id, self._evict_room, room_id, EVICT_CAPACITY):
+                        evictions.append((EVICT_CAPACITY, room_id, None))
+
+        # 没有快照写入线程时由回收线程把游戏日志的溢出记录写入文件
+        game_manager.spill_logs()
+
+        self.sweeps += 1
+        for reason, _, _ in evictions:
+            self.evicted[reason] += 1
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        if evictions and self.on_swept:
+            self.on_swept(evictions)
+        return evictions
+
+    def _evict_player(self, room_id: str, player_id: str, now: float) -> bool:
+        """在房间的邮箱中移除断线玩家（期间重新连接的玩家保留）"""
+        if not self.game_manager.disconnected_longer_than(player_id, now - self.disconnected_ttl):
+            return False
+        game = self.game_manager.games.get(room_id)
+        player = game.players.get(player_id) if game else None
+        self.game_manager.remove_player_from_game(room_id, player_id)
+        if self.on_evict:
+            self.on_evict(EVICT_GHOST, room_id, player_id, player['name'] if player else None)
+        return True
+
+    def _evict_idle_room(self, room_id: str, now: float) -> Optional[str]:
+        """在房间的邮箱中重新检查房间是否到期（排队期间可能有新的活动）"""
+        game_manager = self.game_manager
+        game = game_manager.games.get(room_id)
+        active = game_manager.last_active(room_id, now)
+        if game is None:
+            # 重启后从快照列出、一直没有人打开的房间（玩家恢复座位时会加载房间）
+            entry = game_manager.lobby.get(room_id)
+            if entry is None:
+                return None
+            if entry.get('status') == 'finished':
+                reason = EVICT_FINISHED
+            elif not entry.get('players'):
+                reason = EVICT_EMPTY
+            else:
+                reason = EVICT_GHOST
+            return reason if self._evict_room(room_id, reason) else None
+
+        if game.game_phase == 'finished':
+            reason, expires = EVICT_FINISHED, active + self.finished_ttl
+        elif not game.players:
+            reason, expires = EVICT_EMPTY, active + self.empty_ttl
+        else:
+            # 有玩家且没有结束的房间不会因为空闲到期，活动时间变化后再检查
+            reason, expires = None, float('inf')
+        if now < expires:
+            self._checked[room_id] = (active, expires)
+            return None
+        self._checked.pop(room_id, None)
+        return reason if self._evict_room(room_id, reason) else None
+
+    def _evict_room(self, room_id: str, reason: str) -> bool:
+        """删除房间，通知在删除之前发出（房间内的客户端还能收到）"""
+        if room_id not in self.game_manager.games and room_id not in self.game_manager.lobby:
+            return False
+        if self.on_evict:
+            self.on_evict(reason, room_id, None, None)
+        return self.game_manager.remove_game(room_id)
+
+    def stats(self):
+        """回收统计"""
+        return {
+            'sweeps': self.sweeps,
+            'evicted': dict(self.evicted),
+            'skipped': self.skipped,
+            'last_sweep_ms': self.last_sweep_ms,
+            'rooms': len(self.game_manager.games),
+            'disconnected_players': len(self.game_manager.disconnected)
+        }
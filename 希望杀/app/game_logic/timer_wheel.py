@@ -0,0 +1,211 @@
+"""
+分层时间轮
+
+所有房间的期限（闪避窗口、回合时限、断线宽限）放在同一个时间轮中，由一个后台线程按固定的刻度推进，
+不为每个房间开线程或sleep。加入和取消定时器都是O(1)；每一刻只处理当前槽位中到期的定时器，
+没有定时器到期时一刻的开销是常数，与房间数量和定时器数量无关。
+
+第0层有SLOTS个槽位，每个槽位一个刻度；第k层的每个槽位覆盖第k-1层转一圈的时间。
+定时器按剩余的刻度数放入能容纳它的最低一层，上层的槽位轮到时其中的定时器重新分配到下层（级联）。
+取消只做标记，到期或级联时丢弃。
+
+回调在时间轮的线程中执行，应当只把任务交给房间的邮箱，不做耗时的操作。
+"""
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+# 默认的刻度（秒）
+DEFAULT_TICK = 0.1
+
+# 每层的槽位数
+SLOTS = 64
+
+# 层数（刻度0.1秒时四层覆盖约19天）
+LEVELS = 4
+
+
+class Timer:
+    """时间轮中的一个定时器"""
+
+    __slots__ = ('expires', 'callback', 'args', 'cancelled')
+
+    def __init__(self, expires: int, callback: Callable, args: tuple):
+        self.expires = expires  # 到期的刻度
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+    """多个房间共用的分层时间轮"""
+
+    def __init__(self, tick: float = DEFAULT_TICK, slots: int = SLOTS, levels: int = LEVELS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            tick: 刻度（秒），定时器的精度
+            slots: 每层的槽位数
+            levels: 层数
+            clock: 时钟，默认time.monotonic
+        """
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self._spans = [slots ** level for level in range(levels + 1)]  # 第k层一个槽位覆盖的刻度数
+        self._wheels: List[List[List[Timer]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._lock = threading.Lock()
+        self._origin = clock()
+        self._current = 0  # 已经处理到的刻度
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.pending = 0  # 还没有到期也没有取消的定时器
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.cascaded = 0
+        self.max_tick_ms = 0.0
+
+    # ==================== 定时器 ====================
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        """
+        delay秒后调用callback(*args)
+
+        Returns:
+            定时器，可以传给cancel()
+        """
+        ticks = max(1, int(-(-delay // self.tick)))  # 向上取整，至少一个刻度
+        with self._lock:
+            timer = Timer(self._current + ticks, callback, args)
+            self._place(timer)
+            self.pending += 1
+            self.scheduled += 1
+        return timer
+
+    def cancel(self, timer: Optional[Timer]) -> bool:
+        """取消定时器（已经到期或取消过的定时器返回False）"""
+        if timer is None:
+            return False
+        with self._lock:
+            if timer.cancelled or timer.expires < 0:
+                return False
+            timer.cancelled = True
+            self.pending -= 1
+            self.cancelled += 1
+        return True
+
+    def _place(self, timer: Timer):
+        """按剩余刻度把定时器放入能容纳它的最低一层（调用方持有锁）"""
+        delta = timer.expires - self._current
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                self._wheels[level][(timer.expires // self._spans[level]) % self.slots].append(timer)
+                return
+        # 超出时间轮的范围：先放在最高层能到达的最远槽位，级联时再重新分配
+        top = self.levels - 1
+        expires = self._current + self._spans[self.levels] - 1
+        self._wheels[top][(expires // self._spans[top]) % self.slots].append(timer)
+
+    # ==================== 推进 ====================
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        推进到当前时间，调用期间到期的定时器
+
+        Args:
+            now: 当前时间（clock()），默认取当前值
+
+        Returns:
+            调用的回调数
+        """
+        if now is None:
+            now = self.clock()
+        target = int((now - self._origin) / self.tick)
+        fired = 0
+        while True:
+            with self._lock:
+                if self._current >= target:
+                    break
+                started = time.perf_counter()
+                self._current += 1
+                due = self._tick(self._current)
+            for timer in due:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print(f'定时器回调失败: {e}')
+                    traceback.print_exc()
+            fired += len(due)
+            self.max_tick_ms = max(self.max_tick_ms, (time.perf_counter() - started) * 1000)
+        return fired
+
+    def _tick(self, current: int) -> List[Timer]:
+        """处理一个刻度：先从高到低级联上层轮到的槽位，再取出第0层当前槽位中的定时器（调用方持有锁）"""
+        for level in range(self.levels - 1, 0, -1):
+            if current % self._spans[level]:
+                continue
+            index = (current // self._spans[level]) % self.slots
+            timers = self._wheels[level][index]
+            if not timers:
+                continue
+            self._wheels[level][index] = []
+            for timer in timers:
+                if not timer.cancelled:
+                    self._place(timer)
+                    self.cascaded += 1
+
+        index = current % self.slots
+        timers = self._wheels[0][index]
+        if not timers:
+            return []
+        self._wheels[0][index] = []
+        due = []
+        for timer in timers:
+            if timer.cancelled:
+                continue
+            timer.expires = -1  # 标记为已经到期
+            due.append(timer)
+        self.pending -= len(due)
+        self.fired += len(due)
+        return due
+
+    # ==================== 后台线程 ====================
+
+    def start(self):
+        """启动推进时间轮的后台线程"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            self.advance()
+
+    def stats(self) -> Dict[str, Any]:
+        """时间轮统计"""
+        return {
+            'tick': self.tick,
+            'slots': self.slots,
+            'levels': self.levels,
+            'current_tick': self._current,
+            'pending': self.pending,
+            'scheduled': self.scheduled,
+            'fired': self.fired,
+            'cancelled': self.cancelled,
+            'cascaded': self.cascaded,
+            'max_tick_ms': self.max_tick_ms
+        }
@@ -0,0 +1,340 @@
+"""
+服务器指标
+
+每个Socket.IO事件记录处理延迟直方图和错误数，每次emit记录事件计数，
+按固定间隔抽样记录序列化后的消息大小（二进制帧按实际字节数）。/api/metrics 以Prometheus文本格式输出，
+同时给出房间数、玩家数、牌堆/弃牌堆大小等即时数据。
+
+记录路径只做计时、二分查找桶和整数自增，不加锁（极少数并发自增丢失对统计没有影响）。
+"""
+import contextvars
+import json
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from flask_socketio import SocketIO
+
+from app.codec import codec
+from app.outbound import OutboundBatch, current_batch
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_LATENCY_BOUNDS_NS = tuple(int(bound * 1e9) for bound in LATENCY_BUCKETS)
+
+# 消息大小直方图的桶上限（字节）
+PAYLOAD_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 16384, 65536)
+
+# 每隔多少次emit序列化一次消息统计大小
+PAYLOAD_SAMPLE_EVERY = 16
+
+# 逐个房间输出牌堆大小的房间数上限，超过时只输出汇总
+ROOM_DETAIL_LIMIT = 50
+
+# 不计时的内置事件
+UNTIMED_EVENTS = ('connect', 'disconnect')
+
+# 当前正在处理的Socket.IO事件（房间邮箱中执行的任务也能取到）
+current_event: contextvars.ContextVar = contextvars.ContextVar('current_event', default=None)
+
+
+class EventStats:
+    """单个事件的延迟直方图和错误数"""
+
+    __slots__ = ('buckets', 'count', 'sum_ns', 'errors')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个桶是+Inf
+        self.count = 0
+        self.sum_ns = 0
+        self.errors = 0
+
+
+class Metrics:
+    """进程内的指标收集器"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.events: Dict[str, EventStats] = {}
+        self.emits: Dict[str, int] = {}  # {事件名: emit次数}
+        self.emit_total = 0
+        self.payload_buckets = [0] * (len(PAYLOAD_BUCKETS) + 1)
+        self.payload_count = 0  # 抽样的消息数
+        self.payload_sum = 0
+        self.payload_by_event: Dict[str, List[int]] = {}  # {事件名: [抽样数, 总字节数]}
+        self._last_scrape = (time.monotonic(), 0)  # 上次输出时的(时间, emit总数)
+
+    def register(self, event: str):
+        """预先登记事件，没有请求时也输出0"""
+        if event not in self.events:
+            self.events[event] = EventStats()
+
+    def observe(self, event: str, elapsed_ns: int, error: bool = False):
+        """记录一次事件处理"""
+        stats = self.events.get(event)
+        if stats is None:
+            stats = self.events[event] = EventStats()
+        stats.buckets[bisect_left(_LATENCY_BOUNDS_NS, elapsed_ns)] += 1
+        stats.count += 1
+        stats.sum_ns += elapsed_ns
+        if error:
+            stats.errors += 1
+
+    def error(self, event: Optional[str]):
+        """记录一次事件处理失败（返回给客户端的error消息）"""
+        stats = self.events.get(event or 'unknown')
+        if stats is None:
+            stats = self.events[event or 'unknown'] = EventStats()
+        stats.errors += 1
+
+    def emitted(self, event: str, payload: Any):
+        """记录一次emit，每PAYLOAD_SAMPLE_EVERY次统计一次消息大小"""
+        self.emits[event] = self.emits.get(event, 0) + 1
+        self.emit_total += 1
+        if event == 'error':
+            self.error(current_event.get())
+        if self.emit_total % PAYLOAD_SAMPLE_EVERY == 0:
+            try:
+                if isinstance(payload, bytes):
+                    size = len(payload)
+                else:
+                    size = len(json.dumps(payload, separators=(',', ':')))
+            except (TypeError, ValueError):
+                return
+            self.payload_buckets[bisect_left(PAYLOAD_BUCKETS, size)] += 1
+            self.payload_count += 1
+            self.payload_sum += size
+            sampled = self.payload_by_event.setdefault(event, [0, 0])
+            sampled[0] += 1
+            sampled[1] += size
+
+    # ==================== 输出 ====================
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+
+        lines.append('# HELP xiwangsha_event_latency_seconds Socket.IO事件处理延迟')
+        lines.append('# TYPE xiwangsha_event_latency_seconds histogram')
+        for event, stats in sorted(self.events.items()):
+            label = _escape(event)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'xiwangsha_event_latency_seconds_bucket{{event="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'xiwangsha_event_latency_seconds_bucket{{event="{label}",le="+Inf"}} {stats.count}')
+            lines.append(f'xiwangsha_event_latency_seconds_sum{{event="{label}"}} {stats.sum_ns / 1e9:.9f}')
+            lines.append(f'xiwangsha_event_latency_seconds_count{{event="{label}"}} {stats.count}')
+
+        lines.append('# HELP xiwangsha_event_errors_total Socket.IO事件处理失败次数')
+        lines.append('# TYPE xiwangsha_event_errors_total counter')
+        for event, stats in sorted(self.events.items()):
+            lines.append(f'xiwangsha_event_errors_total{{event="{_escape(event)}"}} {stats.errors}')
+
+        lines.append('# HELP xiwangsha_emits_total 发送给客户端的消息数')
+        lines.append('# TYPE xiwangsha_emits_total counter')
+        for event, count in sorted(self.emits.items()):
+            lines.append(f'xiwangsha_emits_total{{event="{_escape(event)}"}} {count}')
+
+        now = time.monotonic()
+        last_time, last_total = self._last_scrape
+        total = self.emit_total
+        self._last_scrape = (now, total)
+        rate = (total - last_total) / (now - last_time) if now > last_time else 0.0
+        lines.append('# HELP xiwangsha_emits_per_second 距上次采集以来每秒发送的消息数')
+        lines.append('# TYPE xiwangsha_emits_per_second gauge')
+        lines.append(f'xiwangsha_emits_per_second {rate:.3f}')
+
+        lines.append('# HELP xiwangsha_payload_bytes 序列化后的消息大小（抽样）')
+        lines.append('# TYPE xiwangsha_payload_bytes histogram')
+        cumulative = 0
+        for bound, count in zip(PAYLOAD_BUCKETS, self.payload_buckets):
+            cumulative += count
+            lines.append(f'xiwangsha_payload_bytes_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'xiwangsha_payload_bytes_bucket{{le="+Inf"}} {self.payload_count}')
+        lines.append(f'xiwangsha_payload_bytes_sum {self.payload_sum}')
+        lines.append(f'xiwangsha_payload_bytes_count {self.payload_count}')
+
+        lines.append('# HELP xiwangsha_event_payload_bytes_avg 各事件的平均消息大小（抽样）')
+        lines.append('# TYPE xiwangsha_event_payload_bytes_avg gauge')
+        for event, (count, size) in sorted(self.payload_by_event.items()):
+            lines.append(f'xiwangsha_event_payload_bytes_avg{{event="{_escape(event)}"}} {size / count:.1f}')
+
+        binary = codec.stats()
+        lines.append('# HELP xiwangsha_binary_clients 使用MessagePack格式的连接数')
+        lines.append('# TYPE xiwangsha_binary_clients gauge')
+        lines.append(f'xiwangsha_binary_clients {binary["binary_clients"]}')
+        lines.append('# HELP xiwangsha_binary_frames_total 编码的MessagePack帧数（每帧可以发给多个连接）')
+        lines.append('# TYPE xiwangsha_binary_frames_total counter')
+        lines.append(f'xiwangsha_binary_frames_total {binary["frames"]}')
+
+        lines.extend(_room_lines())
+
+        lines.append('# HELP xiwangsha_uptime_seconds 进程运行时间')
+        lines.append('# TYPE xiwangsha_uptime_seconds gauge')
+        lines.append(f'xiwangsha_uptime_seconds {time.time() - self.started:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    """转义Prometheus标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _room_lines() -> List[str]:
+    """GameManager中的房间、玩家、牌堆和队列数据"""
+    from app.game_logic.game_manager import GameManager
+
+    game_manager = GameManager()
+    games = list(game_manager.games.items())
+    phases: Dict[str, int] = {}
+    players = 0
+    deck_total = 0
+    discard_total = 0
+    for _, game in games:
+        phases[game.game_phase] = phases.get(game.game_phase, 0) + 1
+        players += len(game.players)
+        deck_total += len(game.deck)
+        discard_total += len(game.discard_pile)
+
+    lines = ['# HELP xiwangsha_rooms 当前进程中的房间数', '# TYPE xiwangsha_rooms gauge']
+    for phase in ('waiting', 'playing', 'finished'):
+        phases.setdefault(phase, 0)
+    for phase, count in sorted(phases.items()):
+        lines.append(f'xiwangsha_rooms{{phase="{_escape(phase)}"}} {count}')
+
+    lines += ['# HELP xiwangsha_players 当前进程中的玩家数', '# TYPE xiwangsha_players gauge',
+              f'xiwangsha_players {players}']
+
+    lines += ['# HELP xiwangsha_deck_cards 牌堆中的卡牌数', '# TYPE xiwangsha_deck_cards gauge',
+              f'xiwangsha_deck_cards{{room="_total"}} {deck_total}']
+    detailed = games if len(games) <= ROOM_DETAIL_LIMIT else []
+    for room_id, game in detailed:
+        lines.append(f'xiwangsha_deck_cards{{room="{_escape(room_id)}"}} {len(game.deck)}')
+    lines += ['# HELP xiwangsha_discard_cards 弃牌堆中的卡牌数', '# TYPE xiwangsha_discard_cards gauge',
+              f'xiwangsha_discard_cards{{room="_total"}} {discard_total}']
+    for room_id, game in detailed:
+        lines.append(f'xiwangsha_discard_cards{{room="{_escape(room_id)}"}} {len(game.discard_pile)}')
+
+    executor = game_manager.executor.stats()
+    lines += ['# HELP xiwangsha_room_queue_depth 房间邮箱中等待执行的任务数', '# TYPE xiwangsha_room_queue_depth gauge',
+              f'xiwangsha_room_queue_depth {executor["queued"]}']
+
+    if game_manager.persistence:
+        snapshots = game_manager.persistence.stats()
+        lines += ['# HELP xiwangsha_snapshot_pending 等待写入磁盘的房间快照数',
+                  '# TYPE xiwangsha_snapshot_pending gauge',
+                  f'xiwangsha_snapshot_pending {snapshots["pending"]}',
+                  '# HELP xiwangsha_snapshot_errors_total 房间快照写入失败次数',
+                  '# TYPE xiwangsha_snapshot_errors_total counter',
+                  f'xiwangsha_snapshot_errors_total {snapshots["errors"]}']
+
+    if game_manager.store_writer:
+        store = game_manager.store_writer.stats()
+        lines += ['# HELP xiwangsha_store_pending 等待写入共享存储的房间数',
+                  '# TYPE xiwangsha_store_pending gauge',
+                  f'xiwangsha_store_pending {store["pending"]}',
+                  '# HELP xiwangsha_store_errors_total 共享存储写入失败次数',
+                  '# TYPE xiwangsha_store_errors_total counter',
+                  f'xiwangsha_store_errors_total {store["errors"]}']
+
+    if game_manager.sweeper:
+        sweeper = game_manager.sweeper.stats()
+        lines += ['# HELP xiwangsha_disconnected_players 断线后等待回收的玩家数',
+                  '# TYPE xiwangsha_disconnected_players gauge',
+                  f'xiwangsha_disconnected_players {sweeper["disconnected_players"]}',
+                  '# HELP xiwangsha_evicted_total 回收线程移除的房间和玩家数',
+                  '# TYPE xiwangsha_evicted_total counter']
+        for reason, count in sorted(sweeper['evicted'].items()):
+            lines.append(f'xiwangsha_evicted_total{{reason="{reason}"}} {count}')
+    return lines
+
+
+# 全局指标收集器
+metrics = Metrics()
+
+
+class MetricsSocketIO(SocketIO):
+    """自动为事件处理函数计时、为emit计数的SocketIO"""
+
+    def on(self, message, namespace=None):
+        register = super().on(message, namespace)
+        if message in UNTIMED_EVENTS:
+            return register
+        metrics.register(message)
+
+        def decorator(handler):
+            @wraps(handler)
+            def timed_handler(*args):
+                token = current_event.set(message)
+                batch_token = current_batch.set(OutboundBatch())
+                start = time.perf_counter_ns()
+                error = False
+                try:
+                    return handler(*args)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    # 处理结束时把这个事件产生的消息按接收者合并发送，发送时间计入延迟
+                    batch = current_batch.get()
+                    current_batch.reset(batch_token)
+                    try:
+                        self._flush(batch)
+                    finally:
+                        metrics.observe(message, time.perf_counter_ns() - start, error)
+                        current_event.reset(token)
+
+            register(timed_handler)
+            return handler
+        return decorator
+
+    def emit(self, event, *args, **kwargs):
+        # 事件处理期间发出的消息先进入批次，处理结束时合并发送
+        batch = current_batch.get()
+        if batch is not None and len(args) == 1 and not kwargs.get('callback'):
+            skip = kwargs.get('skip_sid') or []
+            if not isinstance(skip, list):
+                skip = [skip]
+            batch.add(event, args[0], kwargs.get('to', kwargs.get('room')), skip, kwargs.get('namespace'))
+            return None
+        return self._send(event, *args, **kwargs)
+
+    def _flush(self, batch: OutboundBatch):
+        """每个接收者发送一帧"""
+        if not batch.messages:
+            return
+        for event, payload, to, namespace, skip in batch.frames(self._participants):
+            kwargs = {'namespace': namespace}
+            if to is not None:
+                kwargs['to'] = to
+            if skip:
+                kwargs['skip_sid'] = skip
+            self._send(event, payload, **kwargs)
+
+    def _participants(self, room: str, namespace: Optional[str]):
+        """当前进程中加入了房间的连接（连接ID本身也是一个只含自己的房间）"""
+        for participant in self.server.manager.get_participants(namespace or '/', room):
+            yield participant[0] if isinstance(participant, tuple) else participant
+
+    def _send(self, event, *args, **kwargs):
+        # 发给协商了MessagePack的连接时编码一次，逐个发送二进制帧，其余连接仍然收到JSON
+        target = kwargs.get('to', kwargs.get('room'))
+        binary = codec.recipients(target) if args else []
+        if binary:
+            skip = kwargs.get('skip_sid') or []
+            if not isinstance(skip, list):
+                skip = [skip]
+            binary = [sid for sid in binary if sid not in skip]
+        if binary:
+            frame = codec.encode(args[0])
+            for sid in binary:
+                metrics.emitted(event, frame)
+                super().emit(event, frame, *args[1:], to=sid, namespace=kwargs.get('namespace'))
+            codec.sent += len(binary)
+            if codec.is_binary(target):
+                return None
+            kwargs['skip_sid'] = skip + binary
+        metrics.emitted(event, args[0] if args else None)
+        return super().emit(event, *args, **kwargs)
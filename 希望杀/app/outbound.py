@@ -0,0 +1,76 @@
+"""
+出站消息合并
+
+一个玩家动作会产生多条消息（出牌的状态补丁和游戏结束、结束回合时的攻击结算和换手、
+加入房间时的完整状态和房间列表更新……）。处理Socket.IO事件期间发出的消息先放进当前事件的批次，
+事件处理结束时按接收者合并：每个连接只收到一帧，一条消息时原样发送，多条时合并为一个batch事件
+{'events': [[事件名, 数据], ...]}，客户端按顺序分发，处理完整帧后只刷新一次界面。
+
+房间广播按房间中的连接展开后再合并。没有指定接收者的全局广播和发给大厅的广播（rooms_updated）不展开，
+同一批次中发给同一目标的多条广播合并为一帧，由Socket.IO（多进程时经消息队列）发给所有连接。
+接收者不在当前进程时消息不合并，原样发送。
+房间邮箱中执行的任务继承提交者的上下文，发出的消息同样进入提交它的事件的批次。
+"""
+import contextvars
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 合并后的事件名
+BATCH_EVENT = 'batch'
+
+# 大厅页面的连接加入的房间，发给它的广播不按连接展开
+LOBBY_ROOM = 'lobby'
+
+# 当前Socket.IO事件的出站批次
+current_batch: contextvars.ContextVar = contextvars.ContextVar('current_batch', default=None)
+
+
+class OutboundBatch:
+    """一个入站事件产生的出站消息"""
+
+    __slots__ = ('messages',)
+
+    def __init__(self):
+        self.messages: List[Tuple[str, Any, Optional[str], List[str], Optional[str]]] = []
+
+    def add(self, event: str, payload: Any, target: Optional[str], skip: List[str], namespace: Optional[str]):
+        self.messages.append((event, payload, target, skip, namespace))
+
+    def frames(self, participants: Callable[[str, Optional[str]], Iterable[str]]):
+        """
+        按接收者合并消息
+
+        Args:
+            participants: (房间名, 命名空间) -> 房间中的连接ID
+
+        Returns:
+            [(事件名, 数据, 接收者, 命名空间, 跳过的连接)]，接收者为None表示全局广播
+        """
+        per_sid: Dict[Tuple[str, Optional[str]], List[List[Any]]] = OrderedDict()
+        broadcast: Dict[Tuple[Optional[str], Optional[str]], List[List[Any]]] = OrderedDict()
+        remote = []
+        for event, payload, target, skip, namespace in self.messages:
+            if target is None or target == LOBBY_ROOM:
+                broadcast.setdefault((target, namespace), []).append([event, payload])
+                continue
+            sids = list(participants(target, namespace))
+            if not sids:
+                remote.append((event, payload, target, namespace, skip))
+                continue
+            for sid in sids:
+                if sid not in skip:
+                    per_sid.setdefault((sid, namespace), []).append([event, payload])
+
+        frames = []
+        for (sid, namespace), events in per_sid.items():
+            frames.append(_frame(events) + (sid, namespace, []))
+        frames.extend(remote)
+        for (target, namespace), events in broadcast.items():
+            frames.append(_frame(events) + (target, namespace, []))
+        return frames
+
+
+def _frame(events: List[List[Any]]) -> Tuple[str, Any]:
+    if len(events) == 1:
+        return events[0][0], events[0][1]
+    return BATCH_EVENT, {'events': events}
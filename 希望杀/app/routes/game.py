@@ -1,46 +1,90 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, redirect
 from app import socketio
+from app.codec import codec
+from app.outbound import LOBBY_ROOM
+from app.game_logic.bot import is_bot
 from app.game_logic.game_manager import GameManager
+from app.game_logic.game_state import ACTION_END, ACTION_RESOLVE, ACTION_USE
 
 bp = Blueprint('game', __name__, url_prefix='/game')
 
 def get_rooms_data():
-    """获取房间数据的辅助函数"""
+    """获取房间数据的辅助函数（读取大厅索引）"""
+    return GameManager().get_lobby()
+
+def current_player_id():
+    """当前连接对应的玩家ID（凭会话令牌恢复的连接对应原来的玩家）"""
+    return GameManager().sessions.player_of(request.sid)
+
+def emit_state_patch(event, payload, room_id):
+    """提交房间的状态变化，按观看者投影增量补丁后分别发送"""
+    game_manager = GameManager()
+    game = game_manager.get_game(room_id)
+    patch = game_manager.get_state_patch(room_id)
+    payload = dict(payload, room_id=room_id)
+    if not patch:
+        socketio.emit(event, payload, room=room_id)
+        return
+    
+    # 每个玩家收到公开补丁、自己的手牌变化和现在可以执行的操作
+    player_ids = list(game.players)
+    for player_id in player_ids:
+        if is_bot(player_id):
+            continue
+        socketio.emit(event, dict(payload, actions=game.action_view(player_id),
+                                  **game.project_patch(patch, player_id)), to=player_id)
+    
+    # 旁观者只收到公开补丁（跳过玩家当前的连接）
+    player_sids = [game_manager.sessions.sid_of(player_id) for player_id in player_ids]
+    socketio.emit(event, dict(payload, **game.project_patch(patch)), room=room_id, skip_sid=player_sids)
+    
+    # 状态变化后轮到机器人行动时开始搜索，并按新状态重新设置行动期限
+    schedule_bot_move(room_id)
+    schedule_deadlines(room_id)
+
+def emit_state_view(event, payload, room_id, sid):
+    """向单个客户端发送其视角的完整游戏状态"""
     game_manager = GameManager()
-    games = game_manager.get_all_games()
-    
-    rooms = []
-    for room_id, game_state in games.items():
-        rooms.append({
-            'id': room_id,
-            'name': f'房间 {room_id}',
-            'players': len(game_state['players']),
-            'max_players': 2,
-            'status': game_state['game_phase']
-        })
-    
-    # 如果没有房间，创建一些测试房间
-    if not rooms:
-        # 创建测试房间
-        test_room1 = game_manager.create_game('test1')
-        test_room2 = game_manager.create_game('test2')
-        rooms = [
-            {'id': 'test1', 'name': '测试房间1', 'players': 0, 'max_players': 2, 'status': 'waiting'},
-            {'id': 'test2', 'name': '测试房间2', 'players': 0, 'max_players': 2, 'status': 'waiting'}
-        ]
-    
-    return rooms
+    view = game_manager.get_state_view(room_id, sid)
+    if view:
+        socketio.emit(event, dict(payload, room_id=room_id, **view), to=sid)
+
+def redirect_to_owner(room_id):
+    """房间由其他进程负责时通知客户端连接到所属进程，返回是否已经转交"""
+    game_manager = GameManager()
+    if game_manager.owns(room_id):
+        return False
+    
+    socketio.emit('room_moved', {
+        'room_id': room_id,
+        'url': game_manager.owner_url(room_id)
+    }, to=request.sid)
+    return True
 
 @bp.route('/room/<room_id>')
 def game_room(room_id):
     """游戏房间页面"""
+    # 多进程部署时由负责这个房间的进程提供页面，页面上的Socket.IO连接也就落在这个进程
+    game_manager = GameManager()
+    if not game_manager.owns(room_id):
+        return redirect(game_manager.owner_url(room_id) + request.full_path.rstrip('?'))
     return render_template('game_room.html', room_id=room_id)
 
+@bp.route('/api/route/<room_id>')
+def room_route(room_id):
+    """查询房间所属的进程"""
+    game_manager = GameManager()
+    return jsonify({
+        'room_id': room_id,
+        'worker': game_manager.owner_of(room_id),
+        'url': game_manager.owner_url(room_id)
+    })
+
 @bp.route('/api/rooms', methods=['GET'])
 def get_rooms():
     """获取房间列表"""
     rooms = get_rooms_data()
-    print(f"返回房间列表: {rooms}")  # 调试信息
+    print(f"返回房间列表: {len(rooms)} 个房间")  # 调试信息
     return jsonify(rooms)
 
 @bp.route('/api/rooms', methods=['POST'])
@@ -55,242 +99,538 @@ def create_room():
     
     # 创建游戏状态
     game_manager = GameManager()
-    game_manager.create_game(room_id)
+    game_manager.create_game(room_id, room_name)
     
-    new_room = {
-        'id': room_id,
-        'name': room_name,
-        'players': 0,
-        'max_players': 2,
-        'status': 'waiting'
-    }
+    new_room = game_manager.lobby[room_id]
     
     print(f"创建新房间: {new_room}")  # 调试信息
     return jsonify(new_room), 201
 
+@bp.route('/api/rooms/<room_id>/log')
+def get_room_log(room_id):
+    """分页获取房间的完整游戏日志，before为上一页返回的next_before"""
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    
+    game_manager = GameManager()
+    page = game_manager.run_in_room(room_id, game_manager.get_log_page, room_id, before, limit)
+    if page is None:
+        return jsonify({'error': '游戏不存在'}), 404
+    return jsonify(page)
+
 # SocketIO游戏事件
+# 修改房间状态和发送状态更新都在房间的邮箱中执行，同一房间的事件按顺序处理
 @socketio.on('join_room')
 def handle_join_room(data):
     """加入房间"""
     room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
     player_name = data.get('player_name')
-    player_id = request.sid  # 使用Socket.IO的session ID作为玩家ID
+    player_id = current_player_id()  # 使用加入时Socket.IO的session ID作为玩家ID
     
     print(f'玩家 {player_name} (ID: {player_id}) 尝试加入房间 {room_id}')
     
+    game_manager = GameManager()
+    
+    # 手动加入房间的玩家离开快速匹配队列，不会再被配对到另一个房间
+    if game_manager.matchmaker is not None:
+        game_manager.matchmaker.cancel(player_id)
+    
     # 加入Socket.IO房间
     from flask_socketio import join_room
     join_room(room_id)
+    codec.join(room_id, request.sid)
     
-    # 添加到游戏状态
-    game_manager = GameManager()
-    success = game_manager.add_player_to_game(room_id, player_id, player_name)
-    
-    if success:
-        # 获取更新后的游戏状态
-        game_state = game_manager.get_game_state(room_id)
-        print(f'玩家加入成功，房间状态: {game_state}')
+    def join():
+        # 添加到游戏状态
+        success = game_manager.add_player_to_game(room_id, player_id, player_name)
+        if not success:
+            return False
         
-        # 向房间内所有玩家广播更新
-        socketio.emit('player_joined', {
+        # 房间内已有的玩家只需要增量补丁
+        game = game_manager.get_game(room_id)
+        patch = game_manager.get_state_patch(room_id)
+        print(f'玩家加入成功，房间状态版本: {game.version}')
+        
+        # 新加入的玩家获取自己视角的完整状态和会话令牌（断线重连时凭令牌恢复座位）
+        emit_state_view('player_joined', {
             'player_name': player_name,
-            'room_id': room_id,
-            'game_state': game_state
-        }, room=room_id)
+            'session_token': game_manager.issue_session(room_id, player_id)
+        }, room_id, player_id)
         
-        # 向所有客户端广播房间列表更新
+        # 向房间内其他玩家广播增量更新（加入者的手牌为空，公开补丁即可）
+        socketio.emit('player_joined', dict({
+            'player_name': player_name,
+            'room_id': room_id
+        }, **game.project_patch(patch)), room=room_id, skip_sid=player_id)
+        return True
+    
+    if game_manager.run_in_room(room_id, join):
+        # 向大厅广播房间列表更新
         updated_rooms = get_rooms_data()
-        print(f"广播房间列表更新: {updated_rooms}")
+        print(f"广播房间列表更新: {len(updated_rooms)} 个房间")
         socketio.emit('rooms_updated', {
             'rooms': updated_rooms
-        })
+        }, to=LOBBY_ROOM)
     else:
         print(f'玩家加入失败: 房间已满或加入失败')
         socketio.emit('error', {
             'message': '房间已满或加入失败'
-        })
+        }, to=player_id)
 
 @socketio.on('leave_room')
 def handle_leave_room(data):
     """离开房间"""
     room_id = data.get('room_id')
     player_name = data.get('player_name')
-    player_id = request.sid
+    player_id = current_player_id()
     
     print(f'玩家 {player_name} 离开房间 {room_id}')
     
-    # 从游戏状态中移除
-    game_manager = GameManager()
-    game_manager.remove_player_from_game(room_id, player_id)
-    
     # 离开Socket.IO房间
     from flask_socketio import leave_room
     leave_room(room_id)
+    codec.leave(room_id, request.sid)
     
-    # 获取更新后的游戏状态
-    game_state = game_manager.get_game_state(room_id)
-    if game_state:
-        socketio.emit('player_left', {
-            'player_name': player_name,
-            'room_id': room_id,
-            'game_state': game_state
-        }, room=room_id)
-    else:
-        socketio.emit('room_closed', {
-            'room_id': room_id,
-            'message': '房间已关闭'
-        }, room=room_id)
+    game_manager = GameManager()
+    
+    def leave():
+        # 从游戏状态中移除
+        game_manager.remove_player_from_game(room_id, player_id)
+        
+        # 广播更新后的游戏状态
+        if game_manager.get_game(room_id):
+            emit_state_patch('player_left', {
+                'player_name': player_name
+            }, room_id)
+        else:
+            socketio.emit('room_closed', {
+                'room_id': room_id,
+                'message': '房间已关闭'
+            }, room=room_id)
+    
+    game_manager.run_in_room(room_id, leave)
     
-    # 向所有客户端广播房间列表更新
+    # 向大厅广播房间列表更新
     updated_rooms = get_rooms_data()
-    print(f"玩家离开后广播房间列表更新: {updated_rooms}")
+    print(f"玩家离开后广播房间列表更新: {len(updated_rooms)} 个房间")
     socketio.emit('rooms_updated', {
         'rooms': updated_rooms
-    })
+    }, to=LOBBY_ROOM)
+
+def emit_game_over(room_id):
+    """检查游戏是否结束，结束时广播获胜者"""
+    game_manager = GameManager()
+    game = game_manager.get_game(room_id)
+    if game:
+        winner = game_manager.check_game_over(room_id)
+        if winner:
+            socketio.emit('game_over', {
+                'room_id': room_id,
+                'winner_id': winner,
+                'winner_name': game.players[winner]['name']
+            }, room=room_id)
 
 @socketio.on('start_game')
 def handle_start_game(data):
     """开始游戏"""
     room_id = data.get('room_id')
-    player_id = request.sid
+    if redirect_to_owner(room_id):
+        return
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    success = game_manager.start_game(room_id)
     
-    if success:
-        game_state = game_manager.get_game_state(room_id)
-        socketio.emit('game_started', {
-            'room_id': room_id,
-            'game_state': game_state
-        }, room=room_id)
-    else:
-        socketio.emit('error', {
-            'message': '无法开始游戏，需要2名玩家'
-        })
+    def start():
+        success = game_manager.start_game(room_id)
+        
+        if success:
+            emit_state_patch('game_started', {}, room_id)
+        else:
+            socketio.emit('error', {
+                'message': '无法开始游戏，需要2名玩家'
+            }, to=player_id)
+    
+    game_manager.run_in_room(room_id, start)
 
 @socketio.on('use_card')
 def handle_use_card(data):
     """使用卡牌"""
     room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
     card_index = data.get('card_index')
     target_id = data.get('target_id')
-    player_id = request.sid
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    success = game_manager.use_card(room_id, player_id, card_index, target_id)
     
-    if success:
-        game_state = game_manager.get_game_state(room_id)
-        socketio.emit('card_used', {
-            'room_id': room_id,
-            'player_id': player_id,
-            'card_index': card_index,
-            'target_id': target_id,
-            'game_state': game_state
-        }, room=room_id)
+    def use_card():
+        success = game_manager.use_card(room_id, player_id, card_index, target_id)
         
-        # 检查游戏是否结束
-        game = game_manager.get_game(room_id)
-        if game:
-            winner = game.check_game_over()
-            if winner:
-                socketio.emit('game_over', {
-                    'room_id': room_id,
-                    'winner_id': winner,
-                    'winner_name': game.players[winner]['name']
-                }, room=room_id)
-    else:
-        socketio.emit('error', {
-            'message': '无法使用卡牌'
-        })
+        if success:
+            emit_state_patch('card_used', {
+                'player_id': player_id,
+                'card_index': card_index,
+                'target_id': target_id
+            }, room_id)
+            
+            # 检查游戏是否结束
+            emit_game_over(room_id)
+        else:
+            socketio.emit('error', {
+                'message': '无法使用卡牌'
+            }, to=player_id)
+    
+    game_manager.run_in_room(room_id, use_card)
 
 @socketio.on('end_turn')
 def handle_end_turn(data):
     """结束回合"""
     room_id = data.get('room_id')
-    player_id = request.sid
+    if redirect_to_owner(room_id):
+        return
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    success = game_manager.end_turn(room_id, player_id)
     
-    if success:
-        game_state = game_manager.get_game_state(room_id)
-        socketio.emit('turn_ended', {
-            'room_id': room_id,
-            'next_player': game_state['current_turn'],
-            'game_state': game_state
-        }, room=room_id)
-    else:
-        socketio.emit('error', {
-            'message': '无法结束回合'
-        })
+    def end_turn():
+        success = game_manager.end_turn(room_id, player_id)
+        
+        if success:
+            game = game_manager.get_game(room_id)
+            emit_state_patch('turn_ended', {
+                'next_player': game.current_turn
+            }, room_id)
+            # 弃牌阶段和摸牌阶段后的状态效果可能结束游戏
+            emit_game_over(room_id)
+        else:
+            socketio.emit('error', {
+                'message': '无法结束回合'
+            }, to=player_id)
+    
+    game_manager.run_in_room(room_id, end_turn)
 
 @socketio.on('draw_card')
 def handle_draw_card(data):
     """抽牌"""
     room_id = data.get('room_id')
-    player_id = request.sid
+    if redirect_to_owner(room_id):
+        return
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    card = game_manager.draw_card(room_id, player_id)
     
-    if card:
-        game_state = game_manager.get_game_state(room_id)
-        socketio.emit('card_drawn', {
-            'room_id': room_id,
-            'player_id': player_id,
-            'card': card.to_dict(),
-            'game_state': game_state
-        }, room=room_id)
-    else:
-        socketio.emit('error', {
-            'message': '无法抽牌'
-        })
+    def draw_card():
+        card = game_manager.draw_card(room_id, player_id)
+        
+        if card:
+            # 抽到的牌只出现在抽牌者自己的手牌补丁里
+            emit_state_patch('card_drawn', {
+                'player_id': player_id
+            }, room_id)
+        else:
+            socketio.emit('error', {
+                'message': '无法抽牌'
+            }, to=player_id)
+    
+    game_manager.run_in_room(room_id, draw_card)
 
 @socketio.on('resolve_attack')
 def handle_resolve_attack(data):
     """结算攻击"""
     room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    success = game_manager.resolve_attack(room_id)
     
-    if success:
-        game_state = game_manager.get_game_state(room_id)
-        socketio.emit('attack_resolved', {
-            'room_id': room_id,
-            'game_state': game_state
-        }, room=room_id)
+    def resolve_attack():
+        success = game_manager.resolve_attack(room_id)
         
-        # 检查游戏是否结束
-        game = game_manager.get_game(room_id)
-        if game:
-            winner = game.check_game_over()
-            if winner:
-                socketio.emit('game_over', {
-                    'room_id': room_id,
-                    'winner_id': winner,
-                    'winner_name': game.players[winner]['name']
-                }, room=room_id)
+        if success:
+            emit_state_patch('attack_resolved', {}, room_id)
+            
+            # 检查游戏是否结束
+            emit_game_over(room_id)
+        else:
+            socketio.emit('error', {
+                'message': '无法结算攻击'
+            }, to=player_id)
+    
+    game_manager.run_in_room(room_id, resolve_attack)
+
+@socketio.on('add_bot')
+def handle_add_bot(data):
+    """让AI对手占用房间的空座位"""
+    room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
+    sid = request.sid
+    
+    game_manager = GameManager()
+    if game_manager.bots is None:
+        socketio.emit('error', {
+            'message': '服务器没有启用AI对手'
+        }, to=sid)
+        return
+    
+    def add_bot():
+        player_id = game_manager.add_bot_to_game(room_id)
+        if player_id is None:
+            return False
+        emit_state_patch('player_joined', {
+            'player_name': game_manager.get_game(room_id).players[player_id]['name']
+        }, room_id)
+        return True
+    
+    if game_manager.run_in_room(room_id, add_bot):
+        socketio.emit('rooms_updated', {
+            'rooms': get_rooms_data()
+        }, to=LOBBY_ROOM)
     else:
         socketio.emit('error', {
-            'message': '无法结算攻击'
-        })
+            'message': '房间已满，无法添加AI对手'
+        }, to=sid)
+
+# 机器人和服务器代为执行的动作对应的事件
+BOT_ACTION_EVENTS = {
+    ACTION_USE: 'card_used',
+    ACTION_RESOLVE: 'attack_resolved',
+    ACTION_END: 'turn_ended'
+}
+
+def schedule_bot_move(room_id):
+    """轮到机器人行动时把当前状态交给搜索进程池（在房间的邮箱中调用，不等待结果）"""
+    game_manager = GameManager()
+    game = game_manager.games.get(room_id)
+    if game_manager.bots is None or game is None:
+        return
+    player_id = game.to_act()
+    if is_bot(player_id):
+        game_manager.bots.request(room_id, player_id, game, on_bot_move)
+
+def on_bot_move(room_id, player_id, version, action):
+    """搜索完成（进程池的回调线程），回到房间的邮箱中执行"""
+    GameManager().executor.submit(room_id, play_bot_move, room_id, player_id, version, action)
+
+def play_bot_move(room_id, player_id, version, action):
+    """执行机器人选择的动作，并像玩家的动作一样广播"""
+    game_manager = GameManager()
+    game = game_manager.games.get(room_id)
+    # 搜索期间状态已经变化（玩家离开、其他人先行动），等待下一次调度
+    if game is None or game.version != version or game.to_act() != player_id:
+        return
+    
+    legal = game.legal_actions(player_id)
+    if action not in legal:
+        # 搜索失败时选择结束回合或放弃回应
+        action = legal[0]
+    
+    if not game_manager.apply_action(room_id, player_id, action):
+        print(f'机器人 {player_id} 的动作执行失败: {action}')
+        return
+    
+    event = BOT_ACTION_EVENTS[action[0]]
+    if action[0] == ACTION_USE:
+        payload = {'player_id': player_id, 'card_index': action[1], 'target_id': action[2]}
+    elif action[0] == ACTION_END:
+        payload = {'next_player': game.current_turn}
+    else:
+        payload = {}
+    emit_state_patch(event, payload, room_id)
+    emit_game_over(room_id)
+
+@socketio.on('watch_lobby')
+def handle_watch_lobby(data=None):
+    """大厅页面订阅房间列表更新（rooms_updated只发给大厅页面）"""
+    from flask_socketio import join_room
+    join_room(LOBBY_ROOM)
+    socketio.emit('rooms_updated', {
+        'rooms': get_rooms_data()
+    }, to=request.sid)
+
+@socketio.on('quick_match')
+def handle_quick_match(data=None):
+    """进入快速匹配队列，按分数与等待中的玩家配对，配对成功后直接入座开局"""
+    data = data or {}
+    player_id = current_player_id()
+    game_manager = GameManager()
+    if game_manager.matchmaker is None:
+        socketio.emit('error', {
+            'message': '服务器没有启用快速匹配'
+        }, to=request.sid)
+        return
+    if player_id in game_manager.player_rooms:
+        socketio.emit('error', {
+            'message': '已经在房间中，无法快速匹配'
+        }, to=request.sid)
+        return
+    
+    player_name = data.get('player_name') or '匿名玩家'
+    room_id = game_manager.matchmaker.enqueue(player_id, player_name, data.get('rating'))
+    if room_id is None:
+        # 还没有配对，告知排队情况（配对成功时由notify_matched发送match_found）
+        socketio.emit('match_queued', game_manager.matchmaker.position(player_id) or {}, to=request.sid)
+
+@socketio.on('cancel_quick_match')
+def handle_cancel_quick_match(data=None):
+    """离开快速匹配队列"""
+    matchmaker = GameManager().matchmaker
+    cancelled = matchmaker is not None and matchmaker.cancel(current_player_id())
+    socketio.emit('match_cancelled', {
+        'cancelled': cancelled
+    }, to=request.sid)
+
+@socketio.on('resume_session')
+def handle_resume_session(data):
+    """断线重连：凭会话令牌恢复原来的座位，只补发客户端缺失的补丁"""
+    room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
+    token = data.get('session_token')
+    since_version = data.get('since_version')
+    sid = request.sid
+    
+    game_manager = GameManager()
+    update = game_manager.run_in_room(room_id, game_manager.resume_session, room_id, token, sid, since_version)
+    if not update:
+        # 令牌无效或座位已经被回收，客户端重新加入房间
+        socketio.emit('resume_failed', {
+            'room_id': room_id
+        }, to=sid)
+        return
+    
+    # 新连接加入房间广播和以原玩家ID命名的房间，发给原玩家ID的消息能到达新连接
+    from flask_socketio import join_room
+    join_room(room_id)
+    join_room(update['player_id'])
+    codec.join(room_id, sid)
+    codec.join(update['player_id'], sid)
+    socketio.emit('session_resumed', dict(update, room_id=room_id), to=sid)
+    
+    # 从快照恢复的房间可能正等待机器人行动；玩家回来后取消断线宽限
+    game_manager.run_in_room(room_id, schedule_bot_move, room_id)
+    game_manager.run_in_room(room_id, schedule_deadlines, room_id)
 
 @socketio.on('get_game_state')
 def handle_get_game_state(data):
-    """获取游戏状态"""
+    """获取游戏状态（带since_version时只返回缺失的补丁）"""
     room_id = data.get('room_id')
+    if redirect_to_owner(room_id):
+        return
+    since_version = data.get('since_version')
+    sid = request.sid
+    player_id = current_player_id()
     
     game_manager = GameManager()
-    game_state = game_manager.get_game_state(room_id)
     
-    if game_state:
-        socketio.emit('game_state_update', {
-            'room_id': room_id,
-            'game_state': game_state
-        })
+    def get_state():
+        if since_version is None:
+            return game_manager.get_state_view(room_id, player_id)
+        return game_manager.get_state_since(room_id, since_version, player_id)
+    
+    update = game_manager.run_in_room(room_id, get_state)
+    
+    if update:
+        socketio.emit('game_state_update', dict(update, room_id=room_id), to=sid)
     else:
         socketio.emit('error', {
             'message': '游戏不存在'
-        })
+        }, to=sid)
+
+def schedule_deadlines(room_id):
+    """按房间的当前状态设置闪避窗口、回合时限和断线宽限（在房间的邮箱中调用）"""
+    deadlines = GameManager().deadlines
+    if deadlines is not None:
+        deadlines.sync(room_id)
+
+def notify_deadline(kind, room_id, player_id, action):
+    """期限到期、服务器代为结算攻击或结束回合后，像玩家的动作一样广播（在房间的邮箱中调用）"""
+    game = GameManager().games.get(room_id)
+    if game is None:
+        return
+    payload = {'player_id': player_id, 'reason': kind}
+    if action == ACTION_END:
+        payload['next_player'] = game.current_turn
+    emit_state_patch(BOT_ACTION_EVENTS[action], payload, room_id)
+    emit_game_over(room_id)
+
+def notify_matched(room_id, pair):
+    """快速匹配的两名玩家已经入座开局（在房间的邮箱中调用），把房间和会话令牌发给双方"""
+    game_manager = GameManager()
+    # 状态已经提交，两名玩家进入房间页面后凭令牌恢复座位、取得完整状态
+    game_manager.get_state_patch(room_id)
+    for ticket in pair:
+        opponent = pair[1] if ticket is pair[0] else pair[0]
+        socketio.emit('match_found', {
+            'room_id': room_id,
+            'player_name': ticket.player_name,
+            'opponent_name': opponent.player_name,
+            'session_token': game_manager.issue_session(room_id, ticket.player_id)
+        }, to=ticket.player_id)
+    schedule_deadlines(room_id)
+    socketio.emit('rooms_updated', {
+        'rooms': get_rooms_data()
+    }, to=LOBBY_ROOM)
+
+def notify_evicted(reason, room_id, player_id, player_name):
+    """房间回收线程移除了断线玩家或房间（在房间的邮箱中调用）"""
+    if player_id is not None:
+        # 断线玩家已经移出房间，房间随最后一名玩家删除时通知关闭
+        if room_id in GameManager().games:
+            emit_state_patch('player_left', {
+                'player_name': player_name,
+                'reason': reason
+            }, room_id)
+            return
+    socketio.emit('room_closed', {
+        'room_id': room_id,
+        'reason': reason,
+        'message': '房间已关闭'
+    }, room=room_id)
+
+def notify_swept(evictions):
+    """一次回收结束后广播一次房间列表更新"""
+    socketio.emit('rooms_updated', {
+        'rooms': get_rooms_data()
+    }, to=LOBBY_ROOM)
+
+@bp.route('/api/sweeper')
+def sweeper_stats():
+    """房间回收统计"""
+    sweeper = GameManager().sweeper
+    if sweeper is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(sweeper.stats(), enabled=True))
+
+@bp.route('/api/bots')
+def bot_stats():
+    """AI对手的搜索统计"""
+    bots = GameManager().bots
+    if bots is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(bots.stats(), enabled=True))
+
+@bp.route('/api/deadlines')
+def deadline_stats():
+    """行动期限和时间轮的统计"""
+    deadlines = GameManager().deadlines
+    if deadlines is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(deadlines.stats(), enabled=True))
+
+@bp.route('/api/matchmaking')
+def matchmaking_stats():
+    """快速匹配的队列深度和等待时间分位数"""
+    matchmaker = GameManager().matchmaker
+    if matchmaker is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(matchmaker.stats(), enabled=True))
+
+@bp.route('/api/executor')
+def executor_stats():
+    """房间执行器的队列深度和等待时间"""
+    return jsonify(GameManager().executor.stats())
@@ -1,5 +1,8 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, Response
 from app import socketio
+from app.codec import ENCODING_JSON, ENCODING_MSGPACK, codec
+from app.metrics import metrics
+from app.game_logic.game_manager import GameManager
 
 bp = Blueprint('main', __name__)
 
@@ -21,6 +24,11 @@ def status():
         'message': '希望杀游戏服务器运行正常'
     })
 
+@bp.route('/api/metrics')
+def get_metrics():
+    """Prometheus格式的服务器指标"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # SocketIO事件处理
 @socketio.on('connect')
 def handle_connect():
@@ -28,7 +36,29 @@ def handle_connect():
     print('客户端已连接')
     socketio.emit('message', {'data': '欢迎来到希望杀！'})
 
+@socketio.on('set_encoding')
+def handle_set_encoding(data):
+    """协商消息格式：json（默认）或msgpack，msgpack时返回还原紧凑格式需要的键表和卡牌目录"""
+    requested = (data or {}).get('encoding')
+    encoding = ENCODING_MSGPACK if requested == ENCODING_MSGPACK and codec.available else ENCODING_JSON
+    reply = {'encoding': encoding}
+    if encoding == ENCODING_MSGPACK:
+        reply['schema'] = codec.schema()
+    
+    # 回复本身以JSON发送，之后的消息才改用协商的格式
+    socketio.emit('encoding_set', reply, to=request.sid)
+    codec.negotiate(request.sid, encoding)
+
 @socketio.on('disconnect')
 def handle_disconnect():
-    """客户端断开连接事件"""
-    print('客户端已断开连接')
+    """客户端断开连接事件（玩家保留在房间中，超过保留时间后由回收线程移除）"""
+    codec.forget(request.sid)
+    game_manager = GameManager()
+    if game_manager.matchmaker is not None:
+        game_manager.matchmaker.cancel(game_manager.sessions.player_of(request.sid))
+    room_id = game_manager.player_disconnected(request.sid)
+    print(f'客户端已断开连接，所在房间: {room_id}')
+    
+    # 轮到断线的玩家行动时开始断线宽限（不等待房间的邮箱）
+    if room_id is not None and game_manager.deadlines is not None:
+        game_manager.executor.submit(room_id, game_manager.deadlines.sync, room_id)
@@ -70,6 +70,29 @@ function joinRoom(roomId) {
     window.location.href = `/game/room/${roomId}?player=${encodeURIComponent(playerName)}`;
 }
 
+// 大厅的Socket.IO连接
+let socket = null;
+let matching = false;  // 是否在快速匹配队列中
+
+// 快速匹配：进入匹配队列，配对成功后直接进入已经开局的房间
+function quickMatch() {
+    if (matching) {
+        socket.emit('cancel_quick_match');
+        return;
+    }
+    const playerName = prompt('请输入您的玩家名称:');
+    if (!playerName) {
+        return;
+    }
+    socket.emit('quick_match', { player_name: playerName });
+}
+
+// 更新快速匹配按钮
+function setMatching(value) {
+    matching = value;
+    document.getElementById('quick-match-btn').textContent = matching ? '取消匹配' : '快速匹配';
+}
+
 // 刷新房间列表
 function refreshRooms() {
     loadRooms();
@@ -94,17 +117,48 @@ document.addEventListener('DOMContentLoaded', function() {
     console.log('游戏大厅页面已加载');
     loadRooms();
     
-    // 初始化Socket.IO连接以接收房间更新
-    const socket = io();
+    // 初始化Socket.IO连接以接收房间更新和快速匹配结果
+    socket = io();
     
     socket.on('connect', function() {
         console.log('已连接到服务器');
+        // 订阅房间列表更新（重新连接后也需要重新订阅）
+        socket.emit('watch_lobby');
     });
     
     socket.on('rooms_updated', function(data) {
         console.log('房间列表更新:', data);
         updateRoomsList(data.rooms);
     });
+    
+    socket.on('match_queued', function(data) {
+        console.log('进入匹配队列:', data);
+        setMatching(true);
+        showMessage(`正在匹配，队列中共 ${data.queue_depth} 名玩家`, 'success');
+    });
+    
+    socket.on('match_cancelled', function(data) {
+        setMatching(false);
+        showMessage('已取消匹配', 'success');
+    });
+    
+    // 配对成功：保存会话令牌，房间页面凭令牌恢复已经分配的座位
+    socket.on('match_found', function(data) {
+        console.log('匹配成功:', data);
+        setMatching(false);
+        sessionStorage.setItem(`xiwangsha_session_${data.room_id}`, data.session_token);
+        window.location.href = `/game/room/${data.room_id}?player=${encodeURIComponent(data.player_name)}`;
+    });
+    
+    socket.on('error', function(data) {
+        setMatching(false);
+        showMessage(data.message, 'error');
+    });
+    
+    // 断开连接时服务器把玩家移出匹配队列
+    socket.on('disconnect', function() {
+        setMatching(false);
+    });
 });
 
 // 更新房间列表显示
@@ -5,6 +5,15 @@ let roomId;
 let playerName;
 let selectedCardIndex = -1;
 let currentPlayerId = null;
+let gameState = null;  // 本地保存的游戏状态，通过增量补丁更新
+let useBinary = false;  // 是否请求MessagePack格式（URL参数encoding=msgpack）
+let schema = null;  // 服务器返回的紧凑格式键表和卡牌目录
+const handlers = {};  // 事件名 -> 处理函数（合并帧按事件名分发）
+let batching = false;  // 正在处理合并帧，界面在整帧处理完后刷新一次
+let renderPending = false;
+
+// 紧凑格式中值为卡牌列表的键（与app/codec.py一致）
+const CARD_LIST_KEYS = new Set(['cards', 'added', 'hand_cards']);
 
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -12,6 +21,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const urlParams = new URLSearchParams(window.location.search);
     roomId = window.location.pathname.split('/').pop();
     playerName = urlParams.get('player') || '匿名玩家';
+    useBinary = urlParams.get('encoding') === 'msgpack' && typeof MessagePack !== 'undefined';
     
     console.log(`进入房间 ${roomId}, 玩家: ${playerName}`);
     
@@ -27,81 +37,277 @@ function initSocket() {
         console.log('已连接到服务器');
         showMessage('已连接到游戏服务器', 'success');
         
-        // 保存当前玩家的Socket ID
-        currentPlayerId = socket.id;
+        // 每个新连接重新协商消息格式，服务器的回复总是JSON
+        if (useBinary) {
+            socket.emit('set_encoding', { encoding: 'msgpack' });
+        }
         
-        // 连接成功后立即加入房间
+        // 有会话令牌时恢复原来的座位（断线重连、刷新页面），否则加入房间
+        const sessionToken = sessionStorage.getItem(sessionKey());
+        if (sessionToken) {
+            socket.emit('resume_session', {
+                room_id: roomId,
+                session_token: sessionToken,
+                since_version: gameState ? gameState.version : null
+            });
+        } else {
+            // 保存当前玩家的Socket ID
+            currentPlayerId = socket.id;
+            joinRoom();
+        }
+    });
+    
+    // 座位已恢复，只收到断线期间缺失的补丁（或完整状态）
+    on('session_resumed', function(data) {
+        console.log('会话已恢复:', data);
+        currentPlayerId = data.player_id;
+        showMessage('已重新连接到房间', 'success');
+        syncGameState(data);
+    });
+    
+    // 令牌失效（座位已被回收），重新加入房间
+    on('resume_failed', function(data) {
+        console.log('会话恢复失败:', data);
+        sessionStorage.removeItem(sessionKey());
+        gameState = null;
+        currentPlayerId = socket.id;
         joinRoom();
     });
     
+    socket.on('batch', onBatch);
+    
     socket.on('disconnect', function() {
         console.log('与服务器断开连接');
         showMessage('与服务器断开连接', 'error');
     });
     
-    socket.on('message', function(data) {
+    on('encoding_set', function(data) {
+        console.log('消息格式:', data.encoding);
+        schema = data.schema || null;
+    });
+    
+    // 房间由其他服务器进程负责，转到对应进程重新进入
+    on('room_moved', function(data) {
+        console.log('房间所在的服务器:', data.url);
+        window.location.href = data.url + window.location.pathname + window.location.search;
+    });
+    
+    on('message', function(data) {
         console.log('收到消息:', data);
         showMessage(data.data, 'success');
     });
     
-    socket.on('player_joined', function(data) {
+    on('player_joined', function(data) {
         console.log('玩家加入:', data);
-        showMessage(`${data.player_name} 加入了房间`, 'success');
-        if (data.game_state) {
-            updateGameState(data.game_state);
+        if (data.session_token) {
+            // 自己加入成功，保存会话令牌
+            sessionStorage.setItem(sessionKey(), data.session_token);
         }
+        showMessage(`${data.player_name} 加入了房间`, 'success');
+        syncGameState(data);
     });
     
-    socket.on('player_left', function(data) {
+    on('player_left', function(data) {
         console.log('玩家离开:', data);
         showMessage(`${data.player_name} 离开了房间`, 'error');
-        if (data.game_state) {
-            updateGameState(data.game_state);
-        }
+        syncGameState(data);
     });
     
-    socket.on('game_started', function(data) {
+    // 房间被关闭（最后一名玩家离开或服务器回收了房间）
+    on('room_closed', function(data) {
+        console.log('房间已关闭:', data);
+        showMessage(data.message, 'error');
+        sessionStorage.removeItem(sessionKey());
+    });
+    
+    on('game_started', function(data) {
         console.log('游戏开始:', data);
         showMessage('游戏开始！', 'success');
-        if (data.game_state) {
-            updateGameState(data.game_state);
-        }
+        syncGameState(data);
         updateGameControls();
     });
     
-    socket.on('card_used', function(data) {
+    on('card_used', function(data) {
         console.log('卡牌使用:', data);
-        if (data.game_state) {
-            updateGameState(data.game_state);
-        }
+        syncGameState(data);
     });
     
-    socket.on('turn_ended', function(data) {
+    on('turn_ended', function(data) {
         console.log('回合结束:', data);
-        showMessage(`轮到 ${data.next_player} 的回合`, 'success');
-        if (data.game_state) {
-            updateGameState(data.game_state);
-        }
+        showMessage(`${deadlineNotice(data.reason)}轮到 ${data.next_player} 的回合`, 'success');
+        syncGameState(data);
     });
     
-    socket.on('game_over', function(data) {
+    on('game_over', function(data) {
         console.log('游戏结束:', data);
         showMessage(`游戏结束！获胜者: ${data.winner_name}`, 'success');
         updateGameControls();
     });
     
-    socket.on('error', function(data) {
+    on('error', function(data) {
         console.log('错误:', data);
         showMessage(data.message, 'error');
     });
     
-    socket.on('attack_resolved', function(data) {
+    on('attack_resolved', function(data) {
         console.log('攻击结算:', data);
-        showMessage('攻击已结算', 'success');
-        if (data.game_state) {
-            updateGameState(data.game_state);
+        showMessage(`${deadlineNotice(data.reason)}攻击已结算`, 'success');
+        syncGameState(data);
+    });
+    
+    on('game_state_update', function(data) {
+        console.log('状态同步:', data);
+        syncGameState(data);
+    });
+}
+
+// 服务器在期限到期后代为行动时的提示
+const DEADLINE_NOTICES = {
+    dodge: '闪避超时，',
+    turn: '回合超时，',
+    grace: '玩家断线，'
+};
+
+function deadlineNotice(reason) {
+    return DEADLINE_NOTICES[reason] || '';
+}
+
+// 注册事件处理函数，MessagePack二进制帧先解码并还原为JSON结构
+function on(event, handler) {
+    handlers[event] = handler;
+    socket.on(event, function(data) {
+        handler(decodePayload(data));
+    });
+}
+
+// 一个玩家动作产生的多条消息合并为一帧：按顺序分发，最后只刷新一次界面
+function onBatch(data) {
+    batching = true;
+    try {
+        for (const [event, payload] of decodePayload(data).events) {
+            const handler = handlers[event];
+            if (handler) {
+                handler(payload);
+            }
         }
+    } finally {
+        batching = false;
+    }
+    if (renderPending) {
+        renderPending = false;
+        updateGameState(gameState);
+    }
+}
+
+function decodePayload(data) {
+    if (!(data instanceof ArrayBuffer) || !schema) {
+        return data;
+    }
+    return expandCompact(MessagePack.decode(new Uint8Array(data)));
+}
+
+// 紧凑格式还原：键编号换回键名，[卡牌ID, 种类编号]换回卡牌
+function expandCompact(value) {
+    if (Array.isArray(value)) {
+        return value.map(expandCompact);
+    }
+    if (value === null || typeof value !== 'object') {
+        return value;
+    }
+    const result = {};
+    for (const [rawKey, item] of Object.entries(value)) {
+        const key = /^\d+$/.test(rawKey) ? schema.keys[Number(rawKey)] : rawKey;
+        if (CARD_LIST_KEYS.has(key) && Array.isArray(item)) {
+            result[key] = item.map(card => Array.isArray(card) ? expandCard(card) : expandCompact(card));
+        } else if (key === 'card' && Array.isArray(item)) {
+            result[key] = expandCard(item);
+        } else {
+            result[key] = expandCompact(item);
+        }
+    }
+    return result;
+}
+
+function expandCard([cardId, kind]) {
+    return Object.assign({ card_id: cardId, effect: null }, schema.cards[kind]);
+}
+
+// 根据服务器消息同步本地游戏状态（完整状态或增量补丁）
+function syncGameState(data) {
+    if (data.game_state) {
+        // 完整状态：公开状态帧 + 自己的手牌
+        gameState = data.game_state;
+        gameState.hand_cards = data.private ? data.private.hand_cards : [];
+        gameState.actions = data.private ? data.private.actions : null;
+    } else if (data.patches || data.patch) {
+        const updates = data.patches || [{ patch: data.patch, hand: data.hand }];
+        for (const update of updates) {
+            const patch = update.patch;
+            if (gameState && patch.version <= gameState.version) {
+                continue;  // 已经应用过的补丁
+            }
+            if (!gameState || patch.base_version !== gameState.version) {
+                // 版本不连续，请求缺失的补丁
+                socket.emit('get_game_state', {
+                    room_id: roomId,
+                    since_version: gameState ? gameState.version : null
+                });
+                return;
+            }
+            applyPatch(gameState, patch, update.hand);
+        }
+        if (data.actions) {
+            gameState.actions = data.actions;
+        }
+    } else {
+        return;
+    }
+    if (batching) {
+        renderPending = true;
+    } else {
+        updateGameState(gameState);
+    }
+}
+
+// 服务器随状态更新发送的可用操作，版本与本地状态不一致时视为不可操作
+function currentActions() {
+    const actions = gameState && gameState.actions;
+    return actions && actions.version === gameState.version ? actions : null;
+}
+
+// 把增量补丁（公开部分和自己的手牌变化）应用到本地游戏状态
+function applyPatch(state, patch, hand) {
+    (patch.removed_players || []).forEach(playerId => {
+        delete state.players[playerId];
     });
+    
+    for (const [playerId, fields] of Object.entries(patch.players || {})) {
+        state.players[playerId] = Object.assign(state.players[playerId] || { id: playerId }, fields);
+    }
+    
+    if (hand) {
+        if (hand.cards) {
+            state.hand_cards = hand.cards;
+        } else {
+            const removed = new Set(hand.removed || []);
+            state.hand_cards = (state.hand_cards || [])
+                .filter(card => !removed.has(card.card_id))
+                .concat(hand.added || []);
+        }
+    }
+    
+    Object.assign(state, patch.fields || {});
+    
+    if (patch.log_reset) {
+        state.game_log = [];
+    }
+    state.game_log = (state.game_log || []).concat(patch.log || []).slice(-10);
+    state.version = patch.version;
+}
+
+// 会话令牌在sessionStorage中的键
+function sessionKey() {
+    return `xiwangsha_session_${roomId}`;
 }
 
 // 加入房间
@@ -123,6 +329,7 @@ function leaveRoom() {
             player_name: playerName
         });
     }
+    sessionStorage.removeItem(sessionKey());
     window.location.href = '/game';
 }
 
@@ -136,7 +343,28 @@ function startGame() {
     }
 }
 
-// 更新游戏状态
+// 让AI对手占用空座位
+function addBot() {
+    if (socket && socket.connected) {
+        socket.emit('add_bot', {
+            room_id: roomId
+        });
+    }
+}
+
+// 玩家的状态效果：名称、层数和剩余回合数
+function formatStatuses(statuses, turnNumber) {
+    if (!statuses || statuses.length === 0) {
+        return '';
+    }
+    const items = statuses.map(status => {
+        const stacks = status.stacks > 1 ? `×${status.stacks}` : '';
+        return `${status.name}${stacks}（${status.expires - (turnNumber || 0)}回合）`;
+    });
+    return `<p class="player-status">状态: ${items.join('、')}</p>`;
+}
+
+// 更新游戏状态显示
 function updateGameState(gameState) {
     console.log('更新游戏状态:', gameState);
     
@@ -153,7 +381,8 @@ function updateGameState(gameState) {
             <div class="player-info" data-player-id="${player.id}">
                 <h4>${player.name}</h4>
                 <p>San值: ${player.san}/${player.max_san}</p>
-                <p>手牌数量: ${player.hand_cards.length}</p>
+                <p>手牌数量: ${player.hand_count}</p>
+                ${formatStatuses(player.status, gameState.turn_number)}
                 ${gameState.current_turn === player.id ? '<span class="current-turn">当前回合</span>' : ''}
             </div>
         `).join('');
@@ -187,9 +416,9 @@ function updateGameState(gameState) {
 function updateGameControls(gameState = null) {
     const startButton = document.querySelector('button[onclick="startGame()"]');
     const endTurnButton = document.querySelector('button[onclick="endTurn()"]');
+    const addBotButton = document.querySelector('button[onclick="addBot()"]');
     
     if (gameState) {
-        const isMyTurn = gameState.current_turn === socket.id;
         const isPlaying = gameState.game_phase === 'playing';
         
         if (startButton) {
@@ -199,7 +428,13 @@ function updateGameControls(gameState = null) {
         }
         
         if (endTurnButton) {
-            endTurnButton.style.display = isPlaying && isMyTurn ? 'inline-block' : 'none';
+            const actions = currentActions();
+            endTurnButton.style.display = actions && actions.end_turn ? 'inline-block' : 'none';
+        }
+        
+        // 有空座位时可以让AI对手加入
+        if (addBotButton) {
+            addBotButton.style.display = !isPlaying && Object.keys(gameState.players).length < 2 ? 'inline-block' : 'none';
         }
     }
 }
@@ -225,57 +460,21 @@ function updateHandCards(gameState) {
     if (gameState.game_phase === 'playing' && currentPlayer) {
         handCardsDiv.style.display = 'block';
         
-        if (currentPlayer.hand_cards.length === 0) {
+        const handCards = gameState.hand_cards || [];
+        if (handCards.length === 0) {
             cardsContainer.innerHTML = '<p>暂无手牌</p>';
         } else {
-            cardsContainer.innerHTML = currentPlayer.hand_cards.map((card, index) => {
-                // 检查是否可以点击这张卡牌
-                let canClick = true;
-                let clickAction = `selectCard(${index})`;
+            // 能否打出由服务器随状态更新发送的可用操作决定
+            const actions = currentActions();
+            const responding = actions && actions.resolve;
+            cardsContainer.innerHTML = handCards.map((card, index) => {
+                const option = actions && actions.options[index];
+                const canClick = Boolean(option && option.card_id === card.card_id && option.playable);
                 
-                // 检查是否在自己的回合
-                const isMyTurn = gameState.current_turn === currentPlayerId;
-                
-                // 如果是驳回牌，检查是否在等待闪避状态
-                if (card.name === '驳回') {
-                    if (gameState.waiting_for_dodge && gameState.attack_target === currentPlayerId) {
-                        // 检查是否可以用驳回牌闪避当前攻击
-                        // 线性代数不能用驳回牌闪避
-                        if (gameState.pending_attack && gameState.pending_attack.card && gameState.pending_attack.card.name === '线性代数') {
-                            canClick = false;
-                        } else {
-                            clickAction = `useDodgeCard(${index})`;
-                        }
-                    } else {
-                        // 不能使用驳回牌
-                        canClick = false;
-                    }
-                }
-                
-                // 检查一套卷子是否可以用来抵消线性代数
-                if (card.name === '一套卷子' && gameState.waiting_for_dodge && gameState.attack_target === currentPlayerId) {
-                    if (gameState.pending_attack && gameState.pending_attack.card && gameState.pending_attack.card.name === '线性代数') {
-                        // 一套卷子可以用来抵消线性代数
-                        clickAction = `useYitaojuanziCard(${index})`;
-                    }
-                }
-                
-                // 检查一套卷子的使用限制
-                if (card.name === '一套卷子') {
-                    const currentPlayer = Object.values(gameState.players).find(player => player.id === currentPlayerId);
-                    if (currentPlayer && gameState.turn_card_usage && gameState.turn_card_usage[currentPlayerId]) {
-                        const usageCount = gameState.turn_card_usage[currentPlayerId]['一套卷子'] || 0;
-                        if (usageCount >= 1) {
-                            canClick = false;
-                        }
-                    }
-                }
-                
-                // 检查体术牌是否只能在当前回合使用
-                if (card.card_type === '体术牌' && card.name !== '驳回') {
-                    if (!isMyTurn) {
-                        canClick = false;
-                    }
+                // 回应攻击的牌直接打出（驳回闪避、一套卷子抵消线性代数），主动打出的牌先选择目标
+                let clickAction = `selectCard(${index})`;
+                if (responding) {
+                    clickAction = card.name === '驳回' ? `useDodgeCard(${index})` : `useYitaojuanziCard(${index})`;
                 }
                 
                 return `
@@ -290,7 +489,7 @@ function updateHandCards(gameState) {
             }).join('');
             
             // 如果在等待闪避状态，添加相应的按钮
-            if (gameState.waiting_for_dodge && gameState.attack_target === currentPlayerId) {
+            if (responding) {
                 let buttonText = '不闪避';
                 let buttonAction = 'skipDodge()';
                 
@@ -337,14 +536,17 @@ function showTargetSelection() {
     const targetSelect = document.getElementById('target-player');
     const cardUsage = document.querySelector('.card-usage');
     
-    // 获取所有玩家作为目标（包括自己）
+    // 只列出这张牌可以选择的目标（由服务器给出）
+    const actions = currentActions();
+    const option = actions && actions.options[selectedCardIndex];
+    const targets = option ? option.targets : [];
     const playerElements = document.querySelectorAll('.player-info');
     const targetPlayers = [];
     
     playerElements.forEach(playerElement => {
         const playerName = playerElement.querySelector('h4').textContent;
         const playerId = playerElement.getAttribute('data-player-id');
-        if (playerId) {
+        if (playerId && targets.includes(playerId)) {
             targetPlayers.push({ name: playerName, id: playerId });
         }
     });
@@ -1,8 +1,71 @@
-from app import create_app, socketio
+import argparse
+import os
+import subprocess
+import sys
 
-app = create_app()
+# 后台服务（快照写入、房间回收、AI对手进程池、行动期限、快速匹配）只在处理请求的进程中启动：
+# 直接运行时在__main__中按进程角色创建应用，被WSGI服务器导入时在这里创建。
+# spawn方式启动的子进程（AI对手进程池）会以__mp_main__重新执行这个文件，这时不导入Web层也不创建应用
+app = None
+if __name__ not in ('__main__', '__mp_main__'):
+    from app import create_app
+    app = create_app()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='希望杀游戏服务器')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5000, help='端口（多进程时第i个进程使用 端口+i）')
+    parser.add_argument('--workers', type=int, default=1, help='服务器进程数量，房间按ID的crc32分配给各进程')
+    parser.add_argument('--public-host', default='localhost', help='客户端访问各进程使用的主机名')
+    parser.add_argument('--store', default=None,
+                        help='房间存储：memory:// / sqlite:///rooms.db / redis://host:6379/0（多进程默认sqlite:///rooms.db）')
+    parser.add_argument('--message-queue', default=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+                        help='Socket.IO消息队列地址，例如 redis://localhost:6379/0')
+    return parser.parse_args()
+
+def run_workers(args):
+    """启动多个服务器进程，每个进程负责一部分房间"""
+    store = args.store or os.environ.get('ROOM_STORE_URL') or 'sqlite:///rooms.db'
+    if store == 'memory://':
+        print("多进程模式不能使用进程内存储，改用 sqlite:///rooms.db")
+        store = 'sqlite:///rooms.db'
+    if not args.message_queue:
+        print("警告: 没有配置消息队列，大厅广播只能到达同一进程上的客户端")
+    
+    urls = [f'http://{args.public_host}:{args.port + i}' for i in range(args.workers)]
+    processes = []
+    for index in range(args.workers):
+        env = dict(os.environ,
+                   ROOM_STORE_URL=store,
+                   WORKER_INDEX=str(index),
+                   WORKER_URLS=','.join(urls))
+        if args.message_queue:
+            env['SOCKETIO_MESSAGE_QUEUE'] = args.message_queue
+        command = [sys.executable, os.path.abspath(__file__),
+                   '--host', args.host, '--port', str(args.port + index)]
+        processes.append(subprocess.Popen(command, env=env))
+        print(f"进程 {index}: {urls[index]}")
+    
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
 
 if __name__ == '__main__':
-    print("启动希望杀游戏服务器...")
-    print("访问地址: http://localhost:5000")
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    from app import create_app, socketio
+    args = parse_args()
+    if args.workers > 1:
+        run_workers(args)
+    elif 'WORKER_INDEX' in os.environ:
+        # 由run_workers启动的子进程（subprocess启动，每个进程都处理请求）
+        app = create_app(start_services=True)
+        print(f"希望杀服务器进程 {os.environ['WORKER_INDEX']} 启动，端口 {args.port}")
+        socketio.run(app, host=args.host, port=args.port, allow_unsafe_werkzeug=True)
+    else:
+        # 调试模式下重载器的父进程只监视文件、重启子进程，处理请求的子进程带有WERKZEUG_RUN_MAIN
+        app = create_app(start_services=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+        print("启动希望杀游戏服务器...")
+        print(f"访问地址: http://localhost:{args.port}")
+        socketio.run(app, host=args.host, port=args.port, debug=True)
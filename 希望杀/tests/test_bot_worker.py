@@ -0,0 +1,85 @@
+"""
+AI对手进程池的子进程不创建应用、不启动后台服务
+
+spawn方式的子进程会以__mp_main__重新执行父进程的入口文件（服务器进程中是run.py），
+这里把父进程的__main__换成run.py，再通过BotPool实际使用的进程池检查子进程的状态。
+
+用法（在希望杀目录下）：
+    python -m unittest discover -s tests
+"""
+import importlib.util
+import os
+import sys
+import threading
+import types
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.game_logic.bot import BotPool  # noqa: E402
+
+RUN_PY = os.path.join(ROOT, 'run.py')
+
+# 后台服务的线程名称（快照写入、共享存储写入、房间回收、行动期限的时间轮、快速匹配）
+SERVICE_THREADS = {'snapshot-writer', 'store-writer', 'room-sweeper', 'timer-wheel', 'match-queue'}
+
+
+def _probe_worker():
+    """在子进程中执行：入口文件是否创建了应用，是否导入了Web层，启动了哪些后台线程"""
+    entry = sys.modules.get('__mp_main__')
+    return {
+        'entry_point': getattr(entry, '__file__', None),
+        'app_created': getattr(entry, 'app', None) is not None,
+        'web_imported': 'flask' in sys.modules or 'flask_socketio' in sys.modules,
+        'threads': sorted(thread.name for thread in threading.enumerate()),
+    }
+
+
+def _probe_create_app():
+    """在子进程中执行：不指定start_services时create_app不启动后台服务"""
+    from app import create_app
+    from app.game_logic.game_manager import GameManager
+
+    create_app()
+    game_manager = GameManager()
+    return {
+        'services': [name for name in ('persistence', 'store_writer', 'sweeper', 'bots', 'deadlines', 'matchmaker')
+                     if getattr(game_manager, name) is not None],
+        'threads': sorted(thread.name for thread in threading.enumerate()),
+    }
+
+
+class SpawnedWorkerTest(unittest.TestCase):
+    """父进程的入口文件是run.py时，进程池的子进程只做搜索"""
+
+    def setUp(self):
+        # 让spawn像服务器进程那样把run.py作为父进程的主模块传给子进程
+        self._main = sys.modules['__main__']
+        fake_main = types.ModuleType('__main__')
+        fake_main.__file__ = RUN_PY
+        fake_main.__spec__ = None
+        sys.modules['__main__'] = fake_main
+        self.pool = BotPool(workers=1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        sys.modules['__main__'] = self._main
+
+    def test_worker_does_not_start_services(self):
+        result = self.pool._pool().submit(_probe_worker).result(timeout=60)
+        self.assertEqual(result['entry_point'], RUN_PY)
+        self.assertFalse(result['app_created'])
+        self.assertFalse(result['web_imported'])
+        self.assertFalse(SERVICE_THREADS & set(result['threads']))
+
+    @unittest.skipUnless(importlib.util.find_spec('flask_socketio'), '需要安装Web依赖（开发/requirements.txt）')
+    def test_create_app_in_worker_does_not_start_services(self):
+        result = self.pool._pool().submit(_probe_create_app).result(timeout=60)
+        self.assertEqual(result['services'], [])
+        self.assertFalse(SERVICE_THREADS & set(result['threads']))
+
+
+if __name__ == '__main__':
+    unittest.main()
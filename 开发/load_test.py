@@ -0,0 +1,499 @@
+"""
+希望杀服务器压力测试
+
+启动大量模拟玩家（python-socketio异步客户端）连接到正在运行的服务器：
+每两个玩家通过 POST /game/api/rooms 创建一个房间，加入、开始游戏，
+然后按照思考时间轮流执行合法动作（use_card / resolve_attack / end_turn），一局结束后重新开局。
+
+统计每种事件从发送到收到回应的往返延迟（p50/p95/p99）、吞吐量，
+指定 --server-pid 时同时采样服务器进程的CPU占用和内存（RSS）。
+
+需要安装 python-socketio[asyncio_client]（aiohttp）。
+
+用法：
+    python 开发/load_test.py --url http://localhost:5000 --rooms 500 --duration 60 --think-ms 200
+    python 开发/load_test.py --rooms 1000 --server-pid 12345 --label threading --json result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import aiohttp
+    import socketio
+except ImportError as e:  # pragma: no cover - 依赖缺失时给出明确提示
+    raise ImportError('压力测试需要aiohttp和python-socketio，请先执行 pip install "python-socketio[asyncio_client]"') from e
+
+# 每种请求对应的回应事件（服务器返回error时同样视为回应）
+RESPONSES = {
+    'join_room': 'player_joined',
+    'start_game': 'game_started',
+    'use_card': 'card_used',
+    'resolve_attack': 'attack_resolved',
+    'end_turn': 'turn_ended',
+    'get_game_state': 'game_state_update',
+}
+
+# 回复san值的体术牌，对自己使用
+HEAL_CARDS = ('运动', '休息', '冥想')
+
+# 每回合最多主动出牌次数，之后结束回合
+MAX_PLAYS_PER_TURN = 3
+
+
+class LoadStats:
+    """所有模拟玩家共享的统计数据"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {event: [] for event in RESPONSES}  # 秒
+        self.errors: Dict[str, int] = {event: 0 for event in RESPONSES}
+        self.timeouts: Dict[str, int] = {event: 0 for event in RESPONSES}
+        self.games = 0
+        self.connected = 0
+        self.connect_failures = 0
+        self.resyncs = 0
+
+    def record(self, event: str, latency: float, error: bool = False):
+        self.latencies[event].append(latency)
+        if error:
+            self.errors[event] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """按事件汇总延迟分位数（毫秒）"""
+        events = {}
+        total = 0
+        for event, values in self.latencies.items():
+            if not values and not self.timeouts[event]:
+                continue
+            values = sorted(values)
+            total += len(values)
+            events[event] = {
+                'count': len(values),
+                'errors': self.errors[event],
+                'timeouts': self.timeouts[event],
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p95_ms': _percentile(values, 95) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000 if values else 0.0,
+            }
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'requests_per_s': total / elapsed if elapsed else 0.0,
+            'games': self.games,
+            'games_per_s': self.games / elapsed if elapsed else 0.0,
+            'clients_connected': self.connected,
+            'connect_failures': self.connect_failures,
+            'resyncs': self.resyncs,
+            'events': events,
+        }
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """已排序列表的分位数（最近秩）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class ServerSampler:
+    """按秒采样服务器进程的CPU占用和RSS（读取/proc，其他系统需要psutil）"""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_samples: List[float] = []  # 百分比（单核为100）
+        self.rss_samples: List[int] = []  # 字节
+        self._task = None
+        try:
+            import psutil
+            self._process = psutil.Process(pid)
+        except ImportError:
+            self._process = None
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def _read(self):
+        """返回(累计CPU秒数, RSS字节)"""
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system, self._process.memory_info().rss
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+        rss = 0
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                    break
+        return cpu, rss
+
+    async def _run(self):
+        last_cpu, _ = self._read()
+        last_time = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, rss = self._read()
+            now = time.perf_counter()
+            self.cpu_samples.append((cpu - last_cpu) / (now - last_time) * 100)
+            self.rss_samples.append(rss)
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.cpu_samples:
+            return {'pid': self.pid}
+        return {
+            'pid': self.pid,
+            'cpu_avg_percent': sum(self.cpu_samples) / len(self.cpu_samples),
+            'cpu_max_percent': max(self.cpu_samples),
+            'rss_max_mb': max(self.rss_samples) / 1024 / 1024,
+            'rss_last_mb': self.rss_samples[-1] / 1024 / 1024,
+        }
+
+
+def apply_patch(state: Dict[str, Any], hand: List[Dict[str, Any]], patch: Dict[str, Any],
+                hand_patch: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把增量补丁应用到本地状态（与game_room.js的applyPatch一致），返回新的手牌"""
+    for pid in patch.get('removed_players', []):
+        state['players'].pop(pid, None)
+    for pid, fields in patch.get('players', {}).items():
+        state['players'].setdefault(pid, {}).update(fields)
+    state.update(patch.get('fields', {}))
+    state['version'] = patch['version']
+
+    if hand_patch:
+        if 'cards' in hand_patch:
+            hand = list(hand_patch['cards'])
+        else:
+            removed = set(hand_patch.get('removed', []))
+            hand = [card for card in hand if card['card_id'] not in removed] + hand_patch.get('added', [])
+    return hand
+
+
+class Bot:
+    """一个模拟玩家"""
+
+    def __init__(self, url: str, name: str, stats: LoadStats, think: float, timeout: float, rng: random.Random):
+        self.url = url
+        self.name = name
+        self.stats = stats
+        self.think = think
+        self.timeout = timeout
+        self.rng = rng
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.room_id = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.hand: List[Dict[str, Any]] = []
+        self.changed = asyncio.Event()
+        self.plays_this_turn = 0
+        self._pending = None  # (请求事件, 发送时间, Future)
+
+        for event in set(RESPONSES.values()) | {'player_left', 'game_over'}:
+            self.sio.on(event, self._make_handler(event))
+        self.sio.on('error', self._on_error)
+
+    @property
+    def player_id(self) -> Optional[str]:
+        return self.sio.get_sid()
+
+    def _make_handler(self, event: str):
+        async def handler(data):
+            self._sync(data)
+            self._complete(event, error=False)
+        return handler
+
+    async def _on_error(self, data):
+        self._complete('error', error=True)
+
+    def _complete(self, event: str, error: bool):
+        """收到回应事件时结束正在等待的请求"""
+        if not self._pending:
+            return
+        request, started, future = self._pending
+        if error or RESPONSES[request] == event:
+            self._pending = None
+            self.stats.record(request, time.perf_counter() - started, error)
+            if not future.done():
+                future.set_result(not error)
+
+    def _sync(self, data: Dict[str, Any]):
+        """同步服务器发来的完整状态或补丁"""
+        if not isinstance(data, dict):
+            return
+        if data.get('game_state'):
+            self.state = data['game_state']
+            private = data.get('private') or {}
+            self.hand = list(private.get('hand_cards', []))
+        elif 'patches' in data:
+            for item in data['patches']:
+                self._apply(item['patch'], item.get('hand'))
+        elif 'patch' in data:
+            self._apply(data['patch'], data.get('hand'))
+        self.changed.set()
+
+    def _apply(self, patch: Dict[str, Any], hand_patch: Optional[Dict[str, Any]]):
+        if self.state is None or patch['version'] <= self.state['version']:
+            return
+        if patch['base_version'] != self.state['version']:
+            # 漏掉了补丁，请求缺失的部分
+            self.stats.resyncs += 1
+            asyncio.ensure_future(self.sio.emit('get_game_state', {
+                'room_id': self.room_id, 'since_version': self.state['version']
+            }))
+            return
+        self.hand = apply_patch(self.state, self.hand, patch, hand_patch)
+
+    async def connect(self) -> bool:
+        try:
+            await self.sio.connect(self.url, transports=['websocket'], wait_timeout=self.timeout)
+        except Exception:
+            self.stats.connect_failures += 1
+            return False
+        self.stats.connected += 1
+        return True
+
+    async def request(self, event: str, data: Dict[str, Any]) -> bool:
+        """发送请求并等待回应，返回是否成功"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending = (event, time.perf_counter(), future)
+        await self.sio.emit(event, data)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending = None
+            self.stats.timeouts[event] += 1
+            return False
+
+    def choose_action(self):
+        """
+        根据本地状态选择一个合法动作
+
+        Returns:
+            (事件名, 参数) 或None（现在不该由自己行动）
+        """
+        state = self.state
+        me = self.player_id
+        if not state or state.get('game_phase') != 'playing' or me not in state['players']:
+            return None
+
+        names = [card['name'] for card in self.hand]
+        usage = (state.get('turn_card_usage') or {}).get(me, {})
+
+        if state.get('waiting_for_dodge'):
+            if state.get('attack_target') != me:
+                return None
+            attack = (state.get('pending_attack') or {}).get('card') or {}
+            if attack.get('name') == '线性代数':
+                if '一套卷子' in names and usage.get('一套卷子', 0) < 1 and self.rng.random() < 0.7:
+                    return 'use_card', {'card_index': names.index('一套卷子'), 'target_id': None}
+            elif '驳回' in names and self.rng.random() < 0.7:
+                return 'use_card', {'card_index': names.index('驳回'), 'target_id': None}
+            return 'resolve_attack', {}
+
+        if state.get('current_turn') != me:
+            return None
+
+        opponent = next((pid for pid in state['players'] if pid != me), None)
+        playable = []
+        for index, name in enumerate(names):
+            if name == '驳回' or (name == '一套卷子' and usage.get('一套卷子', 0) >= 1):
+                continue
+            playable.append((index, me if name in HEAL_CARDS else opponent))
+        if not playable or self.plays_this_turn >= MAX_PLAYS_PER_TURN or self.rng.random() < 0.2:
+            return 'end_turn', {}
+        index, target = self.rng.choice(playable)
+        return 'use_card', {'card_index': index, 'target_id': target}
+
+    async def play(self, finished: asyncio.Event):
+        """在本局结束前根据状态变化不断行动"""
+        last_turn = None
+        while not finished.is_set():
+            action = self.choose_action()
+            if action is None:
+                self.changed.clear()
+                if finished.is_set():
+                    break
+                try:
+                    await asyncio.wait_for(self.changed.wait(), self.timeout)
+                except asyncio.TimeoutError:
+                    # 长时间没有状态变化，重新获取完整状态
+                    await self.request('get_game_state', {'room_id': self.room_id})
+                continue
+
+            if self.state.get('current_turn') != last_turn:
+                last_turn = self.state.get('current_turn')
+                self.plays_this_turn = 0
+            if self.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+                # 思考期间状态可能已经变化
+                if self.choose_action() is None:
+                    continue
+
+            event, data = action
+            if event == 'use_card' and self.state.get('current_turn') == self.player_id:
+                self.plays_this_turn += 1
+            if event == 'end_turn':
+                self.plays_this_turn = 0
+            ok = await self.request(event, dict(data, room_id=self.room_id))
+            if not ok:
+                # 状态可能已经过期（例如请求失败），重新获取
+                await self.request('get_game_state', {'room_id': self.room_id})
+
+    async def close(self):
+        try:
+            if self.room_id:
+                await self.sio.emit('leave_room', {'room_id': self.room_id, 'player_name': self.name})
+            await self.sio.disconnect()
+        except Exception:
+            pass
+
+
+async def run_room(index: int, args, session: 'aiohttp.ClientSession', stats: LoadStats, deadline: float):
+    """一个房间两个玩家：创建房间、加入、反复开局直到时间用完"""
+    rng = random.Random(args.seed * 100003 + index)
+    async with session.post(f'{args.url}/game/api/rooms', json={'name': f'压测房间{index}'}) as response:
+        room = await response.json()
+    # 多进程部署时连接到负责这个房间的进程
+    async with session.get(f"{args.url}/game/api/route/{room['id']}") as response:
+        url = (await response.json()).get('url') or args.url
+
+    bots = [Bot(url, f'bot{index}-{seat}', stats, args.think_ms / 1000, args.timeout, rng) for seat in range(2)]
+    try:
+        if not all(await asyncio.gather(*(bot.connect() for bot in bots))):
+            return
+        for bot in bots:
+            bot.room_id = room['id']
+            if not await bot.request('join_room', {'room_id': room['id'], 'player_name': bot.name}):
+                return
+
+        games = 0
+        while time.perf_counter() < deadline and (not args.games or games < args.games):
+            if not await bots[0].request('start_game', {'room_id': room['id']}):
+                return
+            finished = asyncio.Event()
+
+            async def watch():
+                while time.perf_counter() < deadline:
+                    if all(bot.state and bot.state.get('game_phase') == 'finished' for bot in bots):
+                        break
+                    await asyncio.sleep(0.05)
+                finished.set()
+                for bot in bots:
+                    bot.changed.set()
+
+            await asyncio.gather(watch(), *(bot.play(finished) for bot in bots))
+            if all(bot.state and bot.state.get('game_phase') == 'finished' for bot in bots):
+                games += 1
+                stats.games += 1
+    finally:
+        await asyncio.gather(*(bot.close() for bot in bots))
+
+
+async def main_async(args) -> Dict[str, Any]:
+    stats = LoadStats()
+    sampler = ServerSampler(args.server_pid) if args.server_pid else None
+    if sampler:
+        sampler.start()
+
+    start = time.perf_counter()
+    deadline = start + args.ramp + args.duration
+    connector = aiohttp.TCPConnector(limit=args.http_limit)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = []
+        for index in range(args.rooms):
+            # 在ramp秒内均匀地启动房间
+            delay = args.ramp * index / args.rooms if args.rooms else 0
+            tasks.append(asyncio.ensure_future(_delayed(delay, run_room(index, args, session, stats, deadline))))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    if sampler:
+        await sampler.stop()
+
+    failures = [repr(result) for result in results if isinstance(result, Exception)]
+    report = {
+        'label': args.label,
+        'config': {
+            'url': args.url,
+            'rooms': args.rooms,
+            'clients': args.rooms * 2,
+            'duration_s': args.duration,
+            'ramp_s': args.ramp,
+            'think_ms': args.think_ms,
+            'games_per_room': args.games,
+            'seed': args.seed,
+        },
+        'results': stats.summary(elapsed),
+        'room_failures': len(failures),
+        'failure_samples': failures[:5],
+    }
+    if sampler:
+        report['server'] = sampler.summary()
+    return report
+
+
+async def _delayed(delay: float, coro):
+    await asyncio.sleep(delay)
+    return await coro
+
+
+def print_report(report: Dict[str, Any]):
+    results = report['results']
+    print(f"客户端: {report['config']['clients']}（连接成功 {results['clients_connected']}，"
+          f"失败 {results['connect_failures']}），用时 {results['elapsed_s']:.1f}秒")
+    print(f"请求: {results['requests']}，{results['requests_per_s']:.1f} 次/秒；"
+          f"完成对局: {results['games']}，{results['games_per_s']:.2f} 局/秒；补丁重新同步: {results['resyncs']}")
+    print(f"{'事件':<16}{'次数':>8}{'错误':>6}{'超时':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for event, item in results['events'].items():
+        print(f"{event:<16}{item['count']:>8}{item['errors']:>6}{item['timeouts']:>6}"
+              f"{item['p50_ms']:>10.1f}{item['p95_ms']:>10.1f}{item['p99_ms']:>10.1f}{item['max_ms']:>10.1f}")
+    server = report.get('server')
+    if server and 'cpu_avg_percent' in server:
+        print(f"服务器进程 {server['pid']}: CPU 平均 {server['cpu_avg_percent']:.0f}% / 最高 {server['cpu_max_percent']:.0f}%，"
+              f"RSS 最高 {server['rss_max_mb']:.1f}MB")
+    if report['room_failures']:
+        print(f"失败的房间: {report['room_failures']}，例如 {report['failure_samples'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='希望杀服务器压力测试')
+    parser.add_argument('--url', default='http://localhost:5000', help='服务器地址')
+    parser.add_argument('--rooms', type=int, default=100, help='房间数量（每个房间两个模拟玩家）')
+    parser.add_argument('--duration', type=float, default=30, help='所有房间启动后持续的秒数')
+    parser.add_argument('--ramp', type=float, default=5, help='在多少秒内逐步启动所有房间')
+    parser.add_argument('--think-ms', type=float, default=200, help='平均思考时间（毫秒，指数分布），0表示不等待')
+    parser.add_argument('--games', type=int, default=0, help='每个房间最多进行的对局数，0表示不限')
+    parser.add_argument('--timeout', type=float, default=10, help='单个请求的超时时间（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--server-pid', type=int, default=None, help='服务器进程ID，用于采样CPU和内存')
+    parser.add_argument('--http-limit', type=int, default=100, help='创建房间时的最大并发HTTP连接数')
+    parser.add_argument('--label', default='', help='写入结果的标签（例如异步模式或版本号）')
+    parser.add_argument('--json', dest='json_path', default=None, help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()